@@ -0,0 +1,199 @@
+"""
+Per-user activity rollup for dashboard charts.
+
+DailyUserStats holds one row per user per local day with the kg recycled and
+UZS earned/spent. `credit()`/`debit()` in api.balance add to today's row in
+the same transaction as the ledger insert, after the user's row has been
+updated (and so locked), which is what keeps concurrent writers for the same
+user from racing on the rollup row. `backfill()` rebuilds the rows of a group
+of users from Transaction history under the same lock; days whose
+transactions were archived (api.partitions) keep their rows. The ledger has
+no kg column, so kg are read back from the recycling description
+(`Qayta ishlash: <kg>kg`); rows whose kg can't be read are logged and
+reported to the caller.
+
+`series()` answers day/week/month charts from the rollup alone; the allowed
+ranges keep a read to at most about a year of daily rows.
+"""
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import partitions
+from .models import DailyUserStats, Transaction, User
+
+log = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+
+# update_stats / bulk_update_stats tavsifi: f'Qayta ishlash: {kg}kg' (Decimal: '1.50', '1E+1')
+RECYCLING_PREFIX = 'Qayta ishlash:'
+KG_PATTERN = re.compile(r'^Qayta ishlash:\s*(\S+?)\s*kg$')
+
+# period -> (default, maximum) number of buckets
+PERIODS = {
+    'day': (30, 366),
+    'week': (12, 53),
+    'month': (12, 12),
+}
+
+
+def _add(user_id, day, kg=ZERO, earned=ZERO, spent=ZERO):
+    rows = DailyUserStats.objects.filter(user_id=user_id, day=day)
+    if not rows.update(recycled_kg=F('recycled_kg') + kg, earned=F('earned') + earned, spent=F('spent') + spent):
+        DailyUserStats.objects.create(user_id=user_id, day=day, recycled_kg=kg, earned=earned, spent=spent)
+
+
+def record_credit(user_id, amount, kg):
+    """Add a credit to today's row; call inside the transaction that updated the user."""
+    _add(user_id, timezone.localdate(), kg=kg, earned=amount)
+
+
+def record_debit(user_id, amount):
+    """Add a debit to today's row; call inside the transaction that updated the user."""
+    _add(user_id, timezone.localdate(), spent=amount)
+
+
+def record_credits(totals):
+    """Batch form of record_credit: `totals` maps user_id -> (amount, kg), users locked."""
+    day = timezone.localdate()
+    existing = {row.user_id: row for row in DailyUserStats.objects.filter(user_id__in=list(totals), day=day)}
+    created = []
+    for user_id, (amount, kg) in totals.items():
+        row = existing.get(user_id)
+        if row is None:
+            created.append(DailyUserStats(user_id=user_id, day=day, recycled_kg=kg, earned=amount))
+        else:
+            row.recycled_kg += kg
+            row.earned += amount
+    DailyUserStats.objects.bulk_update(existing.values(), ['recycled_kg', 'earned'])
+    DailyUserStats.objects.bulk_create(created)
+
+
+def _first_full_day(archived_until):
+    """First local day with none of its transactions archived, or None."""
+    if archived_until is None:
+        return None
+    moment = timezone.localtime(archived_until)
+    return moment.date() if moment.time() == time.min else moment.date() + timedelta(days=1)
+
+
+def recycled_kg(description):
+    """kg of a recycling ledger row, ZERO for other rows, None if it can't be read."""
+    if not description.startswith(RECYCLING_PREFIX):
+        return ZERO  # masalan 'Xush kelibsiz bonus'
+    match = KG_PATTERN.match(description)
+    try:
+        kg = Decimal(match.group(1)) if match else None
+    except InvalidOperation:
+        kg = None
+    return kg if kg is not None and kg.is_finite() and kg >= 0 else None
+
+
+def backfill(user_ids, unparsed=None):
+    """
+    Recompute the rollup rows of `user_ids` from their transactions; returns
+    rows written. Recycling rows whose kg can't be read count as 0 kg and are
+    appended to `unparsed` as (transaction id, description).
+    """
+    with transaction.atomic():
+        # credit()/debit() bilan bir xil tartib: avval user qatori qulflanadi
+        user_ids = list(User.objects.select_for_update().filter(pk__in=user_ids)
+                        .order_by('pk').values_list('pk', flat=True))
+        totals = defaultdict(lambda: [ZERO, ZERO, ZERO])
+        history = Transaction.objects.filter(user_id__in=user_ids).order_by().values_list(
+            'id', 'user_id', 'date', 'amount', 'type', 'description')
+        rollups = DailyUserStats.objects.filter(user_id__in=user_ids)
+        first_day = _first_full_day(partitions.archived_until())
+        if first_day:
+            # Arxivlangan kunlarning qatorlari qoladi (tranzaksiyalari endi jadvalda yo'q)
+            history = history.filter(date__gte=timezone.make_aware(datetime.combine(first_day, time.min)))
+            rollups = rollups.filter(day__gte=first_day)
+        failed = []
+        for pk, user_id, when, amount, kind, description in history.iterator(chunk_size=5000):
+            row = totals[user_id, timezone.localtime(when).date()]
+            if kind == 'earn':
+                row[1] += amount
+                kg = recycled_kg(description)
+                if kg is None:
+                    failed.append((pk, description))
+                else:
+                    row[0] += kg
+            else:
+                row[2] -= amount  # debit qatorlari manfiy summa bilan yoziladi
+
+        rollups.delete()
+        DailyUserStats.objects.bulk_create(
+            [DailyUserStats(user_id=user_id, day=day, recycled_kg=kg, earned=earned, spent=spent)
+             for (user_id, day), (kg, earned, spent) in totals.items()],
+            batch_size=1000,
+        )
+    for pk, description in failed:
+        log.warning('backfill: transaction %s kg o\'qilmadi: %r', pk, description)
+    if unparsed is not None:
+        unparsed.extend(failed)
+    return len(totals)
+
+
+def _bucket(period, day):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _step(period, bucket, count=1):
+    if period == 'day':
+        return bucket + timedelta(days=count)
+    if period == 'week':
+        return bucket + timedelta(weeks=count)
+    months = bucket.year * 12 + bucket.month - 1 + count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def series(user_id, period='day', start=None, end=None):
+    """
+    Chart points for `user_id`, one per day/week/month bucket from `start`
+    to `end` (inclusive, local dates), zero-filled. Raises ValueError for an
+    unknown period or a range longer than PERIODS allows.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'period: {", ".join(PERIODS)}')
+    default, maximum = PERIODS[period]
+    last = _bucket(period, end or timezone.localdate())
+    first = _bucket(period, start) if start else _step(period, last, -(default - 1))
+    buckets = []
+    bucket = first
+    while bucket <= last:
+        buckets.append(bucket)
+        if len(buckets) > maximum:
+            raise ValueError(f'{period} uchun eng ko\'pi {maximum} ta nuqta')
+        bucket = _step(period, bucket)
+
+    rows = DailyUserStats.objects.filter(user_id=user_id, day__gte=first, day__lt=_step(period, last))
+    if period == 'day':
+        rows = rows.values('day', 'recycled_kg', 'earned', 'spent').annotate(bucket=F('day'))
+    else:
+        trunc = TruncWeek if period == 'week' else TruncMonth
+        rows = rows.annotate(bucket=trunc('day')).values('bucket').annotate(
+            recycled_kg=Sum('recycled_kg'), earned=Sum('earned'), spent=Sum('spent'))
+    found = {row['bucket']: row for row in rows.order_by()}
+
+    points = []
+    for bucket in buckets:
+        row = found.get(bucket, {})
+        points.append({
+            'date': bucket.isoformat(),
+            'recycled_kg': f"{row.get('recycled_kg') or ZERO:.2f}",
+            'earned': f"{row.get('earned') or ZERO:.2f}",
+            'spent': f"{row.get('spent') or ZERO:.2f}",
+        })
+    return points
@@ -1,15 +1,35 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Transaction, GlobalStats, EmailVerification
+from django.core.cache import cache
+from .models import (User, Transaction, TransactionArchive, DailyUserStats, GlobalStats, EmailVerification,
+                     OutboxEmail, IdempotencyKey)
+from .pagination import EstimatedCountPaginator
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """AllValuesFieldListFilter whose SELECT DISTINCT over the table is cached."""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f'api:admin:values:{model._meta.label_lower}:{field_path}'
+        choices = self.lookup_choices
+        self.lookup_choices = cache.get_or_set(key, lambda: list(choices), settings.ADMIN_FILTER_CACHE_TTL)
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Admin configuration for User model"""
     list_display = ('username', 'email', 'name', 'balance', 'total_recycled_kg', 'level', 'role', 'is_staff', 'is_active', 'is_deleted', 'deleted_at')
-    list_filter = ('role', 'is_staff', 'is_active', 'is_deleted', 'level')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
-    ordering = ('-date_joined',)
+    list_filter = ('role', 'is_staff', 'is_active', 'is_deleted', ('level', CachedAllValuesFieldListFilter))
+    # Prefiks qidiruv - username/email indekslaridan foydalanadi (LIKE '%..%' emas)
+    search_fields = ('username__startswith', 'email__startswith')
+    search_help_text = 'Username yoki email boshlanishi bo\'yicha qidirish (katta-kichik harf farq qiladi)'
+    # id date_joined bilan bir xil tartibda o'sadi, lekin PK indeksidan foydalanadi
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('EcoCash Info', {
@@ -37,11 +57,40 @@ class UserAdmin(BaseUserAdmin):
 class TransactionAdmin(admin.ModelAdmin):
     """Admin configuration for Transaction model"""
     list_display = ('user', 'type', 'amount', 'description', 'provider', 'date')
-    list_filter = ('type', 'date', 'provider')
-    search_fields = ('user__username', 'user__email', 'description', 'provider')
+    list_select_related = ('user',)
+    list_filter = ('type', 'date', ('provider', CachedAllValuesFieldListFilter))
+    search_fields = ('user__username__startswith', 'user__email__startswith')
+    search_help_text = 'Foydalanuvchi username yoki email boshlanishi bo\'yicha qidirish'
     readonly_fields = ('date',)
-    ordering = ('-date',)
-    date_hierarchy = 'date'
+    raw_id_fields = ('user',)
+    # id date bilan bir xil tartibda o'sadi, lekin PK indeksidan foydalanadi.
+    # date_hierarchy butun jadval bo'yicha MIN/MAX va DISTINCT qilardi - olib tashlandi.
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    """Admin configuration for TransactionArchive model (written by partition_transactions)"""
+    list_display = ('month', 'rows', 'payouts', 'path', 'archived_at')
+    readonly_fields = ('month', 'rows', 'payouts', 'path', 'archived_at')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DailyUserStats)
+class DailyUserStatsAdmin(admin.ModelAdmin):
+    """Admin configuration for DailyUserStats model"""
+    list_display = ('user', 'day', 'recycled_kg', 'earned', 'spent')
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(GlobalStats)
@@ -91,5 +140,22 @@ class EmailVerificationAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Admin configuration for OutboxEmail model"""
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
 
 
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Admin configuration for IdempotencyKey model"""
+    list_display = ('scope', 'key', 'status_code', 'created_at', 'expires_at')
+    search_fields = ('scope__startswith', 'key')
+    readonly_fields = ('scope', 'key', 'fingerprint', 'status_code', 'response', 'created_at', 'expires_at')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -1,27 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
 
+    def ready(self):
+        # User o'zgarganda kesh nusxasi, reytinglar va replika "pin"ini yangilovchi signal'lar
+        from . import authentication, db_router, leaderboard, metrics  # noqa: F401
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        if settings.METRICS_ENABLED:
+            connection_created.connect(metrics.install)
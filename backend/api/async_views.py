@@ -0,0 +1,122 @@
+"""
+Async versions of the network-bound auth endpoints, for ASGI servers
+(uvicorn/daphne).
+
+`google_auth` waits for Google's certificates through the pooled
+api.http_client, and `send_verification_code` sends inline SMTP mail
+(EMAIL_OUTBOX_ENABLED=False) on a worker thread, so the event loop keeps
+serving other requests meanwhile. Validation, DB work and response bodies
+are shared with the sync actions in api/views.py; the ORM runs through
+sync_to_async. With ASYNC_VIEWS=True these views are routed in place of the
+sync actions (api/urls.py).
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import send_mail
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+
+from . import google_tokens, http_client, metrics, ratelimit, views
+
+log = logging.getLogger(__name__)
+
+
+def _json(data, code=status.HTTP_200_OK):
+    return JsonResponse(data, status=code, json_dumps_params={'ensure_ascii': False})
+
+
+def _data(request):
+    """Request body as a dict (JSON or form), or None if it can't be parsed."""
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _rate_limited(action, request, data):
+    # ratelimit kalit funksiyalari DRF'dagi kabi request.data'ni o'qiydi
+    request.data = data
+    retry_after = await sync_to_async(ratelimit.check)(action, request)
+    if retry_after is None:
+        return None
+    body, seconds = ratelimit.rejection(retry_after)
+    response = _json(body, status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def google_auth(request):
+    """Login or register user with Google OAuth JWT credential"""
+    data = _data(request)
+    if data is None:
+        return _json({'error': 'So\'rov tanasi noto\'g\'ri'}, status.HTTP_400_BAD_REQUEST)
+    limited = await _rate_limited('google_auth', request, data)
+    if limited:
+        return limited
+
+    token = data.get('token')
+    if not token:
+        return _json({'error': 'Google token talab qilinadi'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # JWT format: header.payload.signature
+        if not isinstance(token, str) or len(token.split('.')) != 3:
+            return _json({'error': 'Noto\'g\'ri Google token formati'}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload_data = await google_tokens.averify_id_token(token)
+        except ValueError as verify_error:
+            log.warning('Google token tekshiruvi: %s', verify_error)
+            return _json({'error': 'Google token noto\'g\'ri yoki muddati tugagan'}, status.HTTP_401_UNAUTHORIZED)
+
+        return _json(*await sync_to_async(views.google_login)(request, payload_data))
+    except http_client.ERRORS as e:
+        log.error('Google API xatosi: %s', e)
+        return _json({'error': 'Google API bilan bog\'lanishda xatolik'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        log.exception('Google auth xatosi')
+        return _json({'error': f'Google orqali kirishda xatolik: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def send_verification_code(request):
+    """Send 6-digit verification code to email"""
+    data = _data(request)
+    if data is None:
+        return _json({'error': 'So\'rov tanasi noto\'g\'ri'}, status.HTTP_400_BAD_REQUEST)
+    limited = await _rate_limited('send_verification_code', request, data)
+    if limited:
+        return limited
+
+    email, error = await sync_to_async(views.check_verification_request)(data)
+    if error:
+        return _json(*error)
+
+    try:
+        subject, message = await sync_to_async(views.store_verification_code)(
+            email, data.get('first_name', ''), data.get('last_name', '')
+        )
+        if not settings.EMAIL_OUTBOX_ENABLED:
+            # SMTP uchun async kutubxona yo'q - alohida thread'da, event loop bo'sh qoladi
+            with metrics.timed('smtp'):
+                await sync_to_async(send_mail, thread_sensitive=False)(
+                    subject, message, settings.EMAIL_HOST_USER, [email], fail_silently=False,
+                )
+
+        # Kod logga yozilmaydi
+        log.info('Tasdiqlash kodi yuborildi', extra={'sampled': True, 'email': email})
+        return _json(views.verification_sent(email))
+    except Exception as e:
+        log.exception('Email yuborishda xatolik', extra={'email': email})
+        return _json(views.verification_failed(email, e), status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,252 @@
+"""
+Authentication without per-request database reads (settings.AUTH_MODE).
+
+- `cached_session`: sessions use the cached_db engine and the user's auth
+  fields are kept in the cache next to it, so an authenticated request is
+  served from the cache alone.
+- `token`: a short-lived signed access token (`Authorization: Bearer ...`)
+  is verified by signature only; the user comes from the same cache. A
+  longer-lived refresh token is exchanged for a new pair at
+  `POST /api/users/token_refresh/`.
+
+The cache holds every column but the password (CACHED_FIELDS) and the
+session auth hash (an HMAC of the password hash), never the password hash
+itself, so the views that answer with the user (`me`, `update_stats`,
+`pay_utility`) read no user row either. Cached users are dropped whenever
+the row is saved or deleted, and after balance changes (`forget_users`).
+Both token kinds carry a prefix of the session auth hash, so changing the
+password revokes them, and the id and generation of their TokenFamily (one
+per login, i.e. per device): refreshing bumps that family's generation, so
+a refresh token works once, and logout revokes only that family. In token
+mode the cached user also lists the families revoked within the access
+token lifetime, so the access tokens of a logged-out device stop working at
+once while other devices are untouched.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth import login as django_login
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication, get_authorization_header
+
+from .models import TokenFamily, User
+
+ACCESS_SALT = 'api.authentication.access'
+REFRESH_SALT = 'api.authentication.refresh'
+HASH_PREFIX = 16
+FAMILY_SESSION_KEY = '_api_token_family'
+
+
+# Parol xeshidan boshqa barcha ustunlar: javoblar (serialize_user) ham keshdan quriladi
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.name != 'password']
+
+
+def _user_key(pk):
+    return f'api:auth:user:{pk}'
+
+
+def _from_cache(state):
+    fields, auth_hash, revoked_families = state
+    user = User.from_db('default', CACHED_FIELDS, [fields[name] for name in CACHED_FIELDS])
+    user._auth_hash = auth_hash
+    user._revoked_families = revoked_families
+    return user
+
+
+def _revoked_families(pk):
+    # Access token muddati ichida bekor qilingan oilalar; undan eskilarining access tokenlari baribir eskirgan
+    since = timezone.now() - timedelta(seconds=settings.AUTH_ACCESS_TOKEN_LIFETIME)
+    return frozenset(TokenFamily.objects.filter(user_id=pk, revoked_at__gte=since).values_list('pk', flat=True))
+
+
+def get_user(pk):
+    """
+    Active, not deleted user by pk - from the cache, else one query (two in
+    token mode). Every field but the password is loaded (CACHED_FIELDS).
+    """
+    key = _user_key(pk)
+    try:
+        state = cache.get(key)
+    except Exception:
+        state = None
+    if state is None:
+        user = User.objects.filter(pk=pk, is_active=True, is_deleted=False).first()
+        if user is None:
+            return None
+        revoked = _revoked_families(pk) if settings.AUTH_MODE == 'token' else frozenset()
+        state = ({name: getattr(user, name) for name in CACHED_FIELDS}, user.get_session_auth_hash(), revoked)
+        try:
+            cache.set(key, state, settings.AUTH_USER_CACHE_TTL)
+        except Exception:
+            pass
+    return _from_cache(state)
+
+
+def session_auth_hash(user):
+    """user.get_session_auth_hash(), taken from the cache for users loaded by get_user()."""
+    return getattr(user, '_auth_hash', None) or user.get_session_auth_hash()
+
+
+def forget_users(pks):
+    """Drop cached users after their row changed (called on commit)."""
+    if settings.AUTH_MODE == 'session':
+        return
+    try:
+        cache.delete_many([_user_key(pk) for pk in pks])
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _user_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_users([instance.pk]))
+
+
+class CachedSessionAuthentication(SessionAuthentication):
+    """SessionAuthentication that loads the user through `get_user()`."""
+
+    def authenticate(self, request):
+        session = request._request.session
+        user_id = session.get(SESSION_KEY)
+        if user_id is None or BACKEND_SESSION_KEY not in session:
+            return None
+        user = get_user(User._meta.pk.to_python(user_id))
+        if user is None:
+            return None
+        # django.contrib.auth.get_user() bilan bir xil: parol o'zgarsa sessiya bekor
+        if not constant_time_compare(session.get(HASH_SESSION_KEY, ''), session_auth_hash(user)):
+            session.flush()
+            return None
+
+        request._request.user = user
+        self.enforce_csrf(request)
+        return (user, None)
+
+
+def _hash(user):
+    return session_auth_hash(user)[:HASH_PREFIX]
+
+
+def _valid(payload, user):
+    return user is not None and constant_time_compare(payload.get('h', ''), _hash(user))
+
+
+def _pair(user, family, generation):
+    payload = {'uid': user.pk, 'h': _hash(user), 'f': family, 'g': generation}
+    return {
+        'access': signing.dumps(payload, salt=ACCESS_SALT),
+        'refresh': signing.dumps(payload, salt=REFRESH_SALT),
+        'token_type': 'Bearer',
+        'expires_in': settings.AUTH_ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def _expires_at():
+    return timezone.now() + timedelta(seconds=settings.AUTH_REFRESH_TOKEN_LIFETIME)
+
+
+def _new_family(user):
+    return TokenFamily.objects.create(id=secrets.token_urlsafe(16), user=user, expires_at=_expires_at()).pk
+
+
+def issue_tokens(user):
+    """Token pair of a new family (one per login)."""
+    return _pair(user, _new_family(user), 0)
+
+
+def revoke_tokens(request):
+    """Invalidate the access and refresh tokens of the request's family; other logins keep theirs."""
+    if isinstance(request.auth, dict):
+        family = request.auth.get('f')
+    else:
+        family = request.session.get(FAMILY_SESSION_KEY)
+    if not family:
+        return
+    user_pk = request.user.pk
+    TokenFamily.objects.filter(pk=family, user_id=user_pk, revoked_at=None).update(revoked_at=timezone.now())
+    transaction.on_commit(lambda: forget_users([user_pk]))
+
+
+def refresh_tokens(refresh_token):
+    """New token pair for a valid refresh token, else None. A refresh token works once."""
+    try:
+        payload = signing.loads(refresh_token, salt=REFRESH_SALT, max_age=settings.AUTH_REFRESH_TOKEN_LIFETIME)
+    except signing.BadSignature:
+        return None
+    user = User.objects.filter(pk=payload.get('uid'), is_active=True, is_deleted=False).first()
+    if not _valid(payload, user) or not isinstance(payload.get('g'), int):
+        return None
+    # Shartli UPDATE: bir xil token bilan parallel so'rovlardan faqat bittasi o'tadi;
+    # faqat shu oila aylanadi, boshqa qurilmalarning tokenlari tegilmaydi
+    rotated = TokenFamily.objects.filter(
+        pk=payload.get('f'), user=user, generation=payload['g'], revoked_at=None, expires_at__gt=timezone.now(),
+    ).update(generation=F('generation') + 1, expires_at=_expires_at())
+    if not rotated:
+        return None
+    return _pair(user, payload['f'], payload['g'] + 1)
+
+
+def _access_payload(token):
+    try:
+        return signing.loads(token, salt=ACCESS_SALT, max_age=settings.AUTH_ACCESS_TOKEN_LIFETIME)
+    except (signing.BadSignature, UnicodeDecodeError):
+        return None
+
+
+def access_token_user_id(request):
+    """User id of a valid Bearer access token (signature check only), else None."""
+    header = get_authorization_header(request).split()
+    if len(header) != 2 or header[0].lower() != SignedTokenAuthentication.keyword:
+        return None
+    payload = _access_payload(header[1].decode(errors='replace'))
+    return payload.get('uid') if payload else None
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword:
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Authorization sarlavhasi noto\'g\'ri')
+        try:
+            payload = _access_payload(header[1].decode())
+        except UnicodeDecodeError:
+            payload = None
+        if payload is None:
+            raise exceptions.AuthenticationFailed('Token yaroqsiz yoki muddati o\'tgan')
+
+        user = get_user(payload.get('uid'))
+        if not _valid(payload, user) or payload.get('f') in user._revoked_families:
+            raise exceptions.AuthenticationFailed('Token yaroqsiz yoki muddati o\'tgan')
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+def login(request, user):
+    """
+    Start a session for `user`; in token mode also return the token pair to
+    merge into the response body.
+    """
+    django_login(request, user)
+    if settings.AUTH_MODE == 'token':
+        family = _new_family(user)
+        # Cookie bilan logout ham shu oilani bekor qiladi
+        request.session[FAMILY_SESSION_KEY] = family
+        return _pair(user, family, 0)
+    return {}
@@ -0,0 +1,181 @@
+"""
+Balance mutations.
+
+Every change to a user's balance goes through `credit()` or `debit()`. The
+balance is changed by a single conditional UPDATE with F() expressions, so
+concurrent requests can't lose each other's writes and only the touched
+columns are written; on PostgreSQL the new values come back from the same
+statement (UPDATE ... RETURNING). The ledger row and the user's daily
+activity rollup are written in the same transaction; once it commits the
+leaderboards are updated and the user's cached auth copy is dropped. The user is pinned to
+the primary database so the new balance is read back without replica lag.
+"""
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.lookups import GreaterThan
+from django.db.models.sql import UpdateQuery
+
+from . import activity, authentication, db_router, leaderboard, stats
+from .models import Transaction, User
+
+LEVEL_KG_STEP = 50
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def _apply(user, **values):
+    # Yangi qiymatlarni obyektga yozamiz - refresh_from_db() kerak emas
+    for field, value in values.items():
+        setattr(user, field, value)
+    return user
+
+
+def _forget(pks):
+    # Keshdagi foydalanuvchi nusxasida eski balans - commit'dan keyin tashlanadi
+    transaction.on_commit(lambda: authentication.forget_users(pks))
+
+
+def _update_returning(pk, fields, *conditions, **values):
+    """UPDATE the user row (if `conditions` hold) and return its new `fields`, or None if it didn't match."""
+    users = User.objects.filter(*conditions, pk=pk)
+    using = router.db_for_write(User)
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        # SQLite va boshqalar: UPDATE dan keyin alohida SELECT
+        if not users.update(**values):
+            return None
+        return User.objects.using(using).filter(pk=pk).values_list(*fields).get()
+
+    query = users.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    sql, params = query.get_compiler(using).as_sql()
+    columns = ', '.join(connection.ops.quote_name(User._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {columns}', params)
+        return cursor.fetchone()
+
+
+def credit(user, amount, kg=Decimal('0'), *, description, provider):
+    """Add `amount` UZS and `kg` recycled to the user, levelling up if due."""
+    amount = Decimal(amount)
+    kg = Decimal(kg)
+
+    with transaction.atomic():
+        balance, total_kg, level = _update_returning(
+            user.pk, ('balance', 'total_recycled_kg', 'level'),
+            balance=F('balance') + amount,
+            total_recycled_kg=F('total_recycled_kg') + kg,
+            # Level up logic (UPDATE ichida eski qiymatlar bilan hisoblanadi)
+            level=Case(
+                When(GreaterThan(F('total_recycled_kg') + kg, F('level') * LEVEL_KG_STEP), then=F('level') + 1),
+                default=F('level'),
+            ),
+        )
+
+        Transaction.objects.create(
+            user=user,
+            amount=amount,
+            type='earn',
+            description=description,
+            provider=provider,
+        )
+        activity.record_credit(user.pk, amount, kg)
+        stats.record_recycling(kg)
+        leaderboard.record(user.pk, total_kg, user.region, user.district)
+        db_router.pin([user.pk])
+        _forget([user.pk])
+
+    return _apply(user, balance=balance, total_recycled_kg=total_kg, level=level)
+
+
+def debit(user, amount, *, description, provider):
+    """
+    Take `amount` UZS from the user's balance.
+
+    Raises InsufficientFunds (and changes nothing) if the balance is too low
+    at the moment of the UPDATE.
+    """
+    amount = Decimal(amount)
+
+    with transaction.atomic():
+        updated = _update_returning(user.pk, ('balance',), Q(balance__gte=amount), balance=F('balance') - amount)
+        if updated is None:
+            raise InsufficientFunds()
+        balance, = updated
+
+        Transaction.objects.create(
+            user=user,
+            amount=-amount,
+            type='spend',
+            description=description,
+            provider=provider,
+        )
+        activity.record_debit(user.pk, amount)
+        stats.record_payment(amount)
+        db_router.pin([user.pk])
+        _forget([user.pk])
+
+    return _apply(user, balance=balance)
+
+
+def credit_batch(events, *, provider='AI Scanner'):
+    """
+    Apply many recycling credits at once.
+
+    `events` is a list of (user_id, amount, kg). The affected users are
+    locked in pk order, every event is applied in sequence in Python (so the
+    level-up rule behaves exactly as with one update_stats call per item),
+    then the users are written with one bulk_update and the ledger rows with
+    one bulk_create. Returns a list with the user's (balance, kg, level)
+    after each event, or None for events whose user doesn't exist.
+    """
+    user_ids = sorted({user_id for user_id, _, _ in events})
+
+    with transaction.atomic():
+        users = {
+            user.pk: user
+            for user in User.objects.select_for_update()
+            .filter(pk__in=user_ids, is_deleted=False)
+            .order_by('pk')
+            .only('pk', 'balance', 'total_recycled_kg', 'level', 'region', 'district')
+        }
+
+        results = []
+        ledger = []
+        total_kg = Decimal('0')
+        daily = {}
+        for user_id, amount, kg in events:
+            user = users.get(user_id)
+            if user is None:
+                results.append(None)
+                continue
+            user.balance += amount
+            user.total_recycled_kg += kg
+            if user.total_recycled_kg > user.level * LEVEL_KG_STEP:
+                user.level += 1
+            total_kg += kg
+            earned, recycled = daily.get(user_id, (Decimal('0'), Decimal('0')))
+            daily[user_id] = (earned + amount, recycled + kg)
+            ledger.append(Transaction(
+                user_id=user_id,
+                amount=amount,
+                type='earn',
+                description=f'Qayta ishlash: {kg}kg',
+                provider=provider,
+            ))
+            results.append((user.balance, user.total_recycled_kg, user.level))
+
+        User.objects.bulk_update(users.values(), ['balance', 'total_recycled_kg', 'level'])
+        Transaction.objects.bulk_create(ledger)
+        activity.record_credits(daily)
+        stats.record_recycling(total_kg)
+        for user in users.values():
+            leaderboard.record(user.pk, user.total_recycled_kg, user.region, user.district)
+        db_router.pin(list(users))
+        _forget(list(users))
+
+    return results
@@ -0,0 +1,106 @@
+"""
+Sliding-window event counters.
+
+A window is split into a fixed number of buckets; each bucket is a single
+cache key incremented atomically, so recording an event is one `incr` and
+reading the count is one `get_many` over a constant number of keys,
+independent of how many events happened. Counters live in the shared Django
+cache and fall back to process memory if the cache is unavailable.
+
+A LocMemCache is per gunicorn worker, so a count kept there would only see
+the worker's own events; `recent_payments` then counts the ledger rows
+instead (one indexed query).
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import Transaction
+
+
+def cache_is_shared():
+    """Whether the default cache is shared by all workers (not process memory)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class SlidingWindowCounter:
+    def __init__(self, name, window, buckets=10):
+        self.name = name
+        self.window = window
+        self.buckets = buckets
+        self.width = window / buckets
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        return int(now // self.width)
+
+    def _key(self, key, bucket):
+        return f'api:window:{self.name}:{key}:{bucket}'
+
+    def _local_hit(self, cache_key, bucket):
+        with self._lock:
+            self._local[cache_key] = (bucket, self._local.get(cache_key, (bucket, 0))[1] + 1)
+            # Eskirgan bucket'larni tozalash
+            if len(self._local) > 10000:
+                oldest = bucket - self.buckets
+                self._local = {k: v for k, v in self._local.items() if v[0] > oldest}
+
+    def hit(self, key, now=None):
+        """Record one event for `key`."""
+        bucket = self._bucket(time.time() if now is None else now)
+        cache_key = self._key(key, bucket)
+        timeout = int(self.window + self.width) + 1
+        try:
+            if not cache.add(cache_key, 1, timeout):
+                try:
+                    cache.incr(cache_key)
+                except ValueError:
+                    # Kalit add va incr orasida eskirgan
+                    cache.set(cache_key, 1, timeout)
+        except Exception:
+            self._local_hit(cache_key, bucket)
+
+    def count(self, key, now=None):
+        """Number of events for `key` within the window."""
+        current = self._bucket(time.time() if now is None else now)
+        keys = [self._key(key, bucket) for bucket in range(current - self.buckets + 1, current + 1)]
+        try:
+            shared = sum(cache.get_many(keys).values())
+        except Exception:
+            shared = 0
+        # Kesh ishlamagan paytdagi hodisalar lokal saqlangan
+        with self._lock:
+            local = sum(self._local[k][1] for k in keys if k in self._local)
+        return shared + local
+
+
+class RecentPayments:
+    """Successful payments per user: the cache counter if the cache is shared, else the ledger."""
+
+    def __init__(self, window):
+        self.window = window
+        self.counter = SlidingWindowCounter('payments', window=window)
+
+    def hit(self, user_id, now=None):
+        # Umumiy kesh bo'lmasa to'lovning o'zi (Transaction qatori) hisoblanadi
+        if cache_is_shared():
+            self.counter.hit(user_id, now)
+
+    def count(self, user_id, now=None):
+        if cache_is_shared():
+            return self.counter.count(user_id, now)
+        end = datetime.fromtimestamp(time.time() if now is None else now, dt_timezone.utc)
+        # txn_user_type_date_idx; yuqori chegara kelgusi oylar bo'limlarini kesadi
+        return Transaction.objects.filter(
+            user_id=user_id, type='spend', amount__lt=0,
+            date__gte=end - timedelta(seconds=self.window), date__lte=end,
+        ).count()
+
+
+# pay_utility: foydalanuvchining oxirgi 5 daqiqadagi muvaffaqiyatli to'lovlari
+recent_payments = RecentPayments(window=5 * 60)
@@ -0,0 +1,101 @@
+"""
+Read-replica routing.
+
+DATABASE_REPLICA_URLS adds `replica1..N` database aliases. Reads go to a
+random replica only while a GET/HEAD request is served by one of the
+read-only views in DATABASE_REPLICA_VIEWS or an admin changelist
+(ReplicaMiddleware marks the request in `reads`), and only if the user isn't
+pinned to the primary. Everything else - writes, reads inside a
+transaction, migrations, sessions - uses `default`.
+
+A user is pinned for DATABASE_REPLICA_STICKY_SECONDS after any write of
+their own: balance changes and saves of their User/Transaction rows (`pin`,
+wherever they come from) and any non-GET request they make. The pin is a
+marker in the shared cache, so every worker reads that user's `me` and
+transactions from the primary until the replicas have caught up.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import authentication
+from .models import Transaction, User
+
+# Shu so'rovda o'qishlar replikaga yuborilishi mumkinmi
+reads = contextvars.ContextVar('api_replica_reads', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD')
+# Sessiyalar har doim asosiy bazadan (login darhol ishlashi kerak)
+PRIMARY_ONLY = {'sessions'}
+
+
+def _pin_key(user_id):
+    return f'api:db:pin:{user_id}'
+
+
+def pin(user_ids):
+    """Read these users' data from the primary for the next few seconds."""
+    if not settings.DATABASE_REPLICAS or not user_ids:
+        return
+    try:
+        cache.set_many({_pin_key(user_id): 1 for user_id in user_ids}, settings.DATABASE_REPLICA_STICKY_SECONDS)
+    except Exception:
+        pass  # kesh ishlamasa replika kechikishi ko'rinishi mumkin, so'rov buzilmaydi
+
+
+def is_pinned(user_id):
+    try:
+        return cache.get(_pin_key(user_id)) is not None
+    except Exception:
+        return True
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, **kwargs):
+    pin([instance.pk])
+
+
+@receiver(post_save, sender=Transaction)
+def _transaction_saved(sender, instance, **kwargs):
+    pin([instance.user_id])
+
+
+def replica_view(view_name):
+    return view_name in settings.DATABASE_REPLICA_VIEWS or (
+        view_name.startswith('admin:') and view_name.endswith('_changelist')
+    )
+
+
+def request_user_id(request):
+    """The requesting user's id from the session or Bearer token, without loading the user."""
+    user_id = authentication.access_token_user_id(request)
+    if user_id is None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+        user_id = request.session.get(SESSION_KEY)
+    return user_id
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not reads.get() or model._meta.app_label in PRIMARY_ONLY:
+            return None
+        # Tranzaksiya ichidagi o'qishlar yozuvlar bilan bir bazada
+        if connections['default'].in_atomic_block:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Replikadan o'qilgan obyekt saqlansa ham - asosiy bazaga
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replikalar sxemani replikatsiya orqali oladi
+        return db == 'default'
@@ -0,0 +1,132 @@
+"""
+Payment fraud rules.
+
+Rules are declared as data in RULES. For every provider the engine binds
+that provider's thresholds into the rule checks once, orders them by cost
+(pure checks first, cache-backed ones last) and stops evaluating as soon as
+the accumulated score reaches BLOCK_SCORE. Each rule keeps call/hit/time
+counters, exposed through `FraudEngine.rule_stats()`; an evaluation adds to
+them once, under a lock, after its last rule.
+"""
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+
+from . import counters
+
+FraudResult = namedtuple('FraudResult', ['blocked', 'score', 'reasons'])
+
+BLOCK_SCORE = 1.0
+
+DEFAULT_THRESHOLDS = {
+    'min_account_length': 6,
+    'max_account_length': 15,
+    'max_amount': Decimal('10000000'),  # 10 million UZS
+    'max_recent_payments': 5,  # oxirgi 5 daqiqada
+}
+
+
+class Rule:
+    __slots__ = ('name', 'cost', 'weight', 'reason', 'check')
+
+    def __init__(self, name, cost, weight, reason, check):
+        self.name = name
+        self.cost = cost
+        self.weight = weight
+        self.reason = reason
+        self.check = check
+
+
+# check(payment, thresholds) -> True bo'lsa qoida ishlagan (shubhali)
+RULES = [
+    Rule('account_format', cost=1, weight=1.0,
+         reason='Hisob raqami noto\'g\'ri formatda',
+         check=lambda p, t: bool(p['account_number']) and not p['account_number'].isdigit()),
+    Rule('account_length', cost=1, weight=1.0,
+         reason='Hisob raqami uzunligi noto\'g\'ri',
+         check=lambda p, t: p['account_number'].isdigit() and not (
+             t['min_account_length'] <= len(p['account_number']) <= t['max_account_length'])),
+    Rule('amount_not_positive', cost=1, weight=1.0,
+         reason='Summa noto\'g\'ri',
+         check=lambda p, t: p['amount'] <= 0),
+    Rule('amount_too_large', cost=1, weight=1.0,
+         reason='Juda katta summa',
+         check=lambda p, t: p['amount'] > t['max_amount']),
+    Rule('rapid_payments', cost=10, weight=1.0,
+         reason='Juda ko\'p tez to\'lovlar',
+         check=lambda p, t: p['recent_payments']() >= t['max_recent_payments']),
+]
+
+
+class FraudEngine:
+    def __init__(self, rules, thresholds=None, provider_thresholds=None, velocity=None, block_score=BLOCK_SCORE):
+        self.rules = sorted(rules, key=lambda rule: rule.cost)
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.provider_thresholds = provider_thresholds or {}
+        self.velocity = velocity or counters.recent_payments
+        self.block_score = block_score
+        self._compiled = {}
+        # nomi -> [chaqiruvlar, ishlaganlar, jami ns]
+        self._stats = {rule.name: [0, 0, 0] for rule in self.rules}
+        self._stats_lock = threading.Lock()
+
+    def _compile(self, provider):
+        thresholds = {**self.thresholds, **self.provider_thresholds.get(provider, {})}
+        compiled = [
+            (rule.check, thresholds, rule.weight, rule.reason, self._stats[rule.name])
+            for rule in self.rules
+        ]
+        self._compiled[provider] = compiled
+        return compiled
+
+    def evaluate(self, user_id, provider, account_number, amount):
+        # Sozlanmagan provayderlar umumiy (None) ro'yxatdan foydalanadi
+        key = provider if provider in self.provider_thresholds else None
+        compiled = self._compiled.get(key) or self._compile(key)
+        velocity = self.velocity
+        payment = {
+            'provider': provider,
+            'account_number': account_number or '',
+            'amount': amount,
+            'recent_payments': lambda: velocity.count(user_id),
+        }
+
+        score = 0.0
+        reasons = []
+        observed = []
+        clock = time.perf_counter_ns
+        for check, thresholds, weight, reason, stats in compiled:
+            started = clock()
+            hit = check(payment, thresholds)
+            observed.append((stats, hit, clock() - started))
+            if hit:
+                score += weight
+                reasons.append(reason)
+                if score >= self.block_score:
+                    break
+
+        # Hisoblagichlar thread'lar orasida umumiy - `+=` atomik emas
+        with self._stats_lock:
+            for stats, hit, elapsed in observed:
+                stats[0] += 1
+                stats[1] += hit
+                stats[2] += elapsed
+        return FraudResult(score >= self.block_score, score, reasons)
+
+    def rule_stats(self):
+        with self._stats_lock:
+            snapshot = {name: tuple(values) for name, values in self._stats.items()}
+        return {
+            name: {'calls': calls, 'hits': hits, 'total_ms': round(total_ns / 1e6, 3)}
+            for name, (calls, hits, total_ns) in snapshot.items()
+        }
+
+
+engine = FraudEngine(
+    RULES,
+    thresholds=settings.FRAUD_THRESHOLDS,
+    provider_thresholds=settings.FRAUD_PROVIDER_THRESHOLDS,
+)
@@ -0,0 +1,216 @@
+"""
+Local verification of Google ID tokens.
+
+Google's signing certificates are cached in process memory and in the shared
+Django cache for as long as their Cache-Control max-age allows, so a login
+verifies the token signature without any network call. The certificate
+endpoint is only contacted when the cache expires or a token is signed with
+a key we haven't seen yet (key rotation); logins that arrive during a fetch
+wait for it and share its result. `averify_id_token` is the same for async
+views, fetching through the pooled api.http_client.
+"""
+import asyncio
+import re
+import threading
+import time
+import weakref
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from google.auth import exceptions as google_exceptions, jwt as google_jwt
+
+from . import http_client, metrics
+
+ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+CACHE_KEY = 'api:google_certs'
+
+DEFAULT_MAX_AGE = 3600
+# Noma'lum `kid` bilan kelgan tokenlar sertifikatlarni tez-tez qayta yuklatmasligi uchun
+MIN_REFRESH_INTERVAL = 60
+CLOCK_SKEW = 10
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+_session = requests.Session()
+_certs = {'keys': None, 'expires_at': 0.0, 'fetched_at': 0.0}
+_last_forced_refresh = [0.0]
+_lock = threading.Lock()
+_async_locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+
+
+def _max_age(response):
+    match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+def _entry(response):
+    response.raise_for_status()
+    now = time.time()
+    return {'keys': response.json(), 'expires_at': now + _max_age(response), 'fetched_at': now}
+
+
+def _fetch():
+    with metrics.timed('http'):
+        response = _session.get(settings.GOOGLE_CERTS_URL, timeout=10)
+    entry = _entry(response)
+    cache.set(CACHE_KEY, entry, max(1, int(entry['expires_at'] - time.time())))
+    return entry
+
+
+async def _afetch():
+    with metrics.timed('http'):
+        response = await http_client.get(settings.GOOGLE_CERTS_URL, timeout=10)
+    entry = _entry(response)
+    await cache.aset(CACHE_KEY, entry, max(1, int(entry['expires_at'] - time.time())))
+    return entry
+
+
+def clear():
+    _certs.update(keys=None, expires_at=0.0, fetched_at=0.0)
+    _last_forced_refresh[0] = 0.0
+    cache.delete(CACHE_KEY)
+
+
+def _memory(refresh, waiting_since=None):
+    """Keys usable without a fetch, or None."""
+    keys = _certs['keys']
+    if not keys:
+        return None
+    # Lock kutilayotganda boshqa so'rov yuklab bo'ldi - bir xil so'rovlar birlashadi
+    if waiting_since is not None and _certs['fetched_at'] >= waiting_since:
+        return keys
+    if not refresh and time.time() < _certs['expires_at']:
+        return keys
+    return None
+
+
+def _use_shared(entry, refresh, now):
+    # Boshqa worker allaqachon yuklagan bo'lsa - umumiy keshdan olamiz
+    return entry and entry['expires_at'] > now and (
+        not refresh or entry['fetched_at'] > _certs['fetched_at']
+    )
+
+
+def _throttled(refresh, now):
+    # Noma'lum `kid` uchun majburiy yangilash MIN_REFRESH_INTERVAL da bir martadan ko'p emas
+    if not refresh:
+        return False
+    if now - _last_forced_refresh[0] < MIN_REFRESH_INTERVAL:
+        return True
+    _last_forced_refresh[0] = now
+    return False
+
+
+def get_certs(refresh=False):
+    """Return the {kid: PEM} mapping, fetching it only when necessary."""
+    keys = _memory(refresh)
+    if keys is not None:
+        return keys
+
+    waiting_since = time.time()
+    with _lock:
+        keys = _memory(refresh, waiting_since)
+        if keys is not None:
+            return keys
+        now = time.time()
+        entry = cache.get(CACHE_KEY)
+        if not _use_shared(entry, refresh, now):
+            if _throttled(refresh, now):
+                return _certs['keys'] or {}
+            entry = _fetch()
+        _certs.update(entry)
+        return _certs['keys']
+
+
+def _async_lock():
+    loop = asyncio.get_running_loop()
+    lock = _async_locks.get(loop)
+    if lock is None:
+        lock = _async_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def aget_certs(refresh=False):
+    """get_certs() for async views: waits for the fetch without holding a thread."""
+    keys = _memory(refresh)
+    if keys is not None:
+        return keys
+
+    waiting_since = time.time()
+    async with _async_lock():
+        keys = _memory(refresh, waiting_since)
+        if keys is not None:
+            return keys
+        now = time.time()
+        entry = await cache.aget(CACHE_KEY)
+        if not _use_shared(entry, refresh, now):
+            if _throttled(refresh, now):
+                return _certs['keys'] or {}
+            entry = await _afetch()
+        _certs.update(entry)
+        return _certs['keys']
+
+
+def _audience():
+    # `aud` tekshiruvisiz istalgan Google ilovasi uchun berilgan token qabul qilinardi
+    if not settings.GOOGLE_CLIENT_ID:
+        raise ImproperlyConfigured('GOOGLE_CLIENT_ID sozlanmagan - Google tokenlari qabul qilinmaydi')
+    return settings.GOOGLE_CLIENT_ID
+
+
+def _kid(token):
+    """The token's key id; ValueError for a malformed token."""
+    try:
+        kid = google_jwt.decode_header(token).get('kid')
+    except (ValueError, TypeError, AttributeError, google_exceptions.GoogleAuthError) as e:
+        raise ValueError(f'Token sarlavhasi o\'qilmadi: {e}') from e
+    if not isinstance(kid, str):
+        raise ValueError('Token sarlavhasida kid yo\'q')
+    return kid
+
+
+def _decode(token, certs):
+    try:
+        payload = google_jwt.decode(
+            token,
+            certs=certs,
+            audience=_audience(),
+            clock_skew_in_seconds=CLOCK_SKEW,
+        )
+    except google_exceptions.GoogleAuthError as e:
+        raise ValueError(str(e)) from e
+    if payload.get('iss') not in ISSUERS:
+        raise ValueError('Noto\'g\'ri token issuer')
+    return payload
+
+
+def verify_id_token(token):
+    """
+    Verify a Google ID token signature and claims locally.
+
+    Returns the token payload; raises ValueError if the token is invalid and
+    ImproperlyConfigured if GOOGLE_CLIENT_ID is not set.
+    """
+    _audience()
+    kid = _kid(token)
+    certs = get_certs()
+    if kid not in certs:
+        # Google kalitlarni almashtirgan bo'lishi mumkin
+        certs = get_certs(refresh=True)
+    if kid not in certs:
+        raise ValueError('Noma\'lum Google kaliti')
+    return _decode(token, certs)
+
+
+async def averify_id_token(token):
+    """verify_id_token() for async views."""
+    _audience()
+    kid = _kid(token)
+    certs = await aget_certs()
+    if kid not in certs:
+        certs = await aget_certs(refresh=True)
+    if kid not in certs:
+        raise ValueError('Noma\'lum Google kaliti')
+    return _decode(token, certs)
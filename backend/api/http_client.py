@@ -0,0 +1,58 @@
+"""
+Shared async HTTP client for the async views (api/async_views.py).
+
+One httpx.AsyncClient per event loop (a uvicorn worker has one) keeps its
+connections to Google alive between requests and speaks HTTP/2 when the
+`h2` package is installed. httpx is optional: without it the request is
+made with a shared requests.Session in a worker thread, which still frees
+the event loop but not the thread.
+"""
+import asyncio
+import importlib.util
+import weakref
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - ixtiyoriy paket
+    httpx = None
+
+HTTP2 = httpx is not None and importlib.util.find_spec('h2') is not None
+
+# Chaqiruvchilar tutadigan tarmoq xatolari (ikkala kutubxona uchun)
+ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+_session = requests.Session()
+
+
+def _client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=settings.ASYNC_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+    return client
+
+
+async def get(url, timeout=10):
+    """GET `url`; the response has .status_code, .headers, .json() and .raise_for_status()."""
+    if httpx is None:
+        return await sync_to_async(_session.get, thread_sensitive=False)(url, timeout=timeout)
+    return await _client().get(url, timeout=timeout)
+
+
+async def aclose():
+    """Close the current event loop's client (worker shutdown, benchmarks)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,162 @@
+"""
+Idempotency-Key support for retried write endpoints.
+
+A client that may retry a request (flaky mobile network) sends the same
+`Idempotency-Key` header with every attempt. The first attempt claims the
+(action + user, key) row in the IdempotencyKey table (for anonymous
+requests: action + URL pk + client IP) and runs the view; its response is
+stored in the same transaction as the view's writes. Later attempts
+replay the stored response without running the view again.
+Attempts that arrive while the first is still running wait for it (up to
+IDEMPOTENCY_WAIT_SECONDS) and replay its result, so concurrent duplicates
+execute once.
+
+Rate-limited (429) and server-error (5xx) responses are not stored; the
+claim is released so the client can retry. Rows expire after
+IDEMPOTENCY_TTL_SECONDS and are deleted by `purge_idempotency_keys`.
+"""
+import functools
+import hashlib
+import json
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import ratelimit
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+_KEY_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+def _scope(action, request, view_kwargs):
+    # ratelimit'dagi 'user' kaliti kabi: sessiya foydalanuvchisi yoki URL'dagi pk
+    if request.user.is_authenticated:
+        return f'{action}:{request.user.pk}'
+    # Anonim: URL'dagi pk ni bilgan boshqa mijoz shu kalit bilan saqlangan javobni
+    # (balans va h.k.) ololmasligi uchun IP ham kiradi; uzunligi scope ustuniga sig'adi
+    ip = hashlib.sha256(ratelimit.client_ip(request).encode()).hexdigest()[:16]
+    return f'{action}:pk:{view_kwargs.get("pk")}:ip:{ip}'
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.method.encode() + request.path.encode() + b'\n' + request.body).hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response, status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _error(message, code, retry_after=None):
+    response = Response({'error': message, 'success': False}, status=code)
+    if retry_after is not None:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _claim(scope, key, fingerprint):
+    """
+    Insert the pending row for (scope, key). Returns None if this request
+    claimed it, otherwise the existing row.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+            )
+        return None
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if record is None:
+        # Shu orada purge o'chirib yubordi - qayta urinamiz
+        return _claim(scope, key, fingerprint)
+    stale = record.status_code is None and record.created_at < now - timedelta(
+        seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    if record.expires_at < now or stale:
+        # Muddati o'tgan javob yoki to'xtab qolgan worker'ning da'vosi - shartli
+        # UPDATE bilan qayta egallash (bir vaqtda faqat bittasi muvaffaqiyatli)
+        taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+            fingerprint=fingerprint, status_code=None, response=None, created_at=now,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        )
+        if taken:
+            return None
+        record.refresh_from_db()
+    return record
+
+
+def _wait(record):
+    """Poll a pending row until its response is stored. None on timeout/release."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.01
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None or record.status_code is not None:
+            return record
+    return None
+
+
+def idempotent(action):
+    """Decorator for ViewSet actions; a no-op unless the request has an Idempotency-Key."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            if key is None or not settings.IDEMPOTENCY_ENABLED:
+                return view_method(self, request, *args, **kwargs)
+            if not _KEY_RE.match(key):
+                return _error('Idempotency-Key noto\'g\'ri formatda', status.HTTP_400_BAD_REQUEST)
+
+            scope = _scope(action, request, kwargs)
+            fingerprint = _fingerprint(request)
+            record = _claim(scope, key, fingerprint)
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    return _error('Idempotency-Key boshqa so\'rov uchun ishlatilgan',
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if record.status_code is None:
+                    record = _wait(record)
+                    if record is None:
+                        return _error('So\'rov hali bajarilmoqda, keyinroq qayta urinib ko\'ring',
+                                      status.HTTP_409_CONFLICT, retry_after=1)
+                return _replay(record)
+
+            stored = False
+            try:
+                # View yozuvlari va saqlangan javob bitta tranzaksiyada: worker
+                # o'rtada o'lsa, ikkalasi ham bekor bo'ladi
+                with transaction.atomic():
+                    # Birinchi bo'lib o'z qatorimizni qulflaymiz: Postgres'da da'vo
+                    # tranzaksiya oxirigacha egallanmaydi, SQLite'da tranzaksiya boshidan
+                    # yozuvchi bo'ladi ("database is locked" o'rniga navbat kutadi)
+                    IdempotencyKey.objects.filter(scope=scope, key=key).update(fingerprint=fingerprint)
+                    response = view_method(self, request, *args, **kwargs)
+                    code = response.status_code
+                    if code >= 500:
+                        transaction.set_rollback(True)
+                    elif code != status.HTTP_429_TOO_MANY_REQUESTS and isinstance(response, Response):
+                        IdempotencyKey.objects.filter(scope=scope, key=key).update(
+                            status_code=code, response=response.data,
+                        )
+                        stored = True
+            finally:
+                if not stored:
+                    IdempotencyKey.objects.filter(scope=scope, key=key, status_code__isnull=True).delete()
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,402 @@
+"""
+Recycling leaderboards: global, per region and per district.
+
+Rankings are kept outside the users table, keyed by scope
+(`global`, `region:<region>`, `district:<region>:<district>`):
+
+- with REDIS_URL, in Redis sorted sets shared by all workers;
+- otherwise in process memory, as sorted lists rebuilt from the database in
+  a background thread every LEADERBOARD_LOCAL_REBUILD_SECONDS (requests are
+  served from the previous lists meanwhile).
+
+Requests never scan the users table: until the first build finishes a board
+is empty and flagged `building`.
+
+A user's rank is 1 + the number of users in the scope with more kg (ties
+share a rank), answered by ZCOUNT / bisect in O(log n). Rankings are updated
+incrementally when a balance credit commits or a user row is saved, and
+rebuilt in full by `manage.py rebuild_leaderboards`.
+"""
+import bisect
+import math
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import User
+
+GLOBAL = 'global'
+MAX_LIMIT = 100
+
+
+def scopes(region, district):
+    """Scope keys a user with this region/district is ranked in."""
+    region = (region or '').strip()
+    district = (district or '').strip()
+    keys = [GLOBAL]
+    if region:
+        keys.append(f'region:{region}')
+        if district:
+            keys.append(f'district:{region}:{district}')
+    return keys
+
+
+def _entries():
+    users = User.objects.filter(is_active=True, is_deleted=False)
+    for pk, kg, region, district in users.values_list(
+            'pk', 'total_recycled_kg', 'region', 'district').iterator(chunk_size=5000):
+        yield pk, float(kg), scopes(region, district)
+
+
+class MemoryRanking:
+    """
+    Per-process rankings: sorted (kg, user_id) lists plus user -> (kg, scopes).
+
+    A request that finds them missing or older than `rebuild_seconds` starts
+    one rebuild in a background thread and is answered from the current
+    lists (empty until the first build finishes); updates that arrive during
+    the rebuild are replayed onto the new lists.
+    """
+
+    def __init__(self, rebuild_seconds):
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._lists = {}
+        self._members = {}
+        self._built_at = None
+        self._pending = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._built_at is not None
+
+    def _ensure_built(self):
+        stale = self._built_at is None or time.monotonic() - self._built_at > self.rebuild_seconds
+        if stale and self._build_lock.acquire(blocking=False):
+            self._thread = threading.Thread(target=self._rebuild_in_background, daemon=True)
+            self._thread.start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            pass  # eski ro'yxatlar bilan davom etamiz - keyingi so'rov yana urinadi
+        finally:
+            connection.close()
+            self._build_lock.release()
+
+    def rebuild(self):
+        with self._lock:
+            self._pending = []
+        try:
+            lists = {}
+            members = {}
+            for user_id, kg, keys in _entries():
+                members[user_id] = (kg, keys)
+                for key in keys:
+                    lists.setdefault(key, []).append((kg, user_id))
+            for items in lists.values():
+                items.sort()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._lists, self._members = lists, members
+            # Qurish paytida kelgan o'zgarishlar bazadan o'qilgan holatdan yangiroq
+            for user_id, kg, keys in pending:
+                self._discard(user_id)
+                if keys is not None:
+                    self._insert(user_id, kg, keys)
+            self._built_at = time.monotonic()
+
+    def _discard(self, user_id):
+        previous = self._members.pop(user_id, None)
+        if previous:
+            kg, keys = previous
+            for key in keys:
+                items = self._lists.get(key, [])
+                index = bisect.bisect_left(items, (kg, user_id))
+                if index < len(items) and items[index] == (kg, user_id):
+                    del items[index]
+
+    def _insert(self, user_id, kg, keys):
+        self._members[user_id] = (kg, keys)
+        for key in keys:
+            bisect.insort(self._lists.setdefault(key, []), (kg, user_id))
+
+    def update(self, user_id, kg, keys):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((user_id, kg, keys))
+            if self._built_at is None:
+                return  # birinchi qurish bazadan to'liq o'qiydi
+            self._discard(user_id)
+            self._insert(user_id, kg, keys)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((user_id, None, None))
+            self._discard(user_id)
+
+    def top(self, key, limit):
+        self._ensure_built()
+        with self._lock:
+            items = self._lists.get(key, [])
+            return [(user_id, kg) for kg, user_id in reversed(items[-limit:])], len(items)
+
+    def rank(self, key, user_id):
+        self._ensure_built()
+        with self._lock:
+            member = self._members.get(user_id)
+            if member is None or key not in member[1]:
+                return None
+            kg = member[0]
+            items = self._lists[key]
+            above = len(items) - bisect.bisect_right(items, (kg, math.inf))
+            return above + 1, kg
+
+
+class RedisRanking:
+    """
+    Shared rankings in Redis sorted sets (member = user id, score = kg).
+
+    A rebuild snapshots the database into temporary keys and renames them
+    over the live ones. Updates made meanwhile are also written to the
+    rebuild's pending hash (registered in `rebuilds_key`) and replayed on
+    top of the snapshot in the same transaction as the rename.
+    """
+    prefix = 'api:lb:'
+    rebuild_timeout = 3600
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.members_key = f'{self.prefix}members'
+        self.scopes_key = f'{self.prefix}scopes'
+        self.rebuilds_key = f'{self.prefix}rebuilds'
+        # Birinchi to'liq qurishdan keyin qo'yiladi (scopes_key update'lardan ham paydo bo'ladi)
+        self.built_key = f'{self.prefix}built'
+
+    def _key(self, scope):
+        return f'{self.prefix}z:{scope}'
+
+    @property
+    def ready(self):
+        return bool(self.client.exists(self.built_key))
+
+    def _ensure_built(self):
+        # Yangi Redis: bitta worker fon oqimida quradi, so'rovlar bo'sh ro'yxat ko'radi
+        if not self.client.exists(self.built_key) and cache.add(f'{self.prefix}building', 1, 300):
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            pass  # keyingi so'rov yana urinadi
+        finally:
+            cache.delete(f'{self.prefix}building')
+            connection.close()
+
+    def rebuild(self):
+        token = f'{self.prefix}tmp:{time.time_ns()}:'
+        pending_key = f'{token}pending'
+        # Shu paytdan keyingi update/remove'lar pending_key'ga ham yoziladi
+        self.client.zadd(self.rebuilds_key, {pending_key: time.time() + self.rebuild_timeout})
+        try:
+            built = set()
+            pipe = self.client.pipeline(transaction=False)
+            for count, (user_id, kg, keys) in enumerate(_entries(), 1):
+                pipe.hset(f'{token}members', user_id, '\x1f'.join(keys))
+                for key in keys:
+                    pipe.zadd(f'{token}z:{key}', {user_id: kg})
+                    built.add(key)
+                if count % 5000 == 0:
+                    pipe.execute()
+            pipe.execute()
+            self._swap(token, built, pending_key)
+        finally:
+            self.client.zrem(self.rebuilds_key, pending_key)
+            self.client.delete(pending_key)
+
+    def _swap(self, token, built, pending_key):
+        from redis.exceptions import WatchError
+
+        stale = {scope.decode() for scope in self.client.smembers(self.scopes_key)} - built
+        with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # pending_key o'zgarsa (yangi update) EXEC bekor bo'ladi va qayta o'qiladi
+                    pipe.watch(pending_key)
+                    pending = pipe.hgetall(pending_key)
+                    users = list(pending)
+                    snapshot = pipe.hmget(f'{token}members', users) if users else []
+
+                    pipe.multi()
+                    for key in built:
+                        pipe.rename(f'{token}z:{key}', self._key(key))
+                    for key in stale:
+                        pipe.delete(self._key(key))
+                    if built:
+                        pipe.rename(f'{token}members', self.members_key)
+                    pipe.delete(self.scopes_key)
+                    pipe.sadd(self.scopes_key, GLOBAL, *built)
+                    # Snapshot'dan keyin kelgan o'zgarishlar bazadan o'qilgan holatdan yangiroq
+                    for user_id, previous in zip(users, snapshot):
+                        kg, keys = self._decode(pending[user_id])
+                        self._write(pipe, int(user_id), kg, keys, previous)
+                    pipe.set(self.built_key, 1)
+                    pipe.zremrangebyscore(self.rebuilds_key, '-inf', time.time())  # to'xtab qolgan qurishlar
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    @staticmethod
+    def _encode(kg, keys):
+        return '' if keys is None else f'{kg}\x1e' + '\x1f'.join(keys)
+
+    @staticmethod
+    def _decode(value):
+        if not value:
+            return None, None
+        kg, keys = value.decode().split('\x1e')
+        return float(kg), keys.split('\x1f')
+
+    def _write(self, pipe, user_id, kg, keys, previous):
+        # keys=None - foydalanuvchi reytingdan chiqariladi
+        if previous:
+            for key in set(previous.decode().split('\x1f')) - set(keys or ()):
+                pipe.zrem(self._key(key), user_id)
+        if keys is None:
+            pipe.hdel(self.members_key, user_id)
+            return
+        for key in keys:
+            pipe.zadd(self._key(key), {user_id: kg})
+        pipe.sadd(self.scopes_key, *keys)
+        pipe.hset(self.members_key, user_id, '\x1f'.join(keys))
+
+    def _apply(self, user_id, kg, keys):
+        read = self.client.pipeline(transaction=False)
+        read.hget(self.members_key, user_id)
+        read.zrangebyscore(self.rebuilds_key, time.time(), '+inf')
+        previous, rebuilds = read.execute()
+        pipe = self.client.pipeline(transaction=True)
+        self._write(pipe, user_id, kg, keys, previous)
+        for pending_key in rebuilds:
+            pipe.hset(pending_key, user_id, self._encode(kg, keys))
+            pipe.expire(pending_key, self.rebuild_timeout)
+        pipe.execute()
+
+    def update(self, user_id, kg, keys):
+        self._apply(user_id, kg, keys)
+
+    def remove(self, user_id):
+        self._apply(user_id, None, None)
+
+    def top(self, key, limit):
+        self._ensure_built()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrange(self._key(key), 0, limit - 1, withscores=True)
+        pipe.zcard(self._key(key))
+        items, total = pipe.execute()
+        return [(int(member), score) for member, score in items], total
+
+    def rank(self, key, user_id):
+        self._ensure_built()
+        kg = self.client.zscore(self._key(key), user_id)
+        if kg is None:
+            return None
+        return self.client.zcount(self._key(key), f'({kg}', '+inf') + 1, kg
+
+
+_ranking = None
+
+
+def ranking():
+    global _ranking
+    if _ranking is None:
+        if settings.REDIS_URL:
+            _ranking = RedisRanking(settings.REDIS_URL)
+        else:
+            _ranking = MemoryRanking(settings.LEADERBOARD_LOCAL_REBUILD_SECONDS)
+    return _ranking
+
+
+def _safely(method, *args):
+    # Reyting ikkilamchi ma'lumot - xatosi asosiy so'rovni buzmasligi kerak;
+    # keyingi to'liq qayta qurishda tuzatiladi
+    try:
+        method(*args)
+    except Exception:
+        pass
+
+
+def record(user_id, kg, region, district):
+    """Update the user's kg in every scope once the current transaction commits."""
+    keys = scopes(region, district)
+    transaction.on_commit(lambda: _safely(ranking().update, user_id, float(kg), keys))
+
+
+def forget(user_id):
+    transaction.on_commit(lambda: _safely(ranking().remove, user_id))
+
+
+RANKED_FIELDS = {'total_recycled_kg', 'region', 'district', 'is_deleted', 'is_active'}
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not RANKED_FIELDS.intersection(update_fields):
+        return  # masalan login'dagi last_login
+    if instance.is_deleted or not instance.is_active:
+        forget(instance.pk)
+    else:
+        record(instance.pk, instance.total_recycled_kg, instance.region, instance.district)
+
+
+def board(scope, limit=10, user_id=None):
+    """Top `limit` users of `scope` plus the rank of `user_id` (if given)."""
+    limit = min(max(limit, 1), MAX_LIMIT)
+    board_ranking = ranking()
+    top, total = board_ranking.top(scope, limit)
+
+    # Faqat ko'rsatiladigan N ta foydalanuvchi PK bo'yicha o'qiladi
+    users = User.objects.only('username', 'first_name', 'last_name', 'level').in_bulk(
+        [member for member, _ in top])
+    entries = []
+    rank = previous_kg = None
+    for position, (member, kg) in enumerate(top):
+        if kg != previous_kg:  # teng kg - teng o'rin
+            rank, previous_kg = position + 1, kg
+        user = users.get(member)
+        if user is None:
+            continue
+        entries.append({
+            'rank': rank,
+            'id': user.pk,
+            'username': user.username,
+            'name': f"{user.first_name} {user.last_name}".strip() or user.username,
+            'level': user.level,
+            'total_recycled_kg': f'{Decimal(str(kg)):.2f}',
+        })
+
+    me = None
+    if user_id is not None:
+        found = board_ranking.rank(scope, user_id)
+        if found:
+            me = {'rank': found[0], 'total_recycled_kg': f'{Decimal(str(found[1])):.2f}'}
+    # Birinchi qurish hali tugamagan - bo'sh javob, mijoz keyinroq qayta so'raydi
+    building = not total and not board_ranking.ready
+    return {'scope': scope, 'total': total, 'top': entries, 'me': me, 'building': building}
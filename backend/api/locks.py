@@ -0,0 +1,69 @@
+"""
+Locks that keep two runs of a cron command from overlapping.
+
+On PostgreSQL `try_lock` takes a session-level advisory lock
+(pg_try_advisory_lock): it is held by the database connection, so it is
+shared by every host and released by the server if the process dies. On
+SQLite (one host) it takes an exclusive lock on a file in the temp
+directory, released by the OS when the process exits. Unlike a cache key
+with a timeout, neither lock expires while its holder is still running.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _advisory_key(name):
+    """Signed 64-bit key for pg_try_advisory_lock."""
+    return int.from_bytes(hashlib.sha1(f'ecocash:{name}'.encode()).digest()[:8], 'big', signed=True)
+
+
+@contextmanager
+def _advisory_lock(name):
+    key = _advisory_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
+
+
+def _lock_file(handle):
+    if fcntl:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+@contextmanager
+def _file_lock(name):
+    path = os.path.join(tempfile.gettempdir(), f'ecocash-{name}.lock')
+    with open(path, 'a+') as handle:
+        try:
+            _lock_file(handle)
+        except OSError:
+            yield False
+            return
+        # Fayl yopilganda (yoki jarayon tugaganda) lock bo'shaydi
+        yield True
+
+
+@contextmanager
+def try_lock(name):
+    """Yield True if the lock `name` was taken (held until the block exits), False if another run holds it."""
+    lock = _advisory_lock if connection.vendor == 'postgresql' else _file_lock
+    with lock(name) as acquired:
+        yield acquired
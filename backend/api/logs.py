@@ -0,0 +1,102 @@
+"""
+Non-blocking JSON logging.
+
+Request threads only put records on an in-memory queue (QueueJsonHandler);
+a QueueListener thread formats them as JSON lines and writes them to the
+stream, so a slow or blocked stdout/stderr pipe never stalls a request. If
+the queue is full the record is dropped and counted instead of blocking.
+
+Every record carries the correlation id of the request that logged it
+(RequestIdMiddleware sets it from X-Request-ID or generates one). Records
+logged with `extra={'sampled': True}` - high-volume success messages - are
+kept with probability LOG_SAMPLE_RATE.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+request_id = contextvars.ContextVar('api_request_id', default=None)
+
+# LogRecord'ning o'z atributlari - qolganlari `extra` dan kelgan maydonlar
+_RESERVED = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'request_id', 'sampled'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'pid': record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep records marked `sampled` with probability `rate` (default LOG_SAMPLE_RATE)."""
+
+    def __init__(self, rate=None):
+        super().__init__()
+        self.rate = settings.LOG_SAMPLE_RATE if rate is None else rate
+
+    def filter(self, record):
+        return not getattr(record, 'sampled', False) or random.random() < self.rate
+
+
+class QueueJsonHandler(QueueHandler):
+    """QueueHandler whose listener thread writes JSON lines to `stream` (stderr by default)."""
+
+    def __init__(self, stream=None, maxsize=None):
+        super().__init__(queue.Queue(settings.LOG_QUEUE_SIZE if maxsize is None else maxsize))
+        target = logging.StreamHandler(stream)
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.dropped = 0
+        self.start()
+        atexit.register(self.stop)
+        # gunicorn --preload: fork'dan keyin listener thread bolada qayta ishga tushiriladi
+        os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        """Write out whatever is queued and stop the listener thread."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def _restart_in_child(self):
+        self.listener._thread = None
+        self.start()
+
+    def prepare(self, record):
+        # Standart prepare() xabarni shu (so'rov) thread'ida formatlaydi -
+        # bu yerda faqat argumentlar birlashtiriladi, JSON va traceback listener'da
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        # django.request yozuvlari middleware'dan tashqarida - so'rovning o'zidan
+        record.request_id = request_id.get() or getattr(getattr(record, 'request', None), 'request_id', None)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import activity
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = ('DailyUserStats ni Transaction tarixidan qayta hisoblash - foydalanuvchilar '
+            'kichik guruhlarda, har guruh alohida qisqa tranzaksiyada')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Bitta tranzaksiyadagi foydalanuvchilar')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Shu user id dan keyingilardan boshlash (to\'xtatilgan ishni davom ettirish)')
+        parser.add_argument('--pause', type=float, default=0.05, help='Guruhlar orasidagi tanaffus (soniya)')
+        parser.add_argument('--show-unparsed', type=int, default=50,
+                            help='kg o\'qilmagan qatorlardan nechtasini chiqarish')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last = options['start_after']
+        users = rows = 0
+        unparsed = []
+        while True:
+            user_ids = list(User.objects.filter(pk__gt=last).order_by('pk')
+                            .values_list('pk', flat=True)[:options['chunk_size']])
+            if not user_ids:
+                break
+            rows += activity.backfill(user_ids, unparsed)
+            users += len(user_ids)
+            last = user_ids[-1]
+            self.stdout.write(f'  user id <= {last}: {users} ta foydalanuvchi, {rows} ta kunlik qator')
+            time.sleep(options['pause'])
+
+        if unparsed:
+            # Bu qatorlarning kg'i 0 deb olindi - tavsifni tuzatib qayta ishga tushirish kerak
+            self.stdout.write(self.style.WARNING(f'{len(unparsed)} ta qayta ishlash qatorida kg o\'qilmadi:'))
+            for pk, description in unparsed[:options['show_unparsed']]:
+                self.stdout.write(f'  #{pk}: {description}')
+            if len(unparsed) > options['show_unparsed']:
+                self.stdout.write(f'  ... va yana {len(unparsed) - options["show_unparsed"]} ta')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {users} ta foydalanuvchi, {rows} ta kunlik qator, {len(unparsed)} ta o\'qilmagan kg '
+            f'({time.perf_counter() - started:.1f}s)'
+        ))
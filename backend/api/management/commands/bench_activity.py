@@ -0,0 +1,92 @@
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from api import activity, balance
+from api.models import Transaction
+from bench import seed
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'activity'
+RANGES = {'day': timedelta(days=30), 'week': timedelta(weeks=12), 'month': timedelta(days=365)}
+TRUNC = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _naive(user_id, period):
+    """GROUP BY over raw Transaction rows on every page view."""
+    since = timezone.now() - RANGES[period]
+    return list(
+        Transaction.objects.filter(user_id=user_id, date__gte=since)
+        .annotate(bucket=TRUNC[period]('date')).values('bucket')
+        .annotate(earned=Sum('amount', filter=Q(type='earn')), spent=Sum('amount', filter=Q(type='spend')))
+        .order_by('bucket')
+    )
+
+
+class Command(BenchCommand):
+    help = 'Dashboard grafiklari: xom Transaction GROUP BY vs DailyUserStats rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--per-user', type=int, default=2000, help='Har foydalanuvchiga tranzaksiyalar')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Tarix uzunligi (kun)')
+        parser.add_argument('--lookups', type=int, default=200, help='Har bir period uchun so\'rovlar')
+
+    def _measure(self, call, samples):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        latencies = []
+        with connection.execute_wrapper(count_query):
+            for sample in samples:
+                started = time.perf_counter()
+                call(*sample)
+                latencies.append((time.perf_counter() - started) * 1000)
+        return {'latency': summarize(latencies), 'queries_per_call': round(len(queries) / len(samples), 2)}
+
+    def handle(self, *args, **options):
+        seed.cleanup(TAG)
+        users = seed.seed_users(options['users'], tag=TAG)
+        user_ids = [user.pk for user in users]
+        started = time.perf_counter()
+        rows = seed.seed_transactions(user_ids, options['per_user'], days=options['days'])
+        self.stdout.write(f'{rows} ta tranzaksiya yaratildi ({time.perf_counter() - started:.0f}s)')
+
+        results = {'transactions': rows}
+        try:
+            started = time.perf_counter()
+            daily_rows = sum(activity.backfill(user_ids[i:i + 500]) for i in range(0, len(user_ids), 500))
+            results['backfill'] = {'daily_rows': daily_rows, 'seconds': round(time.perf_counter() - started, 2)}
+
+            # Inkremental yozuv va qayta hisoblash bir xil natija berishi kerak
+            user = users[0]
+            balance.credit(user, Decimal('1500'), Decimal('2.50'), description='Qayta ishlash: 2.50kg',
+                           provider='AI Scanner')
+            balance.debit(user, Decimal('700'), description='Gaz to\'lovi', provider='Gaz')
+            incremental = activity.series(user.pk, 'month')
+            activity.backfill([user.pk])
+            if activity.series(user.pk, 'month') != incremental:
+                raise CommandError('Inkremental rollup backfill natijasidan farq qiladi')
+
+            for period in ('day', 'week', 'month'):
+                samples = [(random.choice(user_ids), period) for _ in range(options['lookups'])]
+                results[period] = {
+                    'raw_group_by': self._measure(_naive, samples),
+                    'rollup': self._measure(activity.series, samples),
+                }
+        finally:
+            seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
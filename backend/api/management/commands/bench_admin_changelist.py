@@ -0,0 +1,128 @@
+import json
+import logging
+import time
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.models import Transaction, User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'admin'
+
+# Oldingi admin.py sozlamalari - o'sha ModelAdmin obyektlariga vaqtincha qo'yiladi
+LEGACY = {
+    Transaction: {
+        'list_select_related': False,
+        'list_filter': ('type', 'date', 'provider'),
+        'search_fields': ('user__username', 'user__email', 'description', 'provider'),
+        'ordering': ('-date',),
+        'date_hierarchy': 'date',
+        'paginator': Paginator,
+        'show_full_result_count': True,
+        'show_facets': admin.ShowFacets.ALLOW,
+    },
+    User: {
+        'list_filter': ('role', 'is_staff', 'is_active', 'is_deleted', 'level'),
+        'search_fields': ('username', 'email', 'first_name', 'last_name'),
+        'ordering': ('-date_joined',),
+        'paginator': Paginator,
+        'show_full_result_count': True,
+        'show_facets': admin.ShowFacets.ALLOW,
+    },
+}
+
+
+class Command(BenchCommand):
+    help = 'Admin changelist render vaqti katta Transaction jadvalida: eski va yangi sozlamalar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Yaratiladigan tranzaksiyalar')
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5, help='Har bir sahifa necha marta ochiladi')
+        parser.add_argument('--reuse', action='store_true', help='Oldingi --keep ma\'lumotlaridan foydalanish')
+        parser.add_argument('--keep', action='store_true', help='Yaratilgan ma\'lumotlarni o\'chirmaslik')
+
+    def _scenarios(self):
+        user = f'{seed.prefix(TAG)}{self.users // 2}'
+        return {
+            'transactions': '/admin/api/transaction/',
+            'transactions_page_50': '/admin/api/transaction/?p=50',
+            'transactions_search_user': f'/admin/api/transaction/?q={user}',
+            'transactions_filter_type': '/admin/api/transaction/?type__exact=spend',
+            'transactions_filter_provider': '/admin/api/transaction/?provider=Gaz',
+            'users': '/admin/api/user/',
+            'users_search': f'/admin/api/user/?q={user}',
+        }
+
+    def _render(self, client, url, repeat):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        response = client.get(url)  # kesh va shablonlarni isitish
+        if response.status_code != 200:
+            raise CommandError(f'{url}: {response.status_code}')
+        latencies = []
+        with connection.execute_wrapper(count_query):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+        return {'latency': summarize(latencies), 'queries_per_render': len(queries) // repeat}
+
+    def _run(self, client, repeat):
+        return {name: self._render(client, url, repeat) for name, url in self._scenarios().items()}
+
+    # Manifest storage collectstatic talab qiladi - shablonlar uchun oddiy storage
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        self.users = options['users']
+        if not options['reuse']:
+            seed.cleanup(TAG)
+            users = seed.seed_users(self.users, tag=TAG)
+            per_user = max(1, options['rows'] // self.users)
+            started = time.perf_counter()
+            rows = seed.seed_transactions([user.pk for user in users], per_user, days=3 * 365)
+            self.stdout.write(f'{rows} ta tranzaksiya yaratildi ({time.perf_counter() - started:.0f}s)')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else 'ANALYZE api_transaction, api_user')
+
+        staff, _ = User.objects.get_or_create(username=f'{seed.prefix(TAG)}staff', defaults={
+            'email': f'{seed.prefix(TAG)}staff@seed.local', 'is_staff': True, 'is_superuser': True,
+        })
+        client = make_client()
+        client.force_login(staff)
+
+        results = {'transactions': Transaction.objects.count(), 'users': User.objects.count()}
+        try:
+            for mode in ('legacy', 'current'):
+                saved = {}
+                if mode == 'legacy':
+                    for model, attributes in LEGACY.items():
+                        model_admin = admin.site._registry[model]
+                        saved[model] = {name: getattr(model_admin, name) for name in attributes}
+                        for name, value in attributes.items():
+                            setattr(model_admin, name, value)
+                cache.clear()
+                try:
+                    results[mode] = self._run(client, options['repeat'])
+                finally:
+                    for model, attributes in saved.items():
+                        for name, value in attributes.items():
+                            setattr(admin.site._registry[model], name, value)
+        finally:
+            if not options['keep']:
+                seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
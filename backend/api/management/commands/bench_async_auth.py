@@ -0,0 +1,146 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+from django.core.management.base import CommandError
+
+from bench import seed
+from bench.database import BenchCommand
+from bench.google import StandInGoogleServer
+from bench.stats import summarize
+
+TAG = 'asyncauth'
+PATH = '/api/users/google_auth/'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BenchCommand):
+    help = ('Parallel Google loginlar: sinxron gunicorn (gthread) va ASGI uvicorn (ASYNC_VIEWS) '
+            'bitta worker jarayoni bilan, sekin lokal Google sertifikat serveriga qarshi')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=64, help='Parallel mijozlar')
+        parser.add_argument('--duration', type=float, default=10, help='Har bir rejim uchun (soniya)')
+        parser.add_argument('--threads', type=int, default=4, help='Sinxron worker thread\'lari')
+        parser.add_argument('--cert-delay-ms', type=float, default=100,
+                            help='Sertifikat so\'rovining kechikishi (Google bilan round trip)')
+        parser.add_argument('--max-age', type=int, default=0,
+                            help='Sertifikatlar Cache-Control max-age; 0 - har login tarmoqqa chiqadi')
+        parser.add_argument('--modes', default='sync,async')
+
+    def _command(self, mode, port, threads):
+        if mode == 'sync':
+            return [sys.executable, '-m', 'gunicorn', 'ecocash_backend.wsgi', '--workers', '1',
+                    '--worker-class', 'gthread', '--threads', str(threads),
+                    '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+        return [sys.executable, '-m', 'uvicorn', 'ecocash_backend.asgi:application', '--workers', '1',
+                '--host', '127.0.0.1', '--port', str(port), '--lifespan', 'off',
+                '--no-access-log', '--log-level', 'warning']
+
+    def _start(self, mode, google, options, log_file):
+        port = _free_port()
+        env = {
+            **os.environ,
+            'ASYNC_VIEWS': str(mode == 'async'),
+            'GOOGLE_CERTS_URL': google.certs_url,
+            'GOOGLE_CLIENT_ID': google.client_id,
+            'RATE_LIMIT_ENABLED': 'False',
+            'SECURE_SSL_REDIRECT': 'False',
+            'LOG_LEVEL': 'WARNING',
+            'DJANGO_LOG_LEVEL': 'ERROR',
+        }
+        process = subprocess.Popen(self._command(mode, port, options['threads']), env=env,
+                                   stdout=subprocess.DEVNULL, stderr=log_file)
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                break
+            try:
+                requests.get(url + '/api/stats/', timeout=1)
+                return process, url
+            except requests.RequestException:
+                time.sleep(0.2)
+        process.kill()
+        log_file.seek(0)
+        raise CommandError(f'{mode} server ishga tushmadi:\n{log_file.read()[-2000:]}')
+
+    def _client(self, url, token, deadline, latencies, statuses, lock):
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = session.post(url + PATH, json={'token': token})
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+
+    def _run(self, mode, google, tokens, options):
+        with tempfile.TemporaryFile('w+') as log_file:
+            process, url = self._start(mode, google, options, log_file)
+            try:
+                # Isitish: sertifikatlar va DB ulanishi
+                requests.post(url + PATH, json={'token': tokens[0]})
+                fetches, connections = google.requests, google.connections
+                latencies, statuses, lock = [], Counter(), threading.Lock()
+                deadline = time.monotonic() + options['duration']
+                started = time.perf_counter()
+                threads = [threading.Thread(target=self._client,
+                                            args=(url, token, deadline, latencies, statuses, lock))
+                           for token in tokens]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+            finally:
+                process.terminate()
+                process.wait(10)
+        return {
+            'logins': len(latencies),
+            'logins_per_second': round(len(latencies) / elapsed, 1),
+            'latency': summarize(latencies),
+            'statuses': dict(statuses),
+            'cert_fetches': google.requests - fetches,
+            'cert_connections': google.connections - connections,
+        }
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',')]
+        for mode in modes:
+            module = {'sync': 'gunicorn', 'async': 'uvicorn'}.get(mode)
+            if module is None:
+                raise CommandError(f'Noma\'lum rejim: {mode}')
+            try:
+                __import__(module)
+            except ImportError:
+                raise CommandError(f'{mode} rejimi uchun {module} kerak: pip install {module}')
+
+        seed.cleanup(TAG)
+        users = seed.seed_users(options['clients'], tag=TAG)
+        results = {
+            'clients': options['clients'],
+            'sync_threads': options['threads'],
+            'cert_delay_ms': options['cert_delay_ms'],
+            'cert_max_age': options['max_age'],
+        }
+        try:
+            with StandInGoogleServer(max_age=options['max_age'], delay=options['cert_delay_ms'] / 1000) as google:
+                tokens = [google.id_token(user.email) for user in users]
+                for mode in modes:
+                    results[mode] = self._run(mode, google, tokens, options)
+        finally:
+            seed.cleanup(TAG)
+        self.stdout.write(json.dumps(results, indent=2))
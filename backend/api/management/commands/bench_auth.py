@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+
+from api.models import User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+MODES = ['session', 'cached_session', 'token']
+PATHS = ['/api/users/me/', '/api/transactions/']
+
+
+class Command(BenchCommand):
+    help = 'Autentifikatsiya qilingan so\'rovlardagi DB so\'rovlari: AUTH_MODE bo\'yicha taqqoslash'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Har bir endpoint uchun so\'rovlar')
+        parser.add_argument('--mode', choices=MODES,
+                            help='Faqat shu rejimni o\'lchash (AUTH_MODE shu qiymatga teng bo\'lishi kerak)')
+
+    def _measure(self, count):
+        if settings.AUTH_MODE != self.mode:
+            raise CommandError(f'AUTH_MODE={settings.AUTH_MODE}, --mode={self.mode}')
+        seed.cleanup('auth')
+        user = seed.seed_users(1, tag='auth')[0]
+        user.set_password('bench-password')
+        user.save(update_fields=['password'])
+
+        client = make_client()
+        response = client.post('/api/users/login/', {'username': user.username, 'password': 'bench-password'},
+                               content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'login: {response.status_code} {response.content[:200]}')
+        headers = {}
+        if self.mode == 'token':
+            # Faqat Bearer token - sessiya cookie'si yuborilmaydi
+            client.cookies.clear()
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {response.json()["access"]}'
+
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        results = {}
+        try:
+            for path in PATHS:
+                client.get(path, **headers)  # kesh isitish
+                latencies = []
+                del queries[:]
+                with connection.execute_wrapper(count_query):
+                    for _ in range(count):
+                        started = time.perf_counter()
+                        response = client.get(path, **headers)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        if response.status_code != 200:
+                            raise CommandError(f'{path}: {response.status_code} {response.content[:200]}')
+                auth_queries = [sql for sql in queries if 'django_session' in sql or '"api_user"' in sql]
+                results[path] = {
+                    'latency': summarize(latencies),
+                    'queries_per_request': round(len(queries) / count, 2),
+                    'auth_queries_per_request': round(len(auth_queries) / count, 2),
+                }
+        finally:
+            seed.cleanup('auth')
+        return results
+
+    def handle(self, *args, **options):
+        self.mode = options['mode']
+        if self.mode:
+            self.stdout.write(json.dumps(self._measure(options['requests'])))
+            return
+
+        # DRF autentifikatsiya klasslari import vaqtida o'qiladi - har rejim alohida jarayonda
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, sys.argv[0], 'bench_auth', '--mode', mode, '--requests', str(options['requests'])],
+                env={**os.environ, 'AUTH_MODE': mode},
+                capture_output=True, text=True, check=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import connection
+
+from api import balance
+from api.models import Transaction, User
+from bench.database import BenchCommand
+
+
+class Command(BenchCommand):
+    help = 'Bitta foydalanuvchiga parallel to\'lov/daromad: throughput va yakuniy balans to\'g\'riligi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=4000, help='Jami operatsiyalar (yarmi to\'lov, yarmi daromad)')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--legacy', action='store_true',
+                            help='Eski usul: balansni Python\'da o\'zgartirib user.save() qilish')
+
+    def _legacy(self, user_id, op, amount):
+        # Oldingi views.py kodi: o'qish -> o'zgartirish -> butun qatorni saqlash
+        user = User.objects.get(pk=user_id)
+        if op == 'earn':
+            user.balance += amount
+        elif user.balance >= amount:
+            user.balance -= amount
+        else:
+            raise balance.InsufficientFunds()
+        user.save()
+
+    def handle(self, *args, **options):
+        count = options['operations']
+        legacy = options['legacy']
+        start_balance = Decimal('1000000.00')
+        amount = Decimal('10.00')
+
+        user = User.objects.create_user(username=f'bench-balance-{int(time.time())}', password=None,
+                                        balance=start_balance)
+        ops = ['earn' if i % 2 else 'spend' for i in range(count)]
+        counters = {'earn': 0, 'spend': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def run(op):
+            try:
+                if legacy:
+                    self._legacy(user.pk, op, amount)
+                elif op == 'earn':
+                    balance.credit(User(pk=user.pk), amount, description='bench', provider='bench')
+                else:
+                    balance.debit(User(pk=user.pk), amount, description='bench', provider='bench')
+                key = op
+            except balance.InsufficientFunds:
+                key = 'rejected'
+            except Exception:
+                key = 'errors'
+            finally:
+                connection.close()
+            with lock:
+                counters[key] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(run, ops))
+        elapsed = time.perf_counter() - started
+
+        final_balance = User.objects.values_list('balance', flat=True).get(pk=user.pk)
+        expected = start_balance + amount * (counters['earn'] - counters['spend'])
+        result = {
+            'mode': 'legacy' if legacy else 'atomic',
+            'operations': count,
+            'threads': options['threads'],
+            'seconds': round(elapsed, 3),
+            'ops_per_second': round(count / elapsed, 1),
+            **counters,
+            'expected_balance': str(expected),
+            'final_balance': str(final_balance),
+            'correct': final_balance == expected,
+        }
+
+        Transaction.objects.filter(user_id=user.pk).delete()
+        user.delete()
+        self.stdout.write(json.dumps(result, indent=2))
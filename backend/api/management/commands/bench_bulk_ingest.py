@@ -0,0 +1,80 @@
+import json
+import random
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api.models import User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+
+TAG = 'ingest'
+KIOSK_KEY = 'bench-kiosk-key'
+
+
+class Command(BenchCommand):
+    help = 'Kiosk hodisalari: bitta bulk_update_stats so\'rovi vs N ta update_stats chaqiruvi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+
+    def _events(self, user_ids, count):
+        return [
+            {
+                'user_id': random.choice(user_ids),
+                'added_balance': random.randint(100, 2000),
+                'added_kg': round(random.uniform(0.1, 5.0), 2),
+            }
+            for _ in range(count)
+        ]
+
+    def _snapshot(self, user_ids):
+        return {
+            pk: (str(b), str(kg), level)
+            for pk, b, kg, level in User.objects.filter(pk__in=user_ids)
+            .values_list('pk', 'balance', 'total_recycled_kg', 'level')
+        }
+
+    @override_settings(KIOSK_API_KEYS=[KIOSK_KEY], RATE_LIMIT_ENABLED=False)
+    def handle(self, *args, **options):
+        client = make_client()
+        results = {}
+        snapshots = {}
+
+        for mode in ('individual', 'bulk'):
+            seed.cleanup(TAG)
+            random.seed(42)
+            user_ids = [u.pk for u in seed.seed_users(options['users'], tag=TAG)]
+            # Ikkala rejimda bir xil hodisalar (user_id tartib raqami bo'yicha)
+            events = self._events(list(range(len(user_ids))), options['events'])
+            for event in events:
+                event['user_id'] = user_ids[event['user_id']]
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                if mode == 'bulk':
+                    response = client.post('/api/users/bulk_update_stats/', {'events': events},
+                                           content_type='application/json', HTTP_X_KIOSK_KEY=KIOSK_KEY)
+                    assert response.status_code == 200 and response.json()['failed'] == 0, response.content[:200]
+                else:
+                    for event in events:
+                        response = client.post(f"/api/users/{event['user_id']}/update_stats/",
+                                               event, content_type='application/json')
+                        assert response.status_code == 200, response.content[:200]
+            elapsed = time.perf_counter() - started
+
+            results[mode] = {
+                'events': len(events),
+                'seconds': round(elapsed, 3),
+                'events_per_second': round(len(events) / elapsed, 1),
+                'queries': len(queries),
+            }
+            snapshots[mode] = list(self._snapshot(user_ids).values())
+
+        seed.cleanup(TAG)
+        results['speedup'] = round(results['individual']['seconds'] / results['bulk']['seconds'], 1)
+        results['same_final_state'] = snapshots['individual'] == snapshots['bulk']
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,75 @@
+import json
+import time
+
+from django.test.utils import override_settings
+
+from api import outbox
+from api.models import EmailVerification, OutboxEmail
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.smtp import StandInSMTPServer
+from bench.stats import summarize
+
+
+class Command(BenchCommand):
+    help = 'send_verification_code latency: inline SMTP vs outbox (lokal SMTP server bilan)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Har bir rejim uchun so\'rovlar soni')
+        parser.add_argument('--connect-delay', type=float, default=0.3,
+                            help='SMTP ulanish (TCP+TLS) kechikishi, soniya')
+        parser.add_argument('--message-delay', type=float, default=0.01,
+                            help='Har bir xabar uchun server kechikishi, soniya')
+
+    def _run(self, smtp, mode, count):
+        client = make_client()
+        emails = [f'bench-{mode}-{i}@gmail.com' for i in range(count)]
+        latencies = []
+        for email in emails:
+            started = time.perf_counter()
+            response = client.post('/api/users/send_verification_code/', {'email': email},
+                                   content_type='application/json')
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{mode}: {response.status_code} {response.content[:200]}')
+
+        result = {'endpoint': summarize(latencies)}
+        if mode == 'outbox':
+            connections_before = smtp.connections
+            started = time.perf_counter()
+            sent = 0
+            while True:
+                batch_sent, batch_failed = outbox.drain(batch_size=100)
+                sent += batch_sent
+                if batch_sent + batch_failed == 0:
+                    break
+            elapsed = time.perf_counter() - started
+            result['drain'] = {
+                'messages': sent,
+                'seconds': round(elapsed, 3),
+                'messages_per_second': round(sent / elapsed, 1) if elapsed else None,
+                'smtp_connections': smtp.connections - connections_before,
+            }
+
+        EmailVerification.objects.filter(email__in=emails).delete()
+        OutboxEmail.objects.filter(to_email__in=emails).delete()
+        return result
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        results = {}
+        with StandInSMTPServer(connect_delay=options['connect_delay'],
+                               message_delay=options['message_delay']) as smtp:
+            smtp_settings = {
+                'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': smtp.port,
+                'EMAIL_USE_TLS': False,
+                'EMAIL_HOST_USER': 'bench@ecocash.uz',
+                'EMAIL_HOST_PASSWORD': 'bench',
+            }
+            for mode, enabled in (('inline', False), ('outbox', True)):
+                with override_settings(EMAIL_OUTBOX_ENABLED=enabled, **smtp_settings):
+                    results[mode] = self._run(smtp, mode, count)
+
+        self.stdout.write(json.dumps(results, indent=2))
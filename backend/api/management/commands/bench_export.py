@@ -0,0 +1,92 @@
+import gc
+import json
+import os
+import resource
+import time
+
+from django.core.management.base import CommandError
+
+from api.models import Transaction
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+
+TAG = 'export'
+
+
+def _rss_mb():
+    """Current resident set size (Linux /proc), else peak RSS."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BenchCommand):
+    help = 'Tranzaksiya eksporti: N qatorli tarixni oqim bilan yuklab olishda RSS chegaralanganini tekshirish'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5_000_000, help='Bitta foydalanuvchi tarixidagi qatorlar')
+        parser.add_argument('--max-rss-growth-mb', type=float, default=64,
+                            help='Eksport paytida RSS o\'sishi shundan oshsa - xato')
+        parser.add_argument('--reuse', action='store_true', help='Oldingi --keep ma\'lumotlaridan foydalanish')
+        parser.add_argument('--keep', action='store_true', help='Yaratilgan ma\'lumotlarni o\'chirmaslik')
+
+    def _export(self, client, query):
+        gc.collect()
+        baseline = peak = _rss_mb()
+        response = client.get(f'/api/transactions/export/{query}')
+        if response.status_code != 200:
+            raise CommandError(f'{query}: {response.status_code} {response.content[:200]}')
+
+        size = chunks = 0
+        started = time.perf_counter()
+        for chunk in response.streaming_content:
+            size += len(chunk)
+            chunks += 1
+            if chunks % 50 == 0:
+                peak = max(peak, _rss_mb())
+        elapsed = time.perf_counter() - started
+        peak = max(peak, _rss_mb())
+        return {
+            'seconds': round(elapsed, 2),
+            'megabytes': round(size / 2**20, 1),
+            'chunks': chunks,
+            'rss_baseline_mb': round(baseline, 1),
+            'rss_growth_mb': round(peak - baseline, 1),
+        }
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if options['reuse']:
+            user = seed.seed_users(0, tag=TAG)[0]
+        else:
+            seed.cleanup(TAG)
+            user = seed.seed_users(1, tag=TAG)[0]
+            started = time.perf_counter()
+            seed.seed_transactions([user.pk], rows, days=5 * 365)
+            self.stdout.write(f'{rows} ta tranzaksiya yaratildi ({time.perf_counter() - started:.0f}s)')
+        rows = Transaction.objects.filter(user=user).count()
+        user.set_password('bench-password')
+        user.save(update_fields=['password'])
+
+        client = make_client()
+        client.post('/api/users/login/', {'username': user.username, 'password': 'bench-password'},
+                    content_type='application/json')
+
+        results = {'rows': rows}
+        try:
+            for name, query in (('csv', '?format=csv'), ('ndjson_gzip', '?format=ndjson&gzip=1')):
+                result = self._export(client, query)
+                result['rows_per_second'] = round(rows / result['seconds']) if result['seconds'] else None
+                results[name] = result
+        finally:
+            if not options['keep']:
+                seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
+        worst = max(results[name]['rss_growth_mb'] for name in ('csv', 'ndjson_gzip'))
+        if worst > options['max_rss_growth_mb']:
+            raise CommandError(f'RSS {worst} MB ga o\'sdi (chegara {options["max_rss_growth_mb"]} MB)')
+        self.stdout.write(self.style.SUCCESS(f'✅ RSS o\'sishi {worst} MB - chegaralangan'))
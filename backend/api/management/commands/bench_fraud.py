@@ -0,0 +1,77 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api import fraud
+from bench.stats import summarize
+
+PROVIDERS = ['Elektr', 'Gaz', 'Suv', 'Musor']
+
+
+class _MemoryVelocity:
+    """In-memory stand-in for counters.recent_payments."""
+
+    def __init__(self, users):
+        self.counts = {user_id: random.randint(0, 6) for user_id in range(users)}
+
+    def count(self, key):
+        return self.counts.get(key, 0)
+
+
+class Command(BaseCommand):
+    help = 'Firibgarlik qoidalari dvigateli microbenchmark (DB\'siz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--cache', action='store_true',
+                            help='Tezlik hisoblagichi sifatida sozlangan Django keshidan foydalanish')
+
+    def _payments(self, count, users):
+        payments = []
+        for _ in range(count):
+            roll = random.random()
+            if roll < 0.05:
+                account = 'ABC' + str(random.randint(100, 999))
+            elif roll < 0.10:
+                account = str(random.randint(10, 999))
+            else:
+                account = str(random.randint(100000, 999999999))
+            amount = Decimal(random.choice([-100, 0, 5000, 25000, 150000, 20_000_000]))
+            payments.append((random.randrange(users), random.choice(PROVIDERS), account, amount))
+        return payments
+
+    def handle(self, *args, **options):
+        random.seed(7)
+        engine = fraud.FraudEngine(
+            fraud.RULES,
+            provider_thresholds={'Gaz': {'max_amount': Decimal('5000000')}},
+            velocity=None if options['cache'] else _MemoryVelocity(options['users']),
+        )
+        payments = self._payments(options['requests'], options['users'])
+
+        blocked = 0
+        evaluate = engine.evaluate
+        started = time.perf_counter()
+        for payment in payments:
+            if evaluate(*payment).blocked:
+                blocked += 1
+        elapsed = time.perf_counter() - started
+
+        samples = []
+        for payment in payments[:10_000]:
+            t0 = time.perf_counter()
+            evaluate(*payment)
+            samples.append((time.perf_counter() - t0) * 1000)
+
+        self.stdout.write(json.dumps({
+            'requests': len(payments),
+            'seconds': round(elapsed, 3),
+            'evaluations_per_second': round(len(payments) / elapsed),
+            'blocked': blocked,
+            'latency': summarize(samples),
+            'rules': engine.rule_stats(),
+        }, indent=2))
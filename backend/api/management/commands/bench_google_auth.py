@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.test.utils import override_settings
+
+from api import google_tokens
+from api.models import User
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.google import StandInGoogleServer
+from bench.stats import summarize
+
+
+class Command(BenchCommand):
+    help = 'google_auth latency va sertifikat so\'rovlari soni (lokal Google server bilan)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Har bir bosqichdagi loginlar soni')
+
+    def _login_round(self, google, count, email):
+        client = make_client()
+        latencies = []
+        for _ in range(count):
+            token = google.id_token(email)
+            started = time.perf_counter()
+            response = client.post('/api/users/google_auth/', {'token': token}, content_type='application/json')
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in (200, 201):
+                raise RuntimeError(f'google_auth: {response.status_code} {response.content[:200]}')
+        return summarize(latencies)
+
+    def handle(self, *args, **options):
+        count = options['logins']
+        email = 'bench-google@gmail.com'
+        results = {}
+
+        with StandInGoogleServer() as google:
+            with override_settings(GOOGLE_CERTS_URL=google.certs_url, GOOGLE_CLIENT_ID=google.client_id,
+                                   RATE_LIMIT_ENABLED=False):
+                google_tokens.clear()
+
+                results['cold_then_cached'] = self._login_round(google, count, email)
+                results['cold_then_cached']['cert_fetches'] = google.requests
+
+                google.rotate_key()
+                fetches_before = google.requests
+                results['after_key_rotation'] = self._login_round(google, count, email)
+                results['after_key_rotation']['cert_fetches'] = google.requests - fetches_before
+
+                tampered = google.id_token(email)[:-4] + 'AAAA'
+                response = make_client().post('/api/users/google_auth/', {'token': tampered},
+                                              content_type='application/json')
+                results['tampered_token_status'] = response.status_code
+
+                google_tokens.clear()
+
+        User.objects.filter(email=email).delete()
+        self.stdout.write(json.dumps(results, indent=2))
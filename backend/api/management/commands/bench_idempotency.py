@@ -0,0 +1,133 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
+import requests
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+
+from api.models import IdempotencyKey, Transaction
+from bench import seed
+from bench.database import BenchCommand
+from bench.server import OP_HEADER, AppServer
+from bench.stats import summarize
+
+TAG = 'idempotency'
+KEY_PREFIX = 'bench-idem-'
+BODIES = {
+    'pay_utility': {'provider': 'Elektr', 'account_number': '123456789', 'amount': 1000},
+    'update_stats': {'added_balance': 500, 'added_kg': 0.5},
+}
+
+
+class Command(BenchCommand):
+    help = ('Qayta urinishlar bo\'roni: Idempotency-Key bilan va usiz takroriy so\'rovlar necha marta '
+            'bajariladi va takroriylarga javob qancha tez qaytadi')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=list(BODIES), default='pay_utility')
+        parser.add_argument('--operations', type=int, default=50, help='Mantiqiy so\'rovlar (har biri alohida foydalanuvchi)')
+        parser.add_argument('--retries', type=int, default=8, help='Har bir so\'rovning nusxalari')
+        parser.add_argument('--server-threads', type=int, default=8)
+
+    def _post(self, session, url, user, body, key, label, results):
+        headers = {OP_HEADER: label}
+        if key:
+            headers['Idempotency-Key'] = key
+        started = time.perf_counter()
+        response = session.post(url.format(pk=user.pk), json=body, headers=headers)
+        results.append({
+            'user': user.pk,
+            'ms': (time.perf_counter() - started) * 1000,
+            'status': response.status_code,
+            'replayed': response.headers.get('Idempotent-Replayed') == 'true',
+            'body': response.content,
+        })
+
+    def _storm(self, url, users, body, retries, with_key):
+        """All copies of every operation at once, one thread per copy."""
+        results = []
+        threads = []
+        for user in users:
+            key = f'{KEY_PREFIX}{uuid.uuid4().hex}' if with_key else None
+            for _ in range(retries):
+                threads.append(threading.Thread(
+                    target=self._post, args=(requests.Session(), url, user, body, key, 'storm', results)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _sequential(self, url, users, body, retries):
+        """First attempt, then the client retries one after another with the same key."""
+        session = requests.Session()
+        first, replays = [], []
+        for user in users:
+            key = f'{KEY_PREFIX}{uuid.uuid4().hex}'
+            self._post(session, url, user, body, key, 'first', first)
+            for _ in range(retries - 1):
+                self._post(session, url, user, body, key, 'replay', replays)
+        return first, replays
+
+    def _executions(self, users):
+        # Har bir bajarilish (to'lov, firibgarlik yozuvi yoki kredit) bitta Transaction yaratadi
+        return Transaction.objects.filter(user__in=users).count()
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        count, retries = options['operations'], options['retries']
+        endpoint = options['endpoint']
+        body = BODIES[endpoint]
+        seed.cleanup(TAG)
+        users = seed.seed_users(count * 3, tag=TAG)
+        groups = {
+            'storm_without_key': users[:count],
+            'storm_with_key': users[count:count * 2],
+            'sequential_with_key': users[count * 2:],
+        }
+        results = {'endpoint': endpoint, 'operations': count, 'copies_per_operation': retries}
+        try:
+            with override_settings(RATE_LIMIT_ENABLED=False, SECURE_SSL_REDIRECT=False), \
+                    AppServer(threads=options['server_threads']) as server:
+                url = server.url + f'/api/users/{{pk}}/{endpoint}/'
+                for name in ('storm_without_key', 'storm_with_key'):
+                    group = groups[name]
+                    responses = self._storm(url, group, body, retries, name == 'storm_with_key')
+                    results[name] = {
+                        'requests': len(responses),
+                        'executions': self._executions(group),
+                        'replayed': sum(r['replayed'] for r in responses),
+                        'statuses': sorted({r['status'] for r in responses}),
+                        'latency': summarize([r['ms'] for r in responses]),
+                    }
+                    if name == 'storm_with_key':
+                        # Bir kalitli nusxalar bir xil javob olishi kerak
+                        bodies = {}
+                        for r in responses:
+                            bodies.setdefault(r['user'], set()).add(r['body'])
+                        results[name]['errors'] = [r['body'][:300].decode() for r in responses if r['status'] >= 409][:5]
+                        results[name]['max_distinct_bodies_per_key'] = max(len(b) for b in bodies.values())
+
+                server.queries.clear()
+                server.requests.clear()
+                group = groups['sequential_with_key']
+                first, replays = self._sequential(url, group, body, retries)
+                results['sequential_with_key'] = {
+                    'executions': self._executions(group),
+                    'first': summarize([r['ms'] for r in first]),
+                    'replay': summarize([r['ms'] for r in replays]),
+                    'queries_per_first': round(server.queries['first'] / max(1, server.requests['first']), 2),
+                    'queries_per_replay': round(server.queries['replay'] / max(1, server.requests['replay']), 2),
+                    'replayed': sum(r['replayed'] for r in replays),
+                }
+        finally:
+            IdempotencyKey.objects.filter(key__startswith=KEY_PREFIX).delete()
+            seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
+        keyed = results['storm_with_key']['executions'] + results['sequential_with_key']['executions']
+        if keyed != count * 2:
+            raise CommandError(f'Idempotency-Key bilan {keyed} ta bajarilish (kutilgan {count * 2})')
@@ -0,0 +1,105 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import CommandError
+from django.db import connection
+
+from api import leaderboard
+from api.models import User
+from bench import seed
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'leaderboard'
+REGIONS = ['Toshkent', 'Samarqand', 'Buxoro', 'Farg\'ona', 'Andijon', 'Namangan', 'Xorazm',
+           'Qashqadaryo', 'Surxondaryo', 'Navoiy', 'Jizzax', 'Sirdaryo', 'Qoraqalpog\'iston']
+
+
+def _fields(i):
+    region = random.choice(REGIONS)
+    return {
+        'total_recycled_kg': Decimal(int(random.paretovariate(1.5) * 1000)) / 100,
+        'region': region,
+        'district': f'{region} {random.randint(1, 8)}-tuman',
+    }
+
+
+def _naive(user, scope, limit):
+    """ORDER BY kg on every request + COUNT of users above for my rank."""
+    users = User.objects.filter(is_active=True, is_deleted=False)
+    if scope != 'global':
+        users = users.filter(region=user.region)
+    if scope == 'district':
+        users = users.filter(district=user.district)
+    top = list(users.order_by('-total_recycled_kg').values('pk', 'username', 'total_recycled_kg')[:limit])
+    rank = users.filter(total_recycled_kg__gt=user.total_recycled_kg).count() + 1
+    return top, rank
+
+
+class Command(BenchCommand):
+    help = 'Reyting: har so\'rovda ORDER BY/COUNT vs oldindan hisoblangan reyting (top-N + mening o\'rnim)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200_000)
+        parser.add_argument('--lookups', type=int, default=300, help='Har bir rejim uchun so\'rovlar')
+        parser.add_argument('--limit', type=int, default=10)
+
+    def _measure(self, call, samples):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        latencies = []
+        with connection.execute_wrapper(count_query):
+            for sample in samples:
+                started = time.perf_counter()
+                call(*sample)
+                latencies.append((time.perf_counter() - started) * 1000)
+        return {'latency': summarize(latencies), 'queries_per_call': round(len(queries) / len(samples), 2)}
+
+    def handle(self, *args, **options):
+        seed.cleanup(TAG)
+        started = time.perf_counter()
+        users = seed.seed_users(options['users'], tag=TAG, batch_size=5000, fields=_fields)
+        self.stdout.write(f'{len(users)} ta foydalanuvchi yaratildi ({time.perf_counter() - started:.0f}s)')
+
+        ranking = leaderboard.ranking()
+        results = {'backend': type(ranking).__name__}
+        try:
+            started = time.perf_counter()
+            ranking.rebuild()
+            results['full_rebuild_seconds'] = round(time.perf_counter() - started, 2)
+
+            limit = options['limit']
+            samples = [(random.choice(users), scope) for scope in ('global', 'region', 'district')
+                       for _ in range(options['lookups'] // 3)]
+
+            def precomputed(user, scope):
+                keys = leaderboard.scopes(user.region, user.district)
+                return leaderboard.board(keys[('global', 'region', 'district').index(scope)], limit, user.pk)
+
+            # To'g'rilik: "mening o'rnim" ikki usulda bir xil
+            for user, scope in samples[:30]:
+                expected = _naive(user, scope, limit)[1]
+                actual = precomputed(user, scope)['me']['rank']
+                if expected != actual:
+                    raise CommandError(f'{user.username} {scope}: naive {expected} != leaderboard {actual}')
+
+            results['naive'] = self._measure(lambda user, scope: _naive(user, scope, limit), samples)
+            results['precomputed'] = self._measure(precomputed, samples)
+
+            # Inkremental yangilanish (update_stats commit'idan keyin)
+            updates = random.sample(users, min(1000, len(users)))
+            started = time.perf_counter()
+            for user in updates:
+                user.total_recycled_kg += Decimal('1.50')
+                ranking.update(user.pk, float(user.total_recycled_kg), leaderboard.scopes(user.region, user.district))
+            results['incremental_update_us'] = round((time.perf_counter() - started) / len(updates) * 1e6, 1)
+        finally:
+            seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,148 @@
+import json
+import logging
+import subprocess
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api import google_tokens
+from api.models import EmailVerification, User
+from bench import load, seed
+from bench.database import BenchCommand
+from bench.google import StandInGoogleServer
+from bench.server import AppServer
+from bench.smtp import StandInSMTPServer
+
+TAG = 'load'
+PASSWORD = 'bench-password'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5, cwd=settings.BASE_DIR).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BenchCommand):
+    help = ('API yuklama testi: ilova lokal HTTP serverda, parallel mijozlar operatsiyalar '
+            'aralashmasini yuboradi (throughput, p50/p95/p99, so\'rov boshiga SQL, JSON natija)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Yaratiladigan foydalanuvchilar')
+        parser.add_argument('--transactions-per-user', type=int, default=50)
+        parser.add_argument('--clients', type=int, default=16, help='Parallel mijozlar')
+        parser.add_argument('--server-threads', type=int, default=8, help='Server worker thread\'lari')
+        parser.add_argument('--duration', type=float, default=30, help='O\'lchash davomiyligi (soniya)')
+        parser.add_argument('--mix', default='default',
+                            help=f'{", ".join(load.MIXES)} yoki "me=5,stats=2,update_stats=1"')
+        parser.add_argument('--output', help='Natijani shu JSON faylga yozish')
+        parser.add_argument('--compare', help='Oldingi natija (JSON) bilan taqqoslash')
+        parser.add_argument('--reuse', action='store_true', help='Oldingi --keep ma\'lumotlaridan foydalanish')
+        parser.add_argument('--keep', action='store_true', help='Yaratilgan ma\'lumotlarni o\'chirmaslik')
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        seed.cleanup(TAG)
+        users = seed.seed_users(options['users'], tag=TAG)
+        # Bitta hash hammaga - har foydalanuvchi uchun PBKDF2 hisoblanmaydi
+        User.objects.filter(pk__in=[user.pk for user in users]).update(password=make_password(PASSWORD))
+        rows = seed.seed_transactions([user.pk for user in users], options['transactions_per_user'])
+        self.stdout.write(f'{len(users)} ta foydalanuvchi, {rows} ta tranzaksiya '
+                          f'({time.perf_counter() - started:.0f}s)')
+
+    def _cleanup(self):
+        seed.cleanup(TAG)
+        # register/google_auth orqali yaratilganlar (username emaildan olinishi mumkin)
+        User.objects.filter(email__startswith=seed.prefix(TAG)).delete()
+        EmailVerification.objects.filter(email__startswith=seed.prefix(TAG)).delete()
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        try:
+            mix = load.parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['reuse']:
+            self._seed(options)
+        # Faqat seed qilinganlar (register/google_auth yaratganlar emas)
+        users = list(User.objects.filter(username__regex=rf'^{seed.prefix(TAG)}\d+$', is_deleted=False)
+                     .order_by('pk')[:options['users']])
+        if not users:
+            raise CommandError('Foydalanuvchilar yo\'q - --reuse siz ishga tushiring')
+
+        with StandInSMTPServer() as smtp, StandInGoogleServer() as google, override_settings(
+            # Bitta IP dan ko'p login - rate limit o'lchovni buzmasligi uchun
+            RATE_LIMIT_ENABLED=False,
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=smtp.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='bench@ecocash.uz',
+            EMAIL_HOST_PASSWORD='bench',
+            GOOGLE_CERTS_URL=google.certs_url,
+            GOOGLE_CLIENT_ID=google.client_id,
+            # Lokal server oddiy HTTP orqali
+            SECURE_SSL_REDIRECT=False,
+            SESSION_COOKIE_SECURE=False,
+            CSRF_COOKIE_SECURE=False,
+        ):
+            google_tokens.clear()
+            try:
+                with AppServer(threads=options['server_threads']) as server:
+                    recorder = load.Recorder()
+                    clients = [
+                        load.VirtualClient(server.url, users[i % len(users)], PASSWORD, seed.prefix(TAG),
+                                           recorder, google=google)
+                        for i in range(options['clients'])
+                    ]
+                    for client in clients:
+                        response = client.login(record=False)
+                        if response is None or not response.ok:
+                            raise CommandError(f'login: {getattr(response, "status_code", None)}')
+                    server.queries.clear()
+                    server.requests.clear()
+
+                    started_at = datetime.now(dt_timezone.utc).isoformat(timespec='seconds')
+                    elapsed = load.run(clients, mix, options['duration'])
+                    results = {
+                        'meta': {
+                            'started_at': started_at,
+                            'commit': _git_commit(),
+                            'database': connection.vendor,
+                            'cache': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+                            'auth_mode': settings.AUTH_MODE,
+                            'debug': settings.DEBUG,
+                            'users': len(users),
+                            'transactions_per_user': options['transactions_per_user'],
+                            'clients': options['clients'],
+                            'server_threads': options['server_threads'],
+                            'duration_s': round(elapsed, 2),
+                            'mix': mix,
+                            'smtp_messages': smtp.messages,
+                            'google_cert_fetches': google.requests,
+                        },
+                        **load.report(recorder, server, elapsed),
+                    }
+            finally:
+                google_tokens.clear()
+                if not options['keep']:
+                    self._cleanup()
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                results['compare'] = load.compare(json.load(f), results)
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Natija yozildi: {options["output"]}'))
+        self.stdout.write(output)
@@ -0,0 +1,131 @@
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+
+from api.logs import JsonFormatter, QueueJsonHandler, SamplingFilter
+from api.models import User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'logging'
+
+
+class SlowStream:
+    """Stands in for a stdout/stderr pipe the log collector drains slowly."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.chunks = []
+
+    def write(self, text):
+        with self.lock:
+            time.sleep(self.delay)
+            self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        return ''.join(self.chunks).splitlines()
+
+
+class PrintHandler(logging.Handler):
+    """Former behaviour: print() and traceback.print_exc() in the request thread."""
+
+    def emit(self, record):
+        print(record.getMessage())
+        if record.exc_info:
+            traceback.print_exception(*record.exc_info)
+
+
+class Command(BenchCommand):
+    help = 'pay_utility latency: print() vs sinxron JSON log vs navbatli (QueueHandler) JSON log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Har bir rejim uchun so\'rovlar')
+        parser.add_argument('--write-ms', type=float, default=1.0,
+                            help='Bitta stdout/stderr yozuvining narxi (sekin pipe)')
+
+    def _handler(self, mode, stream):
+        if mode == 'print':
+            return PrintHandler()
+        if mode == 'sync_json':
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler = QueueJsonHandler(stream)
+        # Taqqoslash adolatli bo'lishi uchun hammasi yoziladi; queue_sampled - standart ulush
+        handler.addFilter(SamplingFilter(None if mode == 'queue_sampled' else 1.0))
+        return handler
+
+    def _request(self, client, user):
+        started = time.perf_counter()
+        response = client.post(f'/api/users/{user.pk}/pay_utility/', {
+            'provider': 'Elektr', 'account_number': '123456789', 'amount': 1000,
+        }, content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'pay_utility: {response.status_code} {response.content[:200]}')
+        return (time.perf_counter() - started) * 1000
+
+    def _report(self, mode, handler, stream, latencies):
+        drain_ms = None
+        if isinstance(handler, QueueJsonHandler):
+            started = time.perf_counter()
+            handler.stop()
+            drain_ms = (time.perf_counter() - started) * 1000
+        lines = stream.lines()
+        result = {'latency': summarize(latencies), 'lines_written': len(lines)}
+        if mode != 'print':
+            try:
+                [json.loads(line) for line in lines]
+                result['valid_json_lines'] = True
+            except ValueError:
+                result['valid_json_lines'] = False
+        if drain_ms is not None:
+            result['drain_after_run_ms'] = round(drain_ms, 2)
+            result['dropped'] = handler.dropped
+        return result
+
+    def handle(self, *args, **options):
+        modes = ['print', 'sync_json', 'queue', 'queue_sampled']
+        count = options['requests']
+        seed.cleanup(TAG)
+        users = seed.seed_users(count * len(modes), tag=TAG)
+        results = {'write_ms': options['write_ms']}
+        streams = {mode: SlowStream(options['write_ms'] / 1000) for mode in modes}
+        handlers = {mode: self._handler(mode, streams[mode]) for mode in modes}
+        latencies = {mode: [] for mode in modes}
+        logger = logging.getLogger('api')
+        saved = logger.handlers[:]
+        stdout = sys.stdout
+        client = make_client()
+        try:
+            # Har rejimga alohida foydalanuvchilar - fraud "tez to'lovlar" qoidasi ishlamaydi
+            with override_settings(RATE_LIMIT_ENABLED=False):
+                # Rejimlar navbatma-navbat - mashina yuklamasining o'zgarishi hammasiga teng
+                for index in range(count):
+                    for offset, mode in enumerate(modes):
+                        logger.handlers = [handlers[mode]]
+                        sys.stdout = streams[mode]
+                        try:
+                            latencies[mode].append(self._request(client, users[index * len(modes) + offset]))
+                        finally:
+                            sys.stdout = stdout
+                            logger.handlers = saved
+            for mode in modes:
+                results[mode] = self._report(mode, handlers[mode], streams[mode], latencies[mode])
+        finally:
+            for handler in handlers.values():
+                if isinstance(handler, QueueJsonHandler):
+                    handler.stop()
+            seed.cleanup(TAG)
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,110 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from api import metrics
+from api.middleware import MetricsMiddleware
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'metrics'
+PATH = '/api/users/me/'
+MIDDLEWARE_PATH = 'api.middleware.MetricsMiddleware'
+
+
+class Command(BenchCommand):
+    help = 'MetricsMiddleware qo\'shimcha xarajati /api/users/me/ da (yoqilgan va o\'chirilgan holda)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=300, help='Har raunddagi so\'rovlar')
+        parser.add_argument('--max-overhead-pct', type=float, default=3.0)
+
+    def _round(self, client, count):
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(PATH)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{PATH}: {response.status_code}')
+        return latencies
+
+    def _middleware_cost_us(self, count=20000):
+        """Per-request cost of the middleware itself around a no-op view."""
+        request = RequestFactory().get(PATH)
+        response = HttpResponse()
+        plain = lambda request: response  # noqa: E731
+        wrapped = MetricsMiddleware(plain)
+        timings = {}
+        for name, handler in (('plain', plain), ('wrapped', wrapped)):
+            started = time.perf_counter()
+            for _ in range(count):
+                handler(request)
+            timings[name] = (time.perf_counter() - started) / count * 1e6
+        return timings['wrapped'] - timings['plain']
+
+    def handle(self, *args, **options):
+        if MIDDLEWARE_PATH not in settings.MIDDLEWARE or not settings.METRICS_ENABLED:
+            raise CommandError('MetricsMiddleware yoqilmagan')
+        seed.cleanup(TAG)
+        user, staff = seed.seed_users(2, tag=TAG)
+        staff.is_staff = True
+        staff.save(update_fields=['is_staff'])
+
+        try:
+            with_client = make_client()
+            with_client.force_login(user)
+            with override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != MIDDLEWARE_PATH]):
+                without_client = make_client()
+                without_client.force_login(user)
+                without_client.get(PATH)  # middleware zanjiri shu sozlamalar bilan quriladi
+            with_client.get(PATH)
+
+            samples = {'with': [], 'without': []}
+            ratios = []
+            for _ in range(options['rounds']):
+                # Navbatma-navbat - mashina yuklamasining o'zgarishi ikkalasiga teng ta'sir qiladi
+                without = self._round(without_client, options['requests'])
+                with_ = self._round(with_client, options['requests'])
+                samples['without'] += without
+                samples['with'] += with_
+                ratios.append(statistics.median(with_) / statistics.median(without))
+
+            cost_us = self._middleware_cost_us()
+            baseline_ms = statistics.median(samples['without'])
+            results = {
+                'without_middleware': summarize(samples['without']),
+                'with_middleware': summarize(samples['with']),
+                'end_to_end_overhead_pct': round((statistics.median(ratios) - 1) * 100, 2),
+                'middleware_cost_us': round(cost_us, 2),
+                'middleware_cost_pct_of_me_p50': round(cost_us / 1000 / baseline_ms * 100, 2),
+            }
+
+            staff_client = make_client()
+            staff_client.force_login(staff)
+            started = time.perf_counter()
+            response = staff_client.get('/api/metrics/')
+            results['metrics_endpoint'] = {
+                'status': response.status_code,
+                'render_ms': round((time.perf_counter() - started) * 1000, 2),
+                'bytes': len(response.content),
+                'has_me_histogram': b'ecocash_request_duration_seconds_count{view="user-me"}' in response.content,
+            }
+            results['metrics_endpoint_non_staff_status'] = with_client.get('/api/metrics/').status_code
+        finally:
+            seed.cleanup(TAG)
+            metrics.reset()
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if results['middleware_cost_pct_of_me_p50'] > options['max_overhead_pct']:
+            raise CommandError(f'Middleware xarajati {results["middleware_cost_pct_of_me_p50"]}% '
+                               f'> {options["max_overhead_pct"]}%')
@@ -0,0 +1,76 @@
+import base64
+import json
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Transaction, User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+TAG = 'pagination'
+
+
+def _cursor_for(user, offset):
+    # Sahifa boshlanishidan oldingi qator - mijoz oldingi sahifadan oladigan cursor
+    row = Transaction.objects.filter(user=user).order_by('-date', '-id').only('date')[offset - 1]
+    raw = f'f|{row.date.isoformat()}|{row.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+class Command(BenchCommand):
+    help = '/api/transactions/ N-sahifa latency: page-number (OFFSET) vs cursor (keyset)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Foydalanuvchi tranzaksiyalari soni')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--pages', type=str, default='1,10,100,1000,5000',
+                            help='O\'lchanadigan sahifa raqamlari (vergul bilan)')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Seed ma\'lumotlarini o\'chirmaslik')
+
+    def _measure(self, client, url, repeat):
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.status_code
+        result = summarize(latencies)
+        result['queries_per_request'] = len(queries) / repeat
+        return result
+
+    def handle(self, *args, **options):
+        size = options['page_size']
+        # --keep bilan oldingi ishga tushirishdagi ma'lumotlardan qayta foydalaniladi
+        user = User.objects.filter(username__startswith=seed.prefix(TAG)).first() or seed.seed_users(1, tag=TAG)[0]
+        existing = Transaction.objects.filter(user=user).count()
+        if existing < options['rows']:
+            seed.seed_transactions([user.pk], options['rows'] - existing)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else f'ANALYZE {Transaction._meta.db_table}')
+
+        client = make_client()
+        client.force_login(user)
+        results = {'rows': options['rows'], 'page_size': size, 'pages': {}}
+        try:
+            for page in [int(p) for p in options['pages'].split(',')]:
+                if (page - 1) * size >= options['rows']:
+                    continue
+                legacy_url = f'/api/transactions/?page={page}&page_size={size}'
+                cursor_url = f'/api/transactions/?page_size={size}'
+                if page > 1:
+                    cursor_url += f'&cursor={_cursor_for(user, (page - 1) * size)}'
+                results['pages'][page] = {
+                    'page_number': self._measure(client, legacy_url, options['repeat']),
+                    'cursor': self._measure(client, cursor_url, options['repeat']),
+                }
+        finally:
+            if not options['keep']:
+                seed.cleanup(TAG)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,71 @@
+import json
+import logging
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api import ratelimit
+from api.models import User
+from bench import seed
+from bench.client import make_client
+from bench.database import BenchCommand
+from bench.stats import summarize
+
+
+class Command(BenchCommand):
+    help = 'Credential stuffing simulyatsiyasi: login CPU vaqti rate limiting bilan va usiz'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=300, help='Har bir rejim uchun login urinishlari')
+        parser.add_argument('--victims', type=int, default=20, help='Hujum qilinayotgan akkauntlar soni')
+        parser.add_argument('--ips', type=int, default=5, help='Hujumchi IP manzillar soni')
+
+    def _run(self, users, options):
+        client = make_client()
+        cache.clear()
+        statuses = {}
+        latencies = []
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for i in range(options['attempts']):
+            user = users[i % len(users)]
+            request_started = time.perf_counter()
+            response = client.post(
+                '/api/users/login/',
+                {'username': user.username, 'password': f'wrong-{i}'},
+                content_type='application/json',
+                REMOTE_ADDR=f'10.0.0.{i % options["ips"] + 1}',
+            )
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return {
+            'wall_seconds': round(time.perf_counter() - started, 3),
+            'cpu_seconds': round(time.process_time() - cpu_started, 3),
+            'statuses': statuses,
+            'latency': summarize(latencies),
+            'counters': ratelimit.counters()['login'],
+        }
+
+    def handle(self, *args, **options):
+        # Har bir 401/429 uchun django.request ogohlantirishi shart emas
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        seed.cleanup('ratelimit')
+        # Bitta haqiqiy parol xeshi (PBKDF2) - har bir urinishda tekshiriladi
+        password = make_password('correct horse battery staple')
+        users = seed.seed_users(options['victims'], tag='ratelimit')
+        User.objects.filter(pk__in=[user.pk for user in users]).update(password=password)
+
+        results = {}
+        try:
+            for mode, enabled in (('unlimited', False), ('rate_limited', True)):
+                with override_settings(RATE_LIMIT_ENABLED=enabled):
+                    results[mode] = self._run(users, options)
+        finally:
+            seed.cleanup('ratelimit')
+            cache.clear()
+
+        saved = results['unlimited']['cpu_seconds'] - results['rate_limited']['cpu_seconds']
+        results['cpu_saved_seconds'] = round(saved, 3)
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,48 @@
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.models import User
+from api.serializers import UserSerializer, serialize_user
+
+
+class Command(BaseCommand):
+    help = 'Foydalanuvchi javobini seriyalash tezligi: UserSerializer vs serialize_user()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50_000)
+
+    def _run(self, serialize, user, iterations, render):
+        renderer = JSONRenderer()
+        started = time.perf_counter()
+        if render:
+            for _ in range(iterations):
+                renderer.render(serialize(user))
+        else:
+            for _ in range(iterations):
+                serialize(user)
+        elapsed = time.perf_counter() - started
+        return {
+            'per_second': round(iterations / elapsed),
+            'us_per_call': round(elapsed / iterations * 1e6, 2),
+        }
+
+    def handle(self, *args, **options):
+        user = User(id=42, username='ali', email='ali@example.com', first_name='Ali', last_name='Valiyev',
+                    balance=Decimal('15250.50'), total_recycled_kg=Decimal('73.40'), level=2,
+                    role='user', region='Toshkent', district='Chilonzor')
+        iterations = options['iterations']
+        results = {}
+        for render in (False, True):
+            key = 'with_json_render' if render else 'serialize_only'
+            drf = self._run(lambda u: UserSerializer(u).data, user, iterations, render)
+            fast = self._run(serialize_user, user, iterations, render)
+            results[key] = {
+                'UserSerializer': drf,
+                'serialize_user': fast,
+                'speedup': round(fast['per_second'] / drf['per_second'], 1),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,65 @@
+import json
+import time
+
+from django.db import connection
+
+from api import usernames
+from api.models import User
+from bench.database import BenchCommand
+
+
+def _legacy_create(base):
+    # Oldingi views.py kodi: har bir nomzod uchun alohida exists() so'rovi
+    username = base
+    counter = 1
+    while User.objects.filter(username=username).exists():
+        username = f'{base}{counter}'
+        counter += 1
+    return User.objects.create_user(username=username, email=f'{username}@seed.local', password=None)
+
+
+def _allocator_create(base):
+    return usernames.create_with_username(
+        base,
+        lambda username: User.objects.create_user(username=username, email=f'{username}@seed.local', password=None),
+    )
+
+
+class Command(BenchCommand):
+    help = 'Bir xil email local-part bilan N ta ro\'yxatdan o\'tish: exists() sikli vs bitta prefiks so\'rov'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--legacy-users', type=int, default=1000,
+                            help='Eski usul uchun (O(n^2) so\'rov - kamroq)')
+
+    def _run(self, create, base, count):
+        User.objects.filter(username__startswith=base).delete()
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(1)
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            for _ in range(count):
+                create(base)
+        elapsed = time.perf_counter() - started
+        last = User.objects.filter(username__startswith=base).order_by('-date_joined', '-pk').values_list('username', flat=True).first()
+        User.objects.filter(username__startswith=base).delete()
+        return {
+            'registrations': count,
+            'seconds': round(elapsed, 3),
+            'registrations_per_second': round(count / elapsed, 1),
+            'queries': len(queries),
+            'queries_per_registration': round(len(queries) / count, 2),
+            'last_username': last,
+        }
+
+    def handle(self, *args, **options):
+        results = {
+            'legacy': self._run(_legacy_create, 'benchali', options['legacy_users']),
+            'allocator': self._run(_allocator_create, 'benchali', options['users']),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = ('Transaction oylik bo\'limlari: kelgusi oylarni oldindan yaratish, eski oylarni '
+            'ajratib gzip NDJSON\'ga arxivlash (PostgreSQL, cron bilan kuniga bir marta)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.TRANSACTION_PARTITIONS_AHEAD,
+                            help='Hozirgi oydan keyin yaratiladigan oylar')
+        parser.add_argument('--retention-months', type=int, default=settings.TRANSACTION_RETENTION_MONTHS,
+                            help='Shundan eski oylar arxivlanadi')
+        parser.add_argument('--archive-dir', default=settings.TRANSACTION_ARCHIVE_DIR)
+        parser.add_argument('--max-moved-rows', type=int, default=settings.TRANSACTION_DEFAULT_MOVE_MAX_ROWS,
+                            help='Default bo\'limidan ko\'chiriladigan oy uchun qatorlar chegarasi '
+                                 '(ko\'chirish paytida ledger\'ga yozib bo\'lmaydi)')
+        parser.add_argument('--keep-detached', action='store_true',
+                            help='Eksportdan keyin ajratilgan jadvalni o\'chirmaslik')
+        parser.add_argument('--dry-run', action='store_true', help='Faqat nima qilinishini ko\'rsatish')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('api_transaction bo\'limlanmagan (faqat PostgreSQL, migratsiya 0015)')
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months kamida 1 bo\'lishi kerak')
+
+        if options['dry_run']:
+            self.stdout.write(f'Mavjud bo\'limlar: {len(partitions.partitions())}')
+            for month, name in partitions.cold(options['retention_months']).items():
+                self.stdout.write(f'Arxivlanadi: {name}')
+            return
+
+        created, skipped = partitions.ensure(options['ahead'], options['max_moved_rows'])
+        for month in created:
+            self.stdout.write(f'Yaratildi: {partitions.partition_name(month)}')
+        for month in skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{month:%Y-%m}: default bo\'limida {options["max_moved_rows"]} tadan ko\'p qator - '
+                f'texnik oynada --max-moved-rows bilan ko\'chiring'
+            ))
+
+        archived = 0
+        for month in partitions.cold(options['retention_months']):
+            record = partitions.archive(month, options['archive_dir'], drop=not options['keep_detached'])
+            archived += 1
+            self.stdout.write(f'Arxivlandi: {month:%Y-%m} - {record.rows} qator, {record.path}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Bo\'limlar: {len(partitions.partitions())} ta, arxivlandi: {archived} ta oy'
+        ))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = ('Muddati o\'tgan Idempotency-Key javoblarini kichik partiyalarda o\'chirish '
+            '(cron bilan har soatda ishlatish mumkin)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Bitta DELETE dagi qatorlar (qisqa lock)')
+        parser.add_argument('--max-seconds', type=float, default=300)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Partiyalar orasidagi tanaffus (soniya)')
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options['max_seconds']
+        # idem_expires_idx bo'yicha
+        expired = IdempotencyKey.objects.filter(expires_at__lt=timezone.now())
+        deleted = 0
+        while time.monotonic() < deadline:
+            pks = list(expired.order_by().values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            # Shu orada qayta egallangan kalitlar (yangi expires_at) tegilmaydi
+            deleted += expired.filter(pk__in=pks).delete()[0]
+            if len(pks) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ O\'chirildi: {deleted} ta Idempotency-Key'))
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import TokenFamily
+
+
+class Command(BaseCommand):
+    help = ('Muddati o\'tgan yoki bekor qilingan token oilalarini kichik partiyalarda o\'chirish '
+            '(cron bilan har kuni ishlatish mumkin)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Bitta DELETE dagi qatorlar (qisqa lock)')
+        parser.add_argument('--max-seconds', type=float, default=300)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Partiyalar orasidagi tanaffus (soniya)')
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options['max_seconds']
+        now = timezone.now()
+        # Bekor qilingan oila access token muddati tugaguncha kerak (get_user ro'yxati)
+        revoked_before = now - timedelta(seconds=settings.AUTH_ACCESS_TOKEN_LIFETIME)
+        stale = TokenFamily.objects.filter(Q(expires_at__lt=now) | Q(revoked_at__lt=revoked_before))
+        deleted = 0
+        while time.monotonic() < deadline:
+            pks = list(stale.order_by().values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += stale.filter(pk__in=pks).delete()[0]
+            if len(pks) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ O\'chirildi: {deleted} ta token oilasi'))
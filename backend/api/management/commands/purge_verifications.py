@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import locks
+from api.models import EmailVerification, OutboxEmail
+
+# Sessiyalar bazada saqlanadigan engine'lar
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = ('Eskirgan/tasdiqlangan EmailVerification, yuborilgan OutboxEmail va eskirgan '
+            'django_session qatorlarini kichik partiyalarda o\'chirish (cron bilan har daqiqada ishlatish mumkin)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Bitta DELETE dagi qatorlar (qisqa lock)')
+        parser.add_argument('--max-seconds', type=float, default=50,
+                            help='Shu vaqtdan keyin to\'xtash - keyingi cron ishga tushishidan oldin')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Partiyalar orasidagi tanaffus (soniya)')
+
+    def _purge(self, queryset, deadline, options):
+        """Delete `queryset` rows in pk batches until none are left or time runs out."""
+        deleted = 0
+        while time.monotonic() < deadline:
+            pks = list(queryset.order_by().values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += queryset.model.objects.filter(pk__in=pks).delete()[0]
+            if len(pks) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+        return deleted
+
+    def handle(self, *args, **options):
+        # Oldingi ishga tushirish hali tugamagan bo'lsa - o'tkazib yuboramiz
+        with locks.try_lock('purge_verifications') as acquired:
+            if not acquired:
+                self.stdout.write('Boshqa purge_verifications ishlayapti - o\'tkazib yuborildi')
+                return
+            purged_codes, purged_emails, purged_sessions = self._run(options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ O\'chirildi: {purged_codes} ta kod, {purged_emails} ta xat, {purged_sessions} ta sessiya'
+        ))
+
+    def _run(self, options):
+        deadline = time.monotonic() + options['max_seconds']
+        now = timezone.now()
+        # Avval emailver_expires_idx bo'yicha eskirganlar (asosiy hajm); tasdiqlanganlar
+        # emailver_verified_idx (faqat is_verified qatorlari) bo'yicha
+        passes = [
+            EmailVerification.objects.filter(expires_at__lt=now),
+            EmailVerification.objects.filter(is_verified=True),
+            # expires_at bo'sh eski qatorlar: save() dagi 10 daqiqa bo'yicha
+            EmailVerification.objects.filter(expires_at__isnull=True,
+                                             created_at__lt=now - timedelta(minutes=10)),
+        ]
+        purged_codes = sum(self._purge(queryset, deadline, options) for queryset in passes)
+
+        # Outbox xatlarida kod ochiq matnda: yuborilganlari darhol, muvaffaqiyatsizlari
+        # (admin'da xatoni ko'rish uchun) bir kundan keyin
+        purged_emails = sum(self._purge(queryset, deadline, options) for queryset in (
+            OutboxEmail.objects.filter(status='sent'),
+            OutboxEmail.objects.filter(status='failed', created_at__lt=now - timedelta(days=1)),
+        ))
+
+        purged_sessions = 0
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            purged_sessions = self._purge(Session.objects.filter(expire_date__lt=now), deadline, options)
+        return purged_codes, purged_emails, purged_sessions
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import leaderboard, locks
+
+
+class Command(BaseCommand):
+    help = 'Reytinglarni (global, viloyat, tuman) bazadan to\'liq qayta qurish (cron bilan davriy)'
+
+    def handle(self, *args, **options):
+        ranking = leaderboard.ranking()
+        if isinstance(ranking, leaderboard.MemoryRanking):
+            self.stdout.write(self.style.WARNING(
+                'REDIS_URL yo\'q: reytinglar har bir worker xotirasida va '
+                'LEADERBOARD_LOCAL_REBUILD_SECONDS bo\'yicha fon oqimida qayta quriladi'
+            ))
+            return
+
+        # Ikki cron bir vaqtda qursa, Redis ikki marta to'liq yoziladi
+        with locks.try_lock('rebuild_leaderboards') as acquired:
+            if not acquired:
+                self.stdout.write('Boshqa rebuild_leaderboards ishlayapti - o\'tkazib yuborildi')
+                return
+            started = time.perf_counter()
+            ranking.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Reytinglar qayta qurildi ({time.perf_counter() - started:.1f}s)'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from api import stats
+
+
+class Command(BaseCommand):
+    help = ('Keshdagi statistika deltalarini GlobalStats jadvaliga yozish; --full bilan '
+            'User/Transaction jadvallaridan qayta hisoblash (cron uchun)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Jami qiymatlarni manba jadvallaridan qayta hisoblash')
+
+    def handle(self, *args, **options):
+        if not options['full']:
+            deltas = ', '.join(f'{field} {value:+}' for field, value in stats.flush().items())
+            self.stdout.write(self.style.SUCCESS(f'✅ Deltalar yozildi: {deltas or "-"}'))
+            return
+
+        result = stats.reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Statistika yangilandi: {result.total_users} foydalanuvchi, '
+                f'{result.total_waste_collected} kg, {result.total_payouts} UZS'
+            )
+        )
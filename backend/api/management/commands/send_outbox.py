@@ -0,0 +1,52 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Navbatdagi email xabarlarni yuborish (outbox worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Navbatni bir marta bo\'shatib chiqish',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Bitta SMTP ulanishda yuboriladigan xabarlar soni',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Navbat bo\'sh bo\'lganda kutish (soniya)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            # Navbat bo'shaguncha bitta ulanishdan foydalanamiz
+            smtp_connection = get_connection(fail_silently=False)
+            total_sent = total_failed = 0
+            try:
+                while True:
+                    sent, failed = outbox.drain(batch_size, smtp_connection=smtp_connection)
+                    total_sent += sent
+                    total_failed += failed
+                    if sent + failed < batch_size:
+                        break
+            finally:
+                smtp_connection.close()
+
+            if total_sent or total_failed:
+                self.stdout.write(f'✅ Yuborildi: {total_sent}, xatolik: {total_failed}')
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
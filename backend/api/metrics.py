@@ -0,0 +1,200 @@
+"""
+Per-request performance metrics.
+
+MetricsMiddleware (api/middleware.py) times every request and, through a
+context variable, collects its DB query count and DB time (an execute
+wrapper installed on every connection as it opens, see `install`) and the
+time spent in outbound HTTP and SMTP calls, which the call sites wrap in
+`timed('http')` / `timed('smtp')`. The context variable follows the request
+into sync_to_async threads, so async views are counted too.
+
+Observations go into fixed-bucket histograms per view in process memory.
+Every METRICS_FLUSH_SECONDS a worker copies its totals to the shared cache
+under its own key; `collect()` sums the copies of all workers (gunicorn
+processes, other hosts) and `render()` formats them for Prometheus.
+"""
+import bisect
+import contextvars
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# name -> (buckets, help)
+HISTOGRAMS = {
+    'request_duration_seconds': (SECONDS, 'Request wall time'),
+    'db_queries': (QUERIES, 'Database queries per request'),
+    'db_duration_seconds': (SECONDS, 'Time spent in database queries per request'),
+    'http_duration_seconds': (SECONDS, 'Time spent in outbound HTTP calls (requests that made any)'),
+    'smtp_duration_seconds': (SECONDS, 'Time spent talking to the SMTP server (requests that sent mail)'),
+}
+PREFIX = 'ecocash_'
+
+WORKERS_KEY = 'api:metrics:workers'
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+current = contextvars.ContextVar('api_metrics_request', default=None)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, view) -> [count per bucket..., +Inf count, sum]
+_requests = Counter()  # (view, method, status) -> count
+_next_flush = [0.0]
+
+
+class RequestState:
+    """Resource usage of the request being served."""
+    __slots__ = ('queries', 'db', 'http', 'smtp')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = self.http = self.smtp = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+
+def execute(execute, sql, params, many, context):
+    state = current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    return state.execute(execute, sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: count the connection's queries into the current request."""
+    # Ulanishlar thread'ga bog'liq - so'rov boshida emas, ochilganda bir marta qo'shiladi
+    if execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute)
+
+
+@contextmanager
+def timed(kind):
+    """Add the block's duration to the current request's 'http' or 'smtp' time."""
+    state = current.get()
+    if state is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(state, kind, getattr(state, kind) + time.perf_counter() - started)
+
+
+def observe(view, method, status, seconds, state):
+    values = [('request_duration_seconds', seconds), ('db_queries', state.queries),
+              ('db_duration_seconds', state.db)]
+    if state.http:
+        values.append(('http_duration_seconds', state.http))
+    if state.smtp:
+        values.append(('smtp_duration_seconds', state.smtp))
+
+    with _lock:
+        for name, value in values:
+            buckets = HISTOGRAMS[name][0]
+            entry = _histograms.get((name, view))
+            if entry is None:
+                entry = _histograms[name, view] = [0] * (len(buckets) + 1) + [0.0]
+            entry[bisect.bisect_left(buckets, value)] += 1
+            entry[-1] += value
+        _requests[view, method, status] += 1
+
+    if time.monotonic() >= _next_flush[0]:
+        flush()
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'histograms': {key: list(entry) for key, entry in _histograms.items()},
+            'requests': dict(_requests),
+        }
+
+
+def _worker_key(worker_id):
+    return f'api:metrics:worker:{worker_id}'
+
+
+def flush():
+    """Copy this worker's totals to the shared cache."""
+    _next_flush[0] = time.monotonic() + settings.METRICS_FLUSH_SECONDS
+    ttl = settings.METRICS_WORKER_TTL
+    try:
+        cache.set(_worker_key(WORKER_ID), _snapshot(), ttl)
+        # Ro'yxat get+set bilan yangilanadi: poyga bo'lsa, tushib qolgan worker
+        # keyingi flush'da qayta qo'shiladi
+        now = time.time()
+        workers = {worker: seen for worker, seen in (cache.get(WORKERS_KEY) or {}).items() if now - seen < ttl}
+        workers[WORKER_ID] = now
+        cache.set(WORKERS_KEY, workers, ttl)
+    except Exception:
+        pass  # metrikalar so'rovni buzmasligi kerak
+
+
+def collect():
+    """Totals summed over all workers (this one's taken fresh from memory)."""
+    workers = [worker for worker in (cache.get(WORKERS_KEY) or {}) if worker != WORKER_ID]
+    snapshots = list(cache.get_many([_worker_key(worker) for worker in workers]).values())
+    snapshots.append(_snapshot())
+
+    histograms = {}
+    requests = Counter()
+    for snapshot in snapshots:
+        for key, entry in snapshot['histograms'].items():
+            total = histograms.setdefault(key, [0] * len(entry))
+            for index, value in enumerate(entry):
+                total[index] += value
+        requests.update(snapshot['requests'])
+    return {'workers': len(snapshots), 'histograms': histograms, 'requests': requests}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(data):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = [
+        f'# HELP {PREFIX}metrics_workers Workers whose metrics are included',
+        f'# TYPE {PREFIX}metrics_workers gauge',
+        f'{PREFIX}metrics_workers {data["workers"]}',
+        f'# HELP {PREFIX}requests_total Requests by view, method and status',
+        f'# TYPE {PREFIX}requests_total counter',
+    ]
+    for (view, method, status), count in sorted(data['requests'].items()):
+        lines.append(f'{PREFIX}requests_total{{view="{_label(view)}",method="{method}",status="{status}"}} {count}')
+
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for (entry_name, view), entry in sorted(data['histograms'].items()):
+            if entry_name != name:
+                continue
+            view = _label(view)
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), entry[:-1]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {round(entry[-1], 6)}')
+            lines.append(f'{metric}_count{{view="{view}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget this process's observations (benchmarks)."""
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
@@ -0,0 +1,228 @@
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import db_router, logs, metrics
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class MetricsMiddleware:
+    """
+    Record wall time, DB queries/time and outbound HTTP/SMTP time for every
+    request into api.metrics, labelled by the resolved view name. Placed
+    first in MIDDLEWARE so the time covers the whole middleware stack.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = metrics.RequestState()
+        token = metrics.current.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.current.reset(token)
+        self._observe(request, response, elapsed, state)
+        return response
+
+    async def __acall__(self, request):
+        state = metrics.RequestState()
+        token = metrics.current.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.current.reset(token)
+        self._observe(request, response, elapsed, state)
+        return response
+
+    def _observe(self, request, response, elapsed, state):
+        match = getattr(request, 'resolver_match', None)
+        # Noma'lum URL'lar bitta yorliqda - label soni cheklangan qoladi
+        view = match.view_name if match else 'unmatched'
+        metrics.observe(view, request.method, response.status_code, elapsed, state)
+
+
+class RequestIdMiddleware:
+    """
+    Give every request a correlation id - the client's/proxy's X-Request-ID
+    if it looks sane, otherwise a new one - for api.logs records, and echo it
+    in the X-Request-ID response header.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        incoming = request.META.get('HTTP_X_REQUEST_ID', '')
+        request.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        return logs.request_id.set(request.request_id)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            logs.request_id.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            logs.request_id.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can also run in Django's async middleware chain: under
+    ASGI a sync-only middleware would put every request on a thread and
+    defeat the async views.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Fayl ochiladi - thread'da
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Let reads of GET/HEAD requests to the views in DATABASE_REPLICA_VIEWS
+    (and admin changelists) go to a read replica, unless the user wrote
+    something in the last DATABASE_REPLICA_STICKY_SECONDS; after a user's
+    own non-GET request they are pinned to the primary (api.db_router).
+    Placed last so the view is already resolved.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in db_router.SAFE_METHODS:
+            return None
+        if not db_router.replica_view(request.resolver_match.view_name):
+            return None
+        user_id = db_router.request_user_id(request)
+        if user_id is None or not db_router.is_pinned(user_id):
+            db_router.reads.set(True)
+        return None
+
+    def _finish(self, request, response):
+        # O'z yozuvidan keyin foydalanuvchi asosiy bazaga "yopishadi"
+        if request.method not in db_router.SAFE_METHODS and response.status_code < 500:
+            user_id = db_router.request_user_id(request)
+            if user_id is not None:
+                db_router.pin([user_id])
+
+    @staticmethod
+    def _replica_reads(content):
+        # Tana middleware qaytgandan keyin o'qiladi - har bo'lak uchun bayroq qayta qo'yiladi
+        iterator = iter(content)
+        while True:
+            token = db_router.reads.set(True)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                db_router.reads.reset(token)
+            yield chunk
+
+    @staticmethod
+    async def _areplica_reads(content):
+        iterator = aiter(content)
+        while True:
+            token = db_router.reads.set(True)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                db_router.reads.reset(token)
+            yield chunk
+
+    def _keep_reads(self, response):
+        """StreamingHttpResponse (export) reads its rows while it is sent: keep them on the replica."""
+        if response.is_async:
+            response.streaming_content = self._areplica_reads(response.streaming_content)
+        else:
+            response.streaming_content = self._replica_reads(response.streaming_content)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+            replica = db_router.reads.get()
+        finally:
+            # WSGI thread'i keyingi so'rovga bayroqsiz o'tadi
+            db_router.reads.set(False)
+        if replica and response.streaming:
+            self._keep_reads(response)
+        self._finish(request, response)
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+            replica = db_router.reads.get()
+        finally:
+            db_router.reads.set(False)
+        if replica and response.streaming:
+            self._keep_reads(response)
+        if request.method not in db_router.SAFE_METHODS:
+            # Sessiya DB'dan o'qilishi mumkin - thread'da
+            await sync_to_async(self._finish)(request, response)
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def recompute_totals(apps, schema_editor):
+    # Eski qo'lda kiritilgan raqamlarni haqiqiy qiymatlar bilan almashtirish
+    User = apps.get_model('api', 'User')
+    Transaction = apps.get_model('api', 'Transaction')
+    GlobalStats = apps.get_model('api', 'GlobalStats')
+
+    total_kg = User.objects.aggregate(s=Sum('total_recycled_kg'))['s'] or Decimal('0')
+    spent = Transaction.objects.filter(type='spend', amount__lt=0).aggregate(s=Sum('amount'))['s'] or Decimal('0')
+    GlobalStats.objects.update_or_create(
+        pk=1,
+        defaults={
+            'total_users': User.objects.filter(is_deleted=False).count(),
+            'total_waste_collected': total_kg,
+            'total_payouts': -spent,
+            'co2_saved': (total_kg * Decimal('1.5')).quantize(Decimal('0.01')),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_user_district_user_region_delete_creditcard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='globalstats',
+            name='co2_saved',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='globalstats',
+            name='total_payouts',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18),
+        ),
+        migrations.AlterField(
+            model_name='globalstats',
+            name='total_users',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='globalstats',
+            name='total_waste_collected',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(recompute_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY tranzaksiya ichida ishlamaydi
+    atomic = False
+
+    dependencies = [
+        ('api', '0009_transaction_composite_indexes'),
+    ]
+
+    operations = [
+        # Avval yangi indeks, keyin eskisini o'chiramiz - ro'yxat hech qachon indekssiz qolmaydi
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-date', '-id'], name='txn_user_date_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='txn_user_date_idx',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY tranzaksiya ichida ishlamaydi
+    atomic = False
+
+    dependencies = [
+        ('api', '0011_user_email_prefix_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='emailverification',
+            index=models.Index(fields=['email', 'is_verified', 'code', 'created_at'], name='emailver_lookup_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='emailverification',
+            index=models.Index(fields=['expires_at'], name='emailver_expires_idx'),
+        ),
+    ]
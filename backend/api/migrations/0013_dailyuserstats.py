@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_emailverification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('recycled_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('earned', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily User Stats',
+                'verbose_name_plural': 'Daily User Stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyuserstats',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='daily_stats_user_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,245 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:22
+
+import time
+from datetime import date, datetime, timezone
+
+from django.db import OperationalError, migrations, models, transaction
+
+# Migratsiya o'z nomlari bilan: Django 0001/0009/0010 da bergan indeks va FK nomlari
+TABLE = 'api_transaction'
+COLUMNS = '"id", "date", "amount", "type", "description", "provider", "user_id"'
+INDEXES = [
+    ('api_transaction_user_id_4a6f87d2', '("user_id")'),
+    ('txn_user_date_id_idx', '("user_id", "date" DESC, "id" DESC)'),
+    ('txn_user_type_date_idx', '("user_id", "type", "date")'),
+]
+FOREIGN_KEY = 'api_transaction_user_id_4a6f87d2_fk_api_user_id'
+# Migratsiya paytida hozirgi oydan keyin yaratiladigan oylar (keyin - partition_transactions)
+AHEAD = 3
+# Almashtirish qisqa ACCESS EXCLUSIVE lock oladi: uzoq tranzaksiya ortida navbatda turib
+# barcha so'rovlarni to'smasligi uchun lock kutish cheklangan va qayta uriniladi
+LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 12
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def _legacy(cutover):
+    """The old table, attached as the partition of every row before `cutover`."""
+    return f'{TABLE}_before_{cutover:%Y_%m}'
+
+
+def _legacy_index(name, legacy):
+    """New name of an old-table index whose name the partitioned parent takes over."""
+    suffix = name[len(TABLE):] if name.startswith(TABLE) else f'_{name}'
+    return f'{legacy}{suffix}'[:63]
+
+
+def _create_table(cursor, partitioned):
+    if partitioned:
+        # Bo'limlangan jadvalda PK bo'lim kaliti (date) ni o'z ichiga olishi shart;
+        # id yagonaligini sequence ta'minlaydi
+        cursor.execute(f'''
+            CREATE TABLE "{TABLE}" (
+                "id" bigint NOT NULL,
+                "date" timestamp with time zone NOT NULL,
+                "amount" numeric(10, 2) NOT NULL,
+                "type" varchar(5) NOT NULL,
+                "description" varchar(255) NOT NULL,
+                "provider" varchar(100) NULL,
+                "user_id" bigint NOT NULL,
+                CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "date")
+            ) PARTITION BY RANGE ("date")
+        ''')
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" AS bigint OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+    else:
+        cursor.execute(f'''
+            CREATE TABLE "{TABLE}" (
+                "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+                "date" timestamp with time zone NOT NULL,
+                "amount" numeric(10, 2) NOT NULL,
+                "type" varchar(5) NOT NULL,
+                "description" varchar(255) NOT NULL,
+                "provider" varchar(100) NULL,
+                "user_id" bigint NOT NULL
+            )
+        ''')
+
+
+def _cutover(cursor):
+    """First month of the monthly partitions; the old table keeps every row before it."""
+    # To'xtatilgan oldingi urinishning (id, date) indeksi - o'sha chegara bilan davom etamiz
+    cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'i' AND relname ~ %s",
+                   [rf'^{TABLE}_before_[0-9]{{4}}_[0-9]{{2}}_pkey$'])
+    row = cursor.fetchone()
+    if row:
+        year, month = row[0][len(f'{TABLE}_before_'):].split('_')[:2]
+        return date(int(year), int(month), 1)
+    # Kamida bir oy zaxira: oy oxirida ishlasa ham yangi qatorlar CHECK'dan o'tadi
+    cutover = _add_months(datetime.now(timezone.utc).date().replace(day=1), 2)
+    cursor.execute(f'SELECT max("date") FROM "{TABLE}"')
+    latest = cursor.fetchone()[0]
+    if latest:
+        cutover = max(cutover, _add_months(latest.astimezone(timezone.utc).date().replace(day=1), 1))
+    return cutover
+
+
+def _prepare(cursor, legacy, cutover):
+    """Build the (id, date) key and a validated CHECK on the live table without blocking writes."""
+    cursor.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [f'{legacy}_pkey'])
+    row = cursor.fetchone()
+    if row and not row[0]:
+        # To'xtatilgan CONCURRENTLY yaroqsiz indeks qoldiradi
+        cursor.execute(f'DROP INDEX CONCURRENTLY "{legacy}_pkey"')
+        row = None
+    if row is None:
+        cursor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY "{legacy}_pkey" ON "{TABLE}" ("id", "date")')
+
+    check = f'{legacy}_date_check'
+    cursor.execute('SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s', [TABLE, check])
+    if cursor.fetchone() is None:
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{check}" CHECK ("date" < {_bound(cutover)}) NOT VALID')
+    # VALIDATE yozuvlarni to'smaydi (SHARE UPDATE EXCLUSIVE); ATTACH keyin jadvalni skanerlamaydi
+    cursor.execute(f'ALTER TABLE "{TABLE}" VALIDATE CONSTRAINT "{check}"')
+
+
+def _swap(cursor, legacy, cutover):
+    """Put the partitioned parent in place of the old table, attached as its first partition."""
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+    # Indeks va FK ta'riflari katalogdan: ota jadvalda asl nomlari bilan qayta yaratiladi
+    cursor.execute('''
+        SELECT i.relname, pg_get_indexdef(x.indexrelid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND i.relname <> %s
+    ''', [TABLE, f'{legacy}_pkey'])
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype = 'f'", [TABLE])
+    foreign_keys = cursor.fetchall()
+    cursor.execute(f'SELECT last_value + CASE WHEN is_called THEN 1 ELSE 0 END FROM "{TABLE}_id_seq"')
+    next_id = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+    cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{TABLE}_pkey"')
+    cursor.execute(f'ALTER TABLE "{legacy}" ADD CONSTRAINT "{legacy}_pkey" PRIMARY KEY USING INDEX "{legacy}_pkey"')
+    # Identity sequence'i bilan o'chadi - id'larni ota jadval sequence'i beradi
+    cursor.execute(f'ALTER TABLE "{legacy}" ALTER COLUMN "id" DROP IDENTITY')
+    for name, _ in indexes:
+        cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{_legacy_index(name, legacy)}"')
+
+    _create_table(cursor, partitioned=True)
+    # Bo'limsiz ota jadvalda indeks va FK darhol yaratiladi
+    for _, definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+    # Mos indekslar va FK ulanadi (qayta qurilmaydi), CHECK sabab jadval skanerlanmaydi
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{legacy}" FOR VALUES FROM (MINVALUE) TO ({_bound(cutover)})')
+    cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{legacy}_date_check"')
+
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    month = cutover
+    while month <= max(cutover, _add_months(current, AHEAD)):
+        upper = _add_months(month, 1)
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}_p{month:%Y_%m}" PARTITION OF "{TABLE}" '
+            f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(upper)})'
+        )
+        month = upper
+    # Hech bir oyga tushmagan qatorlar (masalan, uzoq kelajak sanalari) uchun
+    cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+    cursor.execute(f'SELECT setval(\'"{TABLE}_id_seq"\', %s, false)', [next_id])
+
+
+def partition_transactions(apps, schema_editor):
+    """
+    api_transaction -> RANGE (date) partitions without copying rows: the old
+    table becomes the partition of everything before the cutover month, later
+    months get one partition each (UTC) plus a default one.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLE])
+        if cursor.fetchone()[0] == 'p':
+            return
+        cutover = _cutover(cursor)
+        legacy = _legacy(cutover)
+        _prepare(cursor, legacy, cutover)
+
+    for attempt in range(SWAP_ATTEMPTS):
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                _swap(cursor, legacy, cutover)
+            return
+        except OperationalError as e:
+            cause = e.__cause__
+            if getattr(cause, 'pgcode', None) != LOCK_NOT_AVAILABLE or attempt == SWAP_ATTEMPTS - 1:
+                raise
+            time.sleep(1)
+
+
+def unpartition_transactions(apps, schema_editor):
+    # Qaytarish oflayn: qatorlar ACCESS EXCLUSIVE lock ostida nusxalanadi; arxivlangan (ajratilgan va o'chirilgan) oylar qaytmaydi
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        old = f'{TABLE}_partitioned'
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{old}_pkey"')
+        cursor.execute(f'ALTER SEQUENCE "{TABLE}_id_seq" RENAME TO "{old}_id_seq"')
+        # Bo'limlangan indeks o'chsa, bo'limlardagi indekslar ham o'chadi
+        cursor.execute('DROP INDEX ' + ', '.join(f'"{name}"' for name, _ in INDEXES))
+
+        _create_table(cursor, partitioned=False)
+        cursor.execute(f'''
+            ALTER TABLE "{TABLE}" ADD CONSTRAINT "{FOREIGN_KEY}"
+            FOREIGN KEY ("user_id") REFERENCES "api_user" ("id") DEFERRABLE INITIALLY DEFERRED
+        ''')
+        for name, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX "{name}" ON "{TABLE}" {columns}')
+        cursor.execute(f'INSERT INTO "{TABLE}" ({COLUMNS}) SELECT {COLUMNS} FROM "{old}"')
+        cursor.execute(f'DROP TABLE "{old}"')
+        cursor.execute(f'''SELECT setval(pg_get_serial_sequence('"{TABLE}"', 'id'), COALESCE(max("id"), 0) + 1, false)
+                           FROM "{TABLE}"''')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY va VALIDATE tranzaksiyadan tashqarida; almashtirish - o'z tranzaksiyasida
+    atomic = False
+
+    dependencies = [
+        ('api', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('rows', models.PositiveBigIntegerField()),
+                ('payouts', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('path', models.CharField(max_length=500)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Transaction Archive',
+                'verbose_name_plural': 'Transaction Archives',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(condition=models.Q(('is_verified', True)), fields=['id'], name='emailver_verified_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_emailverification_verified_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='token_version',
+        ),
+        migrations.CreateModel(
+            name='TokenFamily',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('revoked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_families', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Token Family',
+                'verbose_name_plural': 'Token Families',
+                'indexes': [models.Index(fields=['user', 'revoked_at'], name='tokenfam_user_revoked_idx'), models.Index(fields=['expires_at'], name='tokenfam_expires_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from datetime import date
 
@@ -24,6 +25,11 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Admin: email__startswith (LIKE 'x%') qidiruvi; username uchun
+            # Django unique indeksiga _like indeksini o'zi qo'shadi
+            models.Index(fields=['email'], name='user_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.email})"
@@ -47,17 +53,60 @@ class Transaction(models.Model):
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-date']
+        indexes = [
+            # TransactionViewSet: user bo'yicha, eng yangisi birinchi (keyset: date, id)
+            models.Index(fields=['user', '-date', '-id'], name='txn_user_date_id_idx'),
+            # pay_utility: oxirgi daqiqalardagi to'lovlar soni
+            models.Index(fields=['user', 'type', 'date'], name='txn_user_type_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.type} - {self.amount}"
 
 
+class TransactionArchive(models.Model):
+    """A month of Transaction rows exported to disk and dropped by api.partitions"""
+    month = models.DateField(unique=True)  # Oyning 1-kuni (UTC)
+    rows = models.PositiveBigIntegerField()
+    payouts = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # UZS, stats.reconcile uchun
+    path = models.CharField(max_length=500)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Transaction Archive'
+        verbose_name_plural = 'Transaction Archives'
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.rows} rows"
+
+
+class DailyUserStats(models.Model):
+    """Per-user, per-day totals (Asia/Tashkent days), maintained by api.activity"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    recycled_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    earned = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # UZS
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # UZS
+    
+    class Meta:
+        verbose_name = 'Daily User Stats'
+        verbose_name_plural = 'Daily User Stats'
+        constraints = [
+            # Grafik so'rovlari (user, day oralig'i) ham shu indeksdan o'qiydi
+            models.UniqueConstraint(fields=['user', 'day'], name='daily_stats_user_day_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.day}"
+
+
 class GlobalStats(models.Model):
-    """Global Statistics model"""
-    total_users = models.IntegerField(default=142050)
-    total_waste_collected = models.DecimalField(max_digits=10, decimal_places=2, default=5890.00)
-    total_payouts = models.BigIntegerField(default=850000000)
-    co2_saved = models.DecimalField(max_digits=10, decimal_places=2, default=2100.00)
+    """Global Statistics model (singleton row, maintained by api.stats)"""
+    total_users = models.IntegerField(default=0)
+    total_waste_collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # kg
+    total_payouts = models.DecimalField(max_digits=18, decimal_places=2, default=0)  # UZS
+    co2_saved = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # kg
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -80,6 +129,15 @@ class EmailVerification(models.Model):
         verbose_name = 'Email Verification'
         verbose_name_plural = 'Email Verifications'
         ordering = ['-created_at']
+        indexes = [
+            # verify_code: (email, code, is_verified) + latest('created_at');
+            # send_verification_code: (email, is_verified) prefiksi bilan delete
+            models.Index(fields=['email', 'is_verified', 'code', 'created_at'], name='emailver_lookup_idx'),
+            # purge_verifications: eskirgan kodlar
+            models.Index(fields=['expires_at'], name='emailver_expires_idx'),
+            # purge_verifications: tasdiqlangan kodlar (qisman indeks - faqat shu qatorlar)
+            models.Index(fields=['id'], condition=models.Q(is_verified=True), name='emailver_verified_idx'),
+        ]
     
     def __str__(self):
         return f"{self.email} - {self.code}"
@@ -96,5 +154,81 @@ class EmailVerification(models.Model):
         return timezone.now() > self.expires_at
 
 
+class OutboxEmail(models.Model):
+    """Queued outgoing email, delivered by the `send_outbox` worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
+
 
+class IdempotencyKey(models.Model):
+    """Stored response of a write request per (action + user, Idempotency-Key), see api.idempotency"""
+    scope = models.CharField(max_length=100)  # 'pay_utility:42'
+    key = models.CharField(max_length=128)
+    fingerprint = models.CharField(max_length=64)  # so'rov tanasining sha256
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # NULL - hali bajarilmoqda
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idem_scope_key_uniq'),
+        ]
+        indexes = [
+            # purge_idempotency_keys: eskirgan qatorlar
+            models.Index(fields=['expires_at'], name='idem_expires_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+
+class TokenFamily(models.Model):
+    """Refresh-token chain of one login (device), see api.authentication"""
+    id = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_families')
+    generation = models.PositiveIntegerField(default=0)  # har refresh'da +1; faqat oxirgi refresh token ishlaydi
+    revoked_at = models.DateTimeField(null=True, blank=True)  # logout
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()  # oxirgi refresh + AUTH_REFRESH_TOKEN_LIFETIME
+
+    class Meta:
+        verbose_name = 'Token Family'
+        verbose_name_plural = 'Token Families'
+        indexes = [
+            # get_user: foydalanuvchining yaqinda bekor qilingan oilalari
+            models.Index(fields=['user', 'revoked_at'], name='tokenfam_user_revoked_idx'),
+            # purge_token_families: eskirgan qatorlar
+            models.Index(fields=['expires_at'], name='tokenfam_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.id}"
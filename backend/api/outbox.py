@@ -0,0 +1,132 @@
+"""
+Email outbox.
+
+Request handlers only insert an OutboxEmail row; the `send_outbox` worker
+delivers pending rows in batches over a single reused SMTP connection and
+reschedules failures with exponential backoff.
+
+A batch is claimed in a short transaction (status `sending`, leased for
+EMAIL_OUTBOX_CLAIM_SECONDS) and sent outside it, so no row lock or
+transaction is held while talking to SMTP. A row whose worker died while
+sending becomes due again when the lease runs out. Sent rows keep the
+verification code in `body` until `purge_verifications` deletes them.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+BACKOFF_BASE = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 30)
+BACKOFF_MAX = 60 * 60
+CLAIM_SECONDS = getattr(settings, 'EMAIL_OUTBOX_CLAIM_SECONDS', 5 * 60)
+
+
+def enqueue(to_email, subject, body, from_email=None):
+    """Queue a message for delivery. Call inside the caller's transaction."""
+    return OutboxEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def _claim(batch_size):
+    """Mark a batch of due messages `sending` and commit, so parallel workers don't double-send."""
+    now = timezone.now()
+    with transaction.atomic():
+        qs = OutboxEmail.objects.filter(
+            status__in=['pending', 'sending'],
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        batch = list(qs[:batch_size])
+        # Ijara: worker yuborish paytida o'lsa, xabar CLAIM_SECONDS dan keyin qayta navbatga tushadi
+        lease = now + timedelta(seconds=CLAIM_SECONDS)
+        OutboxEmail.objects.filter(pk__in=[message.pk for message in batch]).update(
+            status='sending', next_attempt_at=lease,
+        )
+    for message in batch:
+        message.status, message.next_attempt_at = 'sending', lease
+    return batch
+
+
+def _fail(message, error):
+    message.attempts += 1
+    message.last_error = str(error)[:1000]
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = timezone.now() + backoff(message.attempts)
+    message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _sent(message):
+    OutboxEmail.objects.filter(pk=message.pk).update(
+        status='sent', attempts=F('attempts') + 1, sent_at=timezone.now(),
+    )
+
+
+def drain(batch_size=100, smtp_connection=None):
+    """
+    Send one batch of due messages. Returns (sent, failed) counts.
+
+    The SMTP connection is opened once and reused for every message in the
+    batch; pass `smtp_connection` to keep it open across batches.
+    """
+    batch = _claim(batch_size)
+    if not batch:
+        return 0, 0
+
+    owns_connection = smtp_connection is None
+    if owns_connection:
+        smtp_connection = get_connection(fail_silently=False)
+
+    try:
+        smtp_connection.open()
+    except Exception as e:
+        for message in batch:
+            _fail(message, e)
+        return 0, len(batch)
+
+    sent = failed = 0
+    try:
+        for message in batch:
+            email = EmailMessage(
+                message.subject,
+                message.body,
+                message.from_email or settings.DEFAULT_FROM_EMAIL,
+                [message.to_email],
+                connection=smtp_connection,
+            )
+            try:
+                smtp_connection.send_messages([email])
+            except Exception as e:
+                _fail(message, e)
+                failed += 1
+                # Ulanish uzilgan bo'lishi mumkin - keyingi xabarlar uchun qayta ochamiz
+                try:
+                    smtp_connection.close()
+                    smtp_connection.open()
+                except Exception:
+                    pass
+                continue
+            _sent(message)
+            sent += 1
+    finally:
+        if owns_connection:
+            smtp_connection.close()
+
+    return sent, failed
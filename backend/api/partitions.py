@@ -0,0 +1,261 @@
+"""
+Monthly partitions of the Transaction ledger (PostgreSQL).
+
+Migration 0015 turns api_transaction into a table partitioned by RANGE
+(date), one partition per calendar month in UTC (`api_transaction_pYYYY_MM`)
+plus `api_transaction_default` for rows no month covers. The rows that
+existed before the migration aren't copied: the old table is attached as
+`api_transaction_before_YYYY_MM`, the partition of every row before that
+month, and is treated as a partition of its last month - it is archived as
+one piece once that month is past the retention horizon. The ORM and the
+views are unchanged; queries with a date range only touch the months they
+cover.
+
+`partition_transactions` (cron) calls `ensure` to create the next
+TRANSACTION_PARTITIONS_AHEAD months (and months whose rows landed in the
+default partition), then `archive` for months older than
+TRANSACTION_RETENTION_MONTHS: the partition is detached, written to
+TRANSACTION_ARCHIVE_DIR as gzip NDJSON (the export endpoint's format),
+checked, recorded in TransactionArchive and dropped. A partition that was
+detached but not yet recorded is picked up again by the next run.
+
+Months are created ahead of time so the default partition stays empty and
+creating a partition takes no time. Rows only land there if the cron missed
+several months; moving them out locks the ledger against writes for the
+whole copy, so `create` moves at most TRANSACTION_DEFAULT_MOVE_MAX_ROWS rows
+and leaves bigger months for a maintenance window.
+
+On SQLite the table isn't partitioned: `partition_transactions` refuses to
+run and `archived_until`/`archived_payouts` find no archives.
+"""
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import statements
+from .models import Transaction, TransactionArchive
+
+TABLE = Transaction._meta.db_table
+DEFAULT = f'{TABLE}_default'
+_NAME_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+# Migratsiya 0015 gacha bo'lgan jadval: chegara oyidan oldingi barcha qatorlar
+_LEGACY_RE = re.compile(rf'^{TABLE}_before_(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of_moment(moment):
+    """The (UTC) month - and partition - an aware datetime falls into."""
+    return moment.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def current_month():
+    return month_of_moment(timezone.now())
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def month_of(name):
+    """The month a partition holds; for the pre-partitioning table, the last month it holds."""
+    match = _NAME_RE.match(name)
+    if match:
+        return date(int(match.group(1)), int(match.group(2)), 1)
+    match = _LEGACY_RE.match(name)
+    return add_months(date(int(match.group(1)), int(match.group(2)), 1), -1) if match else None
+
+
+def is_legacy(name):
+    return bool(_LEGACY_RE.match(name))
+
+
+def month_start(month):
+    """The month's first instant (UTC) - a partition's lower bound."""
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [_quote(TABLE)])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partitions():
+    """Attached monthly partitions as {month: name}, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass',
+            [_quote(TABLE)],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return dict(sorted((month_of(name), name) for name in names if month_of(name)))
+
+
+def detached():
+    """Monthly tables detached from the ledger but not archived yet, as {month: name}."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_class c
+            WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace
+              AND (c.relname LIKE %s OR c.relname LIKE %s) AND NOT c.relispartition
+            """,
+            [f'{TABLE}\\_p%', f'{TABLE}\\_before\\_%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    archived = set(TransactionArchive.objects.values_list('month', flat=True))
+    return dict(sorted((month_of(name), name) for name in names
+                       if month_of(name) and month_of(name) not in archived))
+
+
+def _default_months():
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date AT TIME ZONE 'UTC')::date FROM {_quote(DEFAULT)}")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def create(month, max_moved_rows=None):
+    """
+    Create the month's partition; False if its rows in the default partition
+    are more than `max_moved_rows` (None: no limit) and it was left alone.
+    """
+    name, lower, upper = partition_name(month), month_start(month), month_start(add_months(month, 1))
+    bounds = f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    with transaction.atomic(), connection.cursor() as cursor:
+        limit = None if max_moved_rows is None else max_moved_rows + 1
+        cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM {_quote(DEFAULT)} WHERE date >= %s AND date < %s '
+                       f'LIMIT %s) AS moving', [lower, upper, limit])
+        moving = cursor.fetchone()[0]
+        if not moving:
+            cursor.execute(f'CREATE TABLE {_quote(name)} PARTITION OF {_quote(TABLE)} {bounds}')
+            return True
+        if max_moved_rows is not None and moving > max_moved_rows:
+            return False
+        # Default bo'limida shu oy qatorlari bo'lsa, yangi bo'lim yaratib bo'lmaydi - ko'chiramiz.
+        # DETACH dan ATTACH gacha ledger'ga yozish to'xtaydi (ACCESS EXCLUSIVE) - shuning uchun
+        # qatorlar soni cheklangan; lock kutish ham cheklangan, yozuvlar navbatda qolib ketmasin
+        cursor.execute("SET LOCAL lock_timeout = '5s'")
+        columns = ', '.join(_quote(column) for column in statements.COLUMNS)
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(DEFAULT)}')
+        cursor.execute(f'CREATE TABLE {_quote(name)} PARTITION OF {_quote(TABLE)} {bounds}')
+        cursor.execute(f'INSERT INTO {_quote(TABLE)} ({columns}) SELECT {columns} FROM {_quote(DEFAULT)} '
+                       f'WHERE date >= %s AND date < %s', [lower, upper])
+        cursor.execute(f'DELETE FROM {_quote(DEFAULT)} WHERE date >= %s AND date < %s', [lower, upper])
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(DEFAULT)} DEFAULT')
+    return True
+
+
+def covering(month):
+    """Name of the attached partition holding the month's rows."""
+    for last, name in partitions().items():
+        if month == last or (month < last and is_legacy(name)):
+            return name
+    return DEFAULT
+
+
+def ensure(ahead, max_moved_rows=None):
+    """
+    Create missing partitions up to `ahead` months from now; returns
+    (months created, months left in the default partition - see `create`).
+    """
+    existing = partitions()
+    # Eski jadval qamragan oylarga alohida bo'lim yaratib bo'lmaydi
+    legacy = max((month for month, name in existing.items() if is_legacy(name)), default=None)
+    future = {add_months(current_month(), i) for i in range(ahead + 1)}
+    missing = (future | _default_months()) - set(existing)
+    created, skipped = [], []
+    # Avval bo'sh kelgusi oylar - yangi qatorlar default bo'limiga tushmasin
+    for month in sorted(missing, key=lambda month: (month not in future, month)):
+        if legacy is not None and month <= legacy:
+            continue
+        (created if create(month, max_moved_rows) else skipped).append(month)
+    return sorted(created), skipped
+
+
+def cold(retention_months):
+    """Attached and detached-but-unarchived months older than the retention horizon, oldest first."""
+    horizon = add_months(current_month(), -retention_months)
+    months = {**partitions(), **detached()}
+    return {month: name for month, name in sorted(months.items()) if month < horizon}
+
+
+def export(name, path):
+    """Write table `name` to `path` as gzip NDJSON, verified by re-reading; returns (rows, payouts)."""
+    rows, payouts = 0, Decimal('0')
+    columns = ', '.join(_quote(column) for column in statements.COLUMNS)
+
+    def batches(cursor):
+        nonlocal rows, payouts
+        while True:
+            batch = cursor.fetchmany(statements.CHUNK_SIZE)
+            if not batch:
+                return
+            rows += len(batch)
+            # stats.reconcile bilan bir xil: to'lovlar manfiy summali 'spend' qatorlari
+            # Decimal(str()): SQLite xom kursori summani float qaytaradi
+            payouts -= sum((Decimal(str(row[3])) for row in batch if row[4] == 'spend' and row[3] < 0),
+                           Decimal('0'))
+            yield batch
+
+    temporary = f'{path}.tmp'
+    with transaction.atomic(), connection.chunked_cursor() as cursor, open(temporary, 'wb') as output:
+        cursor.execute(f'SELECT {columns} FROM {_quote(name)} ORDER BY date, id')
+        for chunk in statements.ndjson_gzip(batches(cursor)):
+            output.write(chunk)
+        output.flush()
+        os.fsync(output.fileno())
+
+    with gzip.open(temporary, 'rt', encoding='utf-8') as written:
+        lines = sum(1 for _ in written)
+    if lines != rows:
+        raise RuntimeError(f'{temporary}: {lines} qator yozildi, {rows} kutilgan')
+    os.replace(temporary, path)
+    return rows, payouts
+
+
+def archive(month, directory, drop=True):
+    """Detach the month's partition, export it under `directory`, record it and drop the table."""
+    attached = partitions()
+    name = attached.get(month) or detached().get(month, partition_name(month))
+    if month in attached:
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(name)}')
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f'{name}.ndjson.gz'))
+    rows, payouts = export(name, path)
+    with transaction.atomic():
+        record, _ = TransactionArchive.objects.update_or_create(
+            month=month, defaults={'rows': rows, 'payouts': payouts, 'path': path},
+        )
+        if drop:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {_quote(name)}')
+    return record
+
+
+def archived_until():
+    """Rows before this moment (UTC) may have been archived; None if nothing was."""
+    latest = TransactionArchive.objects.order_by('-month').values_list('month', flat=True).first()
+    return month_start(add_months(latest, 1)) if latest else None
+
+
+def archived_payouts():
+    return TransactionArchive.objects.aggregate(s=Sum('payouts'))['s'] or Decimal('0')
@@ -0,0 +1,32 @@
+"""
+Permissions for endpoints called by machines rather than users.
+
+Scanner kiosks authenticate with a shared secret from KIOSK_API_KEYS in the
+`X-Kiosk-Key` header; staff users may call the same endpoints from a
+session or token.
+"""
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+def kiosk_key(request):
+    """The configured kiosk key the request presents, or None."""
+    presented = request.META.get('HTTP_X_KIOSK_KEY', '')
+    if not presented:
+        return None
+    # Vaqt bo'yicha solishtirish orqali kalitni taxmin qilib bo'lmasin
+    for key in settings.KIOSK_API_KEYS:
+        if hmac.compare_digest(presented.encode(), key.encode()):
+            return key
+    return None
+
+
+class IsStaffOrKiosk(BasePermission):
+    message = 'Faqat xodimlar yoki ro\'yxatdan o\'tgan kiosklar uchun'
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        return kiosk_key(request) is not None
@@ -0,0 +1,210 @@
+"""
+Token-bucket rate limiting for the auth and payment endpoints.
+
+Each limit is a bucket of `capacity` tokens refilled evenly over `period`
+seconds, kept per client IP, email or user as atomic counters in the Django
+cache (with a process-memory fallback if the cache is down). With the default
+LocMemCache every gunicorn worker has its own buckets, so a client gets up to
+`capacity` requests per worker; set REDIS_URL to enforce the limit across
+workers. The `rate_limit` decorator
+runs before the view body, so a rejected request never reaches password
+hashing, SMTP or the database. Admitted/rejected counts per limit are kept in
+the cache and returned by `counters()`.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import permissions
+
+
+class TokenBucket:
+    """
+    Up to `capacity` requests per `period`, refilled evenly: the count of the
+    current fixed window plus the previous window's count weighted by the part
+    of it still inside the last `period` seconds. Taking a token is one
+    `add`/`incr` on the window's cache key, atomic in Redis, so concurrent
+    requests can't both take the last token.
+    """
+
+    def __init__(self, name, capacity, period):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key, window):
+        digest = hashlib.sha1(str(key).encode()).hexdigest()
+        return f'api:bucket:{self.name}:{digest}:{window}'
+
+    def _shared(self, current_key, previous_key):
+        timeout = int(2 * self.period) + 1
+        previous = cache.get(previous_key, 0)
+        if cache.add(current_key, 1, timeout):
+            return previous, 1
+        try:
+            return previous, cache.incr(current_key)
+        except ValueError:
+            # Kalit add va incr orasida eskirgan
+            cache.set(current_key, 1, timeout)
+            return previous, 1
+
+    def _local_count(self, current_key, previous_key, window, delta):
+        with self._lock:
+            count = self._local.get(current_key, (window, 0))[1] + delta
+            self._local[current_key] = (window, count)
+            if len(self._local) > 10000:
+                self._local = {k: v for k, v in self._local.items() if v[0] >= window - 1}
+            return self._local.get(previous_key, (window - 1, 0))[1], count
+
+    def _retry_after(self, previous, current, elapsed):
+        """Seconds until one more request fits."""
+        spare = self.capacity - 1 - current
+        if spare >= 0:
+            # Shu oynada: oldingi oyna ulushi kamayib, joy ochiladi
+            return max(0.0, self.period * (1 - spare / previous) - elapsed)
+        # Keyingi oynada joriy oyna oldingisiga aylanadi
+        return self.period - elapsed + max(0.0, self.period * (1 - (self.capacity - 1) / current))
+
+    def consume(self, key, now=None):
+        """Take one token. Returns (allowed, retry_after_seconds)."""
+        now = time.time() if now is None else now
+        window, elapsed = divmod(now, self.period)
+        current_key, previous_key = self._key(key, int(window)), self._key(key, int(window) - 1)
+        try:
+            previous, current = self._shared(current_key, previous_key)
+            shared = True
+        except Exception:
+            previous, current = self._local_count(current_key, previous_key, int(window), 1)
+            shared = False
+
+        if previous * (1 - elapsed / self.period) + current <= self.capacity:
+            return True, 0
+        # Rad etilgan so'rov token olmaydi
+        if shared:
+            try:
+                cache.decr(current_key)
+            except Exception:
+                pass
+        else:
+            self._local_count(current_key, previous_key, int(window), -1)
+        return False, self._retry_after(previous, current - 1, elapsed)
+
+
+def client_ip(request):
+    """Client IP, trusting X-Forwarded-For only for RATE_LIMIT_PROXY_COUNT proxies."""
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _email(request, view_kwargs):
+    if not hasattr(request.data, 'get'):
+        return ''
+    value = request.data.get('email') or request.data.get('username') or ''
+    return value.strip().lower() if isinstance(value, str) else ''
+
+
+def _user(request, view_kwargs):
+    if request.user.is_authenticated:
+        return request.user.pk
+    return view_kwargs.get('pk')
+
+
+KEY_FUNCTIONS = {
+    'ip': lambda request, view_kwargs: client_ip(request),
+    'email': _email,
+    'user': _user,
+    'kiosk': lambda request, view_kwargs: permissions.kiosk_key(request),
+}
+
+_buckets = {}
+
+
+def _bucket(action, scope):
+    name = f'{action}:{scope}'
+    bucket = _buckets.get(name)
+    if bucket is None:
+        capacity, period = settings.RATE_LIMITS[action][scope]
+        bucket = _buckets[name] = TokenBucket(name, capacity, period)
+    return bucket
+
+
+def _count(name, outcome):
+    key = f'api:ratelimit:{name}:{outcome}'
+    try:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+    except Exception:
+        pass
+
+
+def check(action, request, view_kwargs=None):
+    """Return None if the request is admitted, else seconds until retry."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    view_kwargs = view_kwargs or {}
+    for scope in settings.RATE_LIMITS.get(action, {}):
+        key = KEY_FUNCTIONS[scope](request, view_kwargs)
+        if not key:
+            continue
+        allowed, retry_after = _bucket(action, scope).consume(key)
+        if not allowed:
+            _count(action, 'rejected')
+            return retry_after
+    _count(action, 'admitted')
+    return None
+
+
+def rejection(retry_after):
+    """Body and Retry-After seconds of the 429 response."""
+    seconds = max(1, int(retry_after + 0.999))
+    return {
+        'error': 'Juda ko\'p urinishlar. Iltimos, keyinroq qayta urinib ko\'ring.',
+        'retry_after': seconds,
+        'success': False
+    }, seconds
+
+
+def rate_limit(action):
+    """Decorator for ViewSet actions; limits come from settings.RATE_LIMITS[action]."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            retry_after = check(action, request, kwargs)
+            if retry_after is not None:
+                data, seconds = rejection(retry_after)
+                response = Response(data, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = str(seconds)
+                return response
+            return view_method(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def counters():
+    """{action: {'admitted': n, 'rejected': n}} aggregated through the cache."""
+    keys = {
+        f'api:ratelimit:{action}:{outcome}': (action, outcome)
+        for action in settings.RATE_LIMITS
+        for outcome in ('admitted', 'rejected')
+    }
+    try:
+        values = cache.get_many(list(keys))
+    except Exception:
+        values = {}
+    result = {action: {'admitted': 0, 'rejected': 0} for action in settings.RATE_LIMITS}
+    for key, (action, outcome) in keys.items():
+        result[action][outcome] = values.get(key, 0)
+    return result
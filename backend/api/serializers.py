@@ -1,5 +1,8 @@
+import decimal
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
 from .models import User, Transaction, GlobalStats
 
 
@@ -29,6 +32,55 @@ class UserSerializer(serializers.ModelSerializer):
         return None
 
 
+def _decimal_to_string(max_digits, decimal_places):
+    """Formatter matching DRF DecimalField(max_digits, decimal_places).to_representation()."""
+    exponent = decimal.Decimal('.1') ** decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = max_digits
+
+    def to_string(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return to_string
+
+
+_balance_to_string = _decimal_to_string(10, 2)
+_kg_to_string = _decimal_to_string(10, 2)
+
+
+def serialize_user(user):
+    """
+    Same dict as UserSerializer(user).data (keys, order and values) without
+    DRF's per-field machinery; used for the hot login/me/balance responses.
+    Parity is checked by SerializeUserTests (api/tests.py).
+    """
+    join_date = user.join_date
+    kg = user.total_recycled_kg
+    kg_string = None if kg is None else _kg_to_string(kg)
+    balance = user.balance
+    level = user.level
+    region = user.region
+    district = user.district
+    return {
+        'id': None if user.id is None else int(user.id),
+        'username': str(user.username),
+        'email': str(user.email),
+        'first_name': str(user.first_name),
+        'last_name': str(user.last_name),
+        'name': f"{user.first_name} {user.last_name}".strip() or user.username,
+        'balance': None if balance is None else _balance_to_string(balance),
+        'total_recycled_kg': kg_string,
+        'totalRecycledKg': kg_string,
+        'level': None if level is None else int(level),
+        'join_date': join_date.isoformat() if join_date else None,
+        'joinDate': (join_date.date() if hasattr(join_date, 'date') else join_date) if join_date else None,
+        'role': str(user.role),
+        'region': None if region is None else str(region),
+        'district': None if district is None else str(district),
+    }
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
@@ -68,22 +120,6 @@ class RegisterSerializer(serializers.ModelSerializer):
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("Parollar mos kelmaydi")
         
-        # Username mavjudligini tekshirish va avtomatik raqam qo'shish
-        username = attrs.get('username')
-        if username:
-            base_username = username
-            counter = 1
-            # Username mavjud bo'lsa, raqam qo'shish
-            while User.objects.filter(username=username, is_deleted=False).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-                # Agar juda ko'p urinish bo'lsa, to'xtatish
-                if counter > 1000:
-                    raise serializers.ValidationError({'username': ['Username yaratishda muammo. Boshqa username tanlang']})
-            
-            # Yangilangan username'ni qaytarish
-            attrs['username'] = username
-        
         return attrs
     
     def create(self, validated_data):
@@ -102,10 +138,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         if not validated_data.get('first_name'):
             validated_data['first_name'] = validated_data['username']
         
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        # Foydalanuvchi tanlagan username band bo'lsa 400 (UniqueValidator); raqamli
+        # username faqat emaildan yasalganda beriladi (api/usernames.py)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(password=password, **validated_data)
+        except IntegrityError:
+            # UniqueValidator va INSERT orasida boshqa so'rov egallagan
+            raise serializers.ValidationError({'username': ['Bu username band']})
 
 
 class LoginSerializer(serializers.Serializer):
@@ -0,0 +1,140 @@
+"""
+Streaming transaction statements (GET /api/transactions/export/).
+
+Rows are read with `values_list(...).iterator(chunk_size=CHUNK_SIZE)` (a
+server-side cursor on Postgres) and encoded batch by batch into a
+StreamingHttpResponse, so memory per request stays constant whatever the
+length of the history. With `gzip=1` the stream is compressed on the fly.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.renderers import BaseRenderer
+
+CHUNK_SIZE = 2000
+
+COLUMNS = ['id', 'user_id', 'date', 'amount', 'type', 'description', 'provider']
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Lets DRF accept `?format=csv|ndjson`. The export itself bypasses
+    rendering; only error responses (auth, validation) come through here.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def _bound(value, end):
+    day = parse_date(value)
+    if day is not None:
+        # Faqat sana: `to` kuni to'liq kiradi
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        lookup = 'date__lt' if end else 'date__gte'
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+        lookup = 'date__lte' if end else 'date__gte'
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return lookup, moment
+
+
+def date_filters(date_from=None, date_to=None):
+    """filter() kwargs for ISO date/datetime bounds; raises ValueError on bad input."""
+    filters = {}
+    for value, end in ((date_from, False), (date_to, True)):
+        if value:
+            lookup, moment = _bound(value, end)
+            filters[lookup] = moment
+    return filters
+
+
+def _csv_batches(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in rows:
+        for pk, user_id, date, amount, kind, description, provider in batch:
+            writer.writerow((pk, user_id, date.isoformat(), amount, kind, description, provider or ''))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_batches(rows):
+    for batch in rows:
+        yield ''.join(
+            json.dumps({
+                'id': pk,
+                'user_id': user_id,
+                'date': date.isoformat(),
+                'amount': str(amount),
+                'type': kind,
+                'description': description,
+                'provider': provider,
+            }, ensure_ascii=False) + '\n'
+            for pk, user_id, date, amount, kind, description, provider in batch
+        )
+
+
+def _batches(queryset):
+    batch = []
+    for row in queryset.values_list(*COLUMNS).iterator(chunk_size=CHUNK_SIZE):
+        batch.append(row)
+        if len(batch) == CHUNK_SIZE:
+            yield batch
+            batch = []
+    yield batch
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip sarlavhasi bilan
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def ndjson_gzip(batches):
+    """Gzip-compressed NDJSON chunks (same rows as the export) for batches of COLUMNS tuples."""
+    return _gzip(text.encode('utf-8') for text in _ndjson_batches(batches) if text)
+
+
+def stream(queryset, fmt, compress=False, filename='transactions'):
+    """StreamingHttpResponse with `queryset` (ordered by the caller) as CSV or NDJSON."""
+    encode = _csv_batches if fmt == 'csv' else _ndjson_batches
+    chunks = (text.encode('utf-8') for text in encode(_batches(queryset)) if text)
+    media_type = CSVRenderer.media_type if fmt == 'csv' else NDJSONRenderer.media_type
+    content_type = f'{media_type}; charset=utf-8'
+    filename = f'{filename}.{fmt}'
+    if compress:
+        chunks = _gzip(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
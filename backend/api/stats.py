@@ -0,0 +1,221 @@
+"""
+Global statistics service.
+
+Totals live in the GlobalStats singleton row. Write paths add their deltas
+to counters in the shared Django cache (`incr`) once their transaction
+commits; `flush()`, run periodically by the `reconcile_stats` management
+command, moves them into the row (without REDIS_URL writes update the row
+directly). Reads are served from a short process-local cache backed by a
+payload in the shared cache that one process reloads (row + pending deltas)
+every GLOBAL_STATS_CACHE_TTL seconds, so /api/stats/ does not touch the
+database in the steady state. `reconcile()` recomputes the totals from
+User/Transaction aggregates (plus the payouts of archived Transaction
+months, api.partitions); `reconcile_stats --full` runs it.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import counters, partitions
+from .models import GlobalStats, Transaction, User
+
+STATS_PK = 1
+CACHE_KEY = 'api:global_stats'
+LOCK_KEY = 'api:global_stats:lock'
+DELTA_KEY = 'api:global_stats:delta:{}'
+
+LOCAL_TTL = getattr(settings, 'GLOBAL_STATS_LOCAL_TTL', 5)
+CACHE_TTL = getattr(settings, 'GLOBAL_STATS_CACHE_TTL', 60)
+LOCK_TIMEOUT = 10
+
+# Taxminiy koeffitsient: 1 kg qayta ishlangan chiqindi uchun tejalgan CO2 (kg)
+CO2_PER_KG = Decimal(str(getattr(settings, 'CO2_KG_PER_RECYCLED_KG', '1.5')))
+
+CENTS = Decimal('0.01')
+
+# Keshdagi deltalar butun son (incr): pul va kg tiyin/100 g aniqlikda saqlanadi
+SCALE = {'total_users': 1, 'total_waste_collected': 100, 'total_payouts': 100, 'co2_saved': 100}
+
+_local = {'data': None, 'expires': 0.0}
+_local_lock = threading.Lock()
+
+
+def _to_tonnes(kg):
+    return str((Decimal(kg) / 1000).quantize(CENTS))
+
+
+def _payload(totals):
+    """Public representation: waste and CO2 in tonnes, payouts in UZS."""
+    return {
+        'total_users': totals['total_users'],
+        'total_waste_collected': _to_tonnes(totals['total_waste_collected']),
+        'total_payouts': int(totals['total_payouts']),
+        'co2_saved': _to_tonnes(totals['co2_saved']),
+    }
+
+
+def _from_units(field, units):
+    return units if SCALE[field] == 1 else (Decimal(units) / SCALE[field]).quantize(CENTS)
+
+
+def _pending():
+    """Deltas recorded in the cache but not yet written to GlobalStats, in cache units."""
+    values = cache.get_many([DELTA_KEY.format(field) for field in SCALE])
+    return {field: values.get(DELTA_KEY.format(field), 0) for field in SCALE}
+
+
+def _take_pending():
+    """Remove the pending deltas from the cache and return them as field values."""
+    taken = {}
+    for field, units in _pending().items():
+        if units:
+            # decr - shu orada qo'shilgan deltalar keshda qoladi
+            cache.decr(DELTA_KEY.format(field), units)
+            taken[field] = units
+    return taken
+
+
+def _apply(deltas):
+    updated = GlobalStats.objects.filter(pk=STATS_PK).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + value for field, value in deltas.items()}
+    )
+    if not updated:
+        reconcile()
+
+
+def _store(data):
+    cache.set(CACHE_KEY, {'data': data, 'refresh_at': time.time() + CACHE_TTL}, None)
+    _local['expires'] = 0.0
+    return data
+
+
+def _load():
+    stats = GlobalStats.objects.filter(pk=STATS_PK).first()
+    if stats is None:
+        stats = reconcile()
+    totals = {field: getattr(stats, field) for field in SCALE}
+    for field, units in _pending().items():
+        totals[field] += _from_units(field, units)
+    return _store(_payload(totals))
+
+
+def _cached():
+    """The shared payload; past its refresh time one process reloads it while the rest serve it stale."""
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        return _load()
+    if time.time() >= entry['refresh_at'] and cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        try:
+            return _load()
+        finally:
+            cache.delete(LOCK_KEY)
+    return entry['data']
+
+
+def get_stats():
+    """Return the global stats payload, normally without any DB query."""
+    data = _local['data']
+    if data is not None and time.monotonic() < _local['expires']:
+        return data
+
+    with _local_lock:
+        # Boshqa thread allaqachon yangilagan bo'lishi mumkin
+        data = _local['data']
+        if data is not None and time.monotonic() < _local['expires']:
+            return data
+
+        data = _cached()
+        _local['data'] = data
+        _local['expires'] = time.monotonic() + LOCAL_TTL
+        return data
+
+
+def _bump(**deltas):
+    """Add counter deltas to the shared cache after the surrounding transaction commits.
+
+    Without a shared cache (LocMemCache) the deltas go straight to the GlobalStats row.
+    """
+    def apply():
+        if not counters.cache_is_shared():
+            # Har bir worker'ning o'z keshi - deltalar cron'ga yetib bormaydi
+            _apply(deltas)
+            return
+        for field, value in deltas.items():
+            key, units = DELTA_KEY.format(field), int(Decimal(value) * SCALE[field])
+            try:
+                if not cache.add(key, units, None):
+                    try:
+                        cache.incr(key, units)
+                    except ValueError:
+                        # Kalit add va incr orasida o'chirilgan
+                        cache.set(key, units, None)
+            except Exception:
+                # Kesh ishlamasa - to'g'ridan-to'g'ri jadvalga
+                _apply({field: value})
+
+    transaction.on_commit(apply)
+
+
+def record_registration():
+    _bump(total_users=1)
+
+
+def record_account_deleted():
+    _bump(total_users=-1)
+
+
+def record_recycling(kg):
+    kg = Decimal(kg)
+    if kg:
+        _bump(total_waste_collected=kg, co2_saved=(kg * CO2_PER_KG).quantize(CENTS))
+
+
+def record_payment(amount):
+    amount = Decimal(amount)
+    if amount:
+        _bump(total_payouts=amount)
+
+
+def flush():
+    """Write the pending cache deltas into the GlobalStats row and refresh the cached payload."""
+    taken = _take_pending()
+    deltas = {field: _from_units(field, units) for field, units in taken.items()}
+    if deltas:
+        try:
+            with transaction.atomic():
+                _apply(deltas)
+        except Exception:
+            # Jadvalga yozilmadi - deltalarni keshga qaytaramiz
+            for field, units in taken.items():
+                cache.incr(DELTA_KEY.format(field), units)
+            raise
+    _load()
+    return deltas
+
+
+def reconcile():
+    """Recompute all totals from the source tables and refresh the cache."""
+    # Kutilayotgan deltalar manba jadvallarida allaqachon bor - ular qayta sanaladi
+    _take_pending()
+    total_kg = User.objects.aggregate(s=Sum('total_recycled_kg'))['s'] or Decimal('0')
+    spent = Transaction.objects.filter(type='spend', amount__lt=0).aggregate(s=Sum('amount'))['s'] or Decimal('0')
+
+    stats, _ = GlobalStats.objects.update_or_create(
+        pk=STATS_PK,
+        defaults={
+            'total_users': User.objects.filter(is_deleted=False).count(),
+            'total_waste_collected': total_kg,
+            # Arxivlangan oylar jadvalda yo'q - ularning to'lovlari TransactionArchive'da
+            'total_payouts': -spent + partitions.archived_payouts(),
+            'co2_saved': (total_kg * CO2_PER_KG).quantize(CENTS),
+        },
+    )
+    _store(_payload({field: getattr(stats, field) for field in SCALE}))
+    return stats
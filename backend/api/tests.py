@@ -0,0 +1,1222 @@
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import smtplib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from . import (
+    authentication, balance, counters, db_router, fraud, google_tokens, leaderboard, locks, outbox, pagination,
+    partitions, ratelimit, statements, stats,
+)
+from .middleware import ReplicaMiddleware
+from .models import DailyUserStats, EmailVerification, GlobalStats, OutboxEmail, TokenFamily, Transaction, User
+from .serializers import UserSerializer, serialize_user
+from bench import seed
+from bench.client import make_client
+from bench.google import StandInGoogleServer
+
+
+def setUpModule():
+    # 401/500 javoblari kutilgan - JSON loglar test natijasini ko'mib yubormasin
+    logging.disable(logging.CRITICAL)
+
+
+def tearDownModule():
+    logging.disable(logging.NOTSET)
+
+
+def _shared_cache(test):
+    """Use a cache shared by processes (not LocMem) for the rest of `test`."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name,
+    }})
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class StatsTests(TestCase):
+    """/api/stats/ is served from the cache; write paths reach GlobalStats through flush() and reconcile()."""
+
+    def setUp(self):
+        cache.clear()
+        stats._local.update(data=None, expires=0.0)
+        self.addCleanup(stats._local.update, data=None, expires=0.0)
+
+    def _totals(self):
+        return GlobalStats.objects.values(*stats.SCALE).get(pk=stats.STATS_PK)
+
+    def test_warm_read_makes_no_queries(self):
+        client = make_client()
+        self.assertEqual(client.get('/api/stats/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = client.get('/api/stats/')
+        self.assertEqual(response.json(), [stats.get_stats()])
+
+    def test_deltas_reach_row_after_flush(self):
+        _shared_cache(self)
+        stats.reconcile()
+        before = self._totals()
+        client = make_client()
+        with self.captureOnCommitCallbacks(execute=True):
+            body = {'username': 'stats', 'password': 'parol-123456', 'password_confirm': 'parol-123456'}
+            response = client.post('/api/users/register/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='stats')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/users/{user.pk}/update_stats/', {'added_balance': 500, 'added_kg': 2},
+                                   content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = {'provider': 'Elektr', 'account_number': '1234567', 'amount': '300'}
+            response = client.post(f'/api/users/{user.pk}/pay_utility/', payment, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        # Deltalar keshda - jadval flush'gacha o'zgarmaydi
+        self.assertEqual(self._totals(), before)
+        call_command('reconcile_stats', stdout=io.StringIO())
+        self.assertEqual(self._totals(), {
+            'total_users': before['total_users'] + 1,
+            'total_waste_collected': before['total_waste_collected'] + 2,
+            'total_payouts': before['total_payouts'] + 300,
+            'co2_saved': before['co2_saved'] + Decimal('3.00'),
+        })
+        self.assertEqual(stats.get_stats()['total_users'], before['total_users'] + 1)
+
+    def test_full_reconcile_corrects_drift(self):
+        user = User.objects.create(username='drift', email='drift@seed.local', total_recycled_kg=Decimal('4'))
+        Transaction.objects.create(user=user, amount=Decimal('-250'), type='spend', description='x')
+        stats.reconcile()
+        expected = self._totals()
+        GlobalStats.objects.filter(pk=stats.STATS_PK).update(total_users=999, total_payouts=0, co2_saved=1)
+        call_command('reconcile_stats', '--full', stdout=io.StringIO())
+        self.assertEqual(self._totals(), expected)
+        self.assertEqual((expected['total_payouts'], expected['total_waste_collected']), (Decimal('250'), Decimal('4')))
+        self.assertEqual(stats.get_stats()['total_users'], expected['total_users'])
+
+
+class FlakySMTP(locmem.EmailBackend):
+    """In-memory mail backend whose next `fail` sends raise, counting the connections it opens."""
+
+    opened = 0
+
+    def __init__(self, fail=0, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+
+    def open(self):
+        FlakySMTP.opened += 1
+
+    def send_messages(self, messages):
+        if self.fail:
+            self.fail -= 1
+            raise smtplib.SMTPServerDisconnected('421 band')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='api.tests.FlakySMTP')
+class OutboxTests(TestCase):
+    """send_outbox: leased claims, one SMTP connection per batch, backoff and giving up."""
+
+    def setUp(self):
+        FlakySMTP.opened = 0
+
+    def _enqueue(self, count=1):
+        return [outbox.enqueue(f'user{index}@seed.local', 'Kod', '123456') for index in range(count)]
+
+    def _make_due(self):
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timezone.timedelta(seconds=1))
+
+    def test_batch_sent_over_one_connection(self):
+        self._enqueue(3)
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        self.assertEqual(FlakySMTP.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['user0@seed.local', 'user1@seed.local', 'user2@seed.local'])
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {('sent', 1)})
+
+    def test_claim_is_leased_until_it_expires(self):
+        message, = self._enqueue()
+        claimed, = outbox._claim(10)
+        self.assertEqual(claimed.status, 'sending')
+        # Worker yuborish paytida o'ldi: ijara tugaguncha boshqa worker olmaydi
+        self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP()), (0, 0))
+        self._make_due()
+        self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP()), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'sent')
+
+    def test_failure_retried_with_backoff(self):
+        message, = self._enqueue()
+        for attempt in (1, 2):
+            started = timezone.now()
+            self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP(fail=1)), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts), ('pending', attempt))
+            self.assertIn('421', message.last_error)
+            delay = timezone.timedelta(seconds=outbox.BACKOFF_BASE * 2 ** (attempt - 1))
+            self.assertGreaterEqual(message.next_attempt_at, started + delay)
+            self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP()), (0, 0))
+            self._make_due()
+        self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP()), (1, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        message, = self._enqueue()
+        OutboxEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP(fail=1)), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', outbox.MAX_ATTEMPTS))
+        self._make_due()
+        self.assertEqual(outbox.drain(10, smtp_connection=FlakySMTP()), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+def _level_after(total_kg, level):
+    """The level-up rule as update_stats applied it in Python before the conditional UPDATE."""
+    return level + 1 if total_kg > level * balance.LEVEL_KG_STEP else level
+
+
+class BalanceTests(TestCase):
+    """credit/debit change the balance with one conditional UPDATE; credit_batch matches them."""
+
+    # (jami kg, daraja, qo'shilgan kg) - LEVEL_KG_STEP chegaralari atrofida
+    LEVEL_CASES = [
+        ('49.00', 1, '1.00'), ('49.00', 1, '1.01'), ('50.00', 1, '0'), ('50.00', 1, '0.01'),
+        ('0', 1, '120.00'), ('100.00', 2, '0'), ('99.99', 2, '0.02'), ('149.99', 3, '0.01'),
+    ]
+
+    def _user(self, name, **fields):
+        return User.objects.create(username=name, email=f'{name}@seed.local', **fields)
+
+    def test_debit_beyond_balance_changes_nothing(self):
+        user = self._user('debit', balance=Decimal('100'))
+        with self.assertRaises(balance.InsufficientFunds):
+            balance.debit(user, Decimal('100.01'), description='x', provider='Elektr')
+        self.assertEqual(User.objects.get(pk=user.pk).balance, Decimal('100'))
+        self.assertFalse(Transaction.objects.filter(user=user).exists())
+
+        balance.debit(user, Decimal('100'), description='x', provider='Elektr')
+        self.assertEqual((user.balance, User.objects.get(pk=user.pk).balance), (Decimal('0'), Decimal('0')))
+        self.assertEqual(Transaction.objects.get(user=user).amount, Decimal('-100'))
+
+    def test_level_up_matches_python_rule(self):
+        for index, (total_kg, level, kg) in enumerate(self.LEVEL_CASES):
+            with self.subTest(total_kg=total_kg, level=level, kg=kg):
+                expected = _level_after(Decimal(total_kg) + Decimal(kg), level)
+                single = self._user(f'level-{index}', total_recycled_kg=Decimal(total_kg), level=level)
+                balance.credit(single, 0, Decimal(kg), description='x', provider='x')
+                self.assertEqual((single.level, User.objects.get(pk=single.pk).level), (expected, expected))
+
+                batched = self._user(f'batch-{index}', total_recycled_kg=Decimal(total_kg), level=level)
+                (_, _, batch_level), = balance.credit_batch([(batched.pk, Decimal('0'), Decimal(kg))])
+                self.assertEqual((batch_level, User.objects.get(pk=batched.pk).level), (expected, expected))
+
+    def test_credit_batch_keeps_balance_and_ledger_consistent(self):
+        first, second = self._user('first', balance=Decimal('10')), self._user('second', balance=Decimal('0'))
+        events = [(first.pk, Decimal('100'), Decimal('30')), (second.pk, Decimal('5.50'), Decimal('1')),
+                  (0, Decimal('7'), Decimal('1')), (first.pk, Decimal('25'), Decimal('30'))]
+        results = balance.credit_batch(events)
+        self.assertEqual(results, [(Decimal('110'), Decimal('30'), 1), (Decimal('5.50'), Decimal('1'), 1),
+                                   None, (Decimal('135'), Decimal('60'), 2)])
+        for user, start in ((first, Decimal('10')), (second, Decimal('0'))):
+            user.refresh_from_db()
+            ledger = Transaction.objects.filter(user=user).aggregate(s=Sum('amount'))['s']
+            self.assertEqual(user.balance - start, ledger)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class GoogleAuthTests(TestCase):
+    """google_auth against a local stand-in for Google's certificate endpoint."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.google = StandInGoogleServer().__enter__()
+        cls.addClassCleanup(cls.google.__exit__, None, None, None)
+
+    def setUp(self):
+        self.client = make_client()
+        self.google.requests = 0
+        google_tokens.clear()
+        self.addCleanup(google_tokens.clear)
+        settings = override_settings(GOOGLE_CERTS_URL=self.google.certs_url, GOOGLE_CLIENT_ID=self.google.client_id)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _login(self, token):
+        return self.client.post('/api/users/google_auth/', {'token': token}, content_type='application/json')
+
+    def test_certificates_fetched_once(self):
+        for _ in range(3):
+            self.assertIn(self._login(self.google.id_token('g@gmail.com')).status_code, (200, 201))
+        self.assertEqual(self.google.requests, 1)
+        self.assertTrue(User.objects.filter(email='g@gmail.com').exists())
+
+    def test_key_rotation_refetches_once(self):
+        self._login(self.google.id_token('g@gmail.com'))
+        self.google.rotate_key()
+        for _ in range(3):
+            self.assertIn(self._login(self.google.id_token('g@gmail.com')).status_code, (200, 201))
+        self.assertEqual(self.google.requests, 2)
+
+    def test_tampered_token_rejected(self):
+        token = self.google.id_token('g@gmail.com')
+        self.assertEqual(self._login(token[:-4] + 'AAAA').status_code, 401)
+
+    def test_malformed_header_rejected(self):
+        # Sarlavha base64/JSON emas yoki kid satr emas - 500 emas, 401
+        for token in ('!!!.e30.AAAA', 'e30.e30.AAAA', 'W10.e30.AAAA', 'eyJraWQiOiBbMV19.e30.AAAA'):
+            with self.subTest(token=token):
+                self.assertEqual(self._login(token).status_code, 401)
+        self.assertEqual(self._login(12345).status_code, 400)
+
+    def test_other_audience_rejected(self):
+        with override_settings(GOOGLE_CLIENT_ID='another-app'):
+            self.assertEqual(self._login(self.google.id_token('g@gmail.com')).status_code, 401)
+
+    def test_unset_client_id_fails_closed(self):
+        with override_settings(GOOGLE_CLIENT_ID=''):
+            response = self._login(self.google.id_token('g@gmail.com'))
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(User.objects.filter(email='g@gmail.com').exists())
+
+
+def _months(lower, upper):
+    """Partitions a [lower, upper] date range may touch."""
+    month, last = partitions.month_of_moment(lower), partitions.month_of_moment(upper)
+    names = set()
+    while month <= last:
+        names.add(partitions.covering(month))
+        month = partitions.add_months(month, 1)
+    return names
+
+
+def _plans(user):
+    """
+    Hot queries, the index each of them must use and, on a partitioned
+    table, the only partitions it may scan (None: not checked).
+    """
+    now = timezone.now()
+    recent = now - timezone.timedelta(minutes=5)
+    month = partitions.month_start(partitions.current_month())
+    next_month = partitions.month_start(partitions.add_months(partitions.current_month(), 1))
+    partitioned = partitions.is_partitioned()
+    return {
+        'transactions_list': (
+            Transaction.objects.filter(user=user).order_by('-date', '-id')[:100],
+            'txn_user_date_id_idx',
+            None,
+        ),
+        'fraud_recent_spend': (
+            Transaction.objects.filter(
+                user=user,
+                type='spend',
+                # Yuqori chegara bilan kelgusi oylar bo'limlari ham kesiladi
+                date__gte=recent,
+                date__lte=now,
+            ),
+            'txn_user_type_date_idx',
+            _months(recent, now) if partitioned else None,
+        ),
+        # Bir oylik ko'chirma: faqat shu oy bo'limi (kichik hajmda planner indeks o'rniga saralashi mumkin)
+        'transactions_month': (
+            Transaction.objects.filter(user=user, date__gte=month, date__lt=next_month).order_by('-date', '-id')[:100],
+            None,
+            _months(month, next_month - timezone.timedelta(microseconds=1)) if partitioned else None,
+        ),
+    }
+
+
+def _index_names(index_name):
+    """The index and, for a partitioned table, its per-partition indexes."""
+    if connection.vendor != 'postgresql':
+        return {index_name}
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relid::regclass::text FROM pg_partition_tree(%s::regclass)', [index_name])
+        return {index_name} | {row[0] for row in cursor.fetchall()}
+
+
+def _scanned_partitions(plan):
+    return set(re.findall(rf'\bon ({partitions.TABLE}_(?:p\d{{4}}_\d{{2}}|before_\d{{4}}_\d{{2}}|default))\b', plan))
+
+
+def _problems(plan, index_name, expected_partitions):
+    problems = []
+    if expected_partitions is not None:
+        scanned = _scanned_partitions(plan)
+        if scanned != expected_partitions:
+            problems.append(f'partition pruning: {", ".join(sorted(scanned)) or "-"} '
+                            f'(kutilgan {", ".join(sorted(expected_partitions))})')
+    if index_name is None:
+        return problems
+    if not any(name in plan for name in _index_names(index_name)):
+        problems.append(f'{index_name} ishlatilmadi')
+    if connection.vendor == 'postgresql':
+        if 'Seq Scan' in plan:
+            problems.append('Seq Scan')
+        # Merge Append'ning "Sort Key" qatori saralash emas
+        if re.search(r'(^|->)\s*(Incremental )?Sort\s+\(', plan, re.M):
+            problems.append('Sort')
+    elif connection.vendor == 'sqlite':
+        if 'SEARCH' not in plan:
+            problems.append('to\'liq SCAN')
+        if 'TEMP B-TREE' in plan:
+            problems.append('TEMP B-TREE (saralash)')
+    return problems
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN of the hot Transaction queries: index use and, on PostgreSQL, partition pruning."""
+
+    USERS = 5
+    PER_USER = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = seed.seed_users(cls.USERS, tag='plans')
+        seed.seed_transactions([user.pk for user in users], cls.PER_USER)
+        # Oxirgi daqiqalardagi faollik: bo'lmasa ikkala indeks bahosi teng (rows=1) va tanlov
+        # indekslarning yaratilish tartibiga bog'liq bo'lib qoladi
+        Transaction.objects.bulk_create(
+            Transaction(user=users[0], amount=Decimal('1'), type='earn', description='plans')
+            for _ in range(300)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else f'ANALYZE {Transaction._meta.db_table}')
+        cls.user = users[0]
+
+    def test_hot_queries_use_indexes(self):
+        for name, (queryset, index_name, expected_partitions) in _plans(self.user).items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(_problems(plan, index_name, expected_partitions), [], plan)
+
+
+class TransactionPaginationTests(TestCase):
+    """/api/transactions/ pages by a (date, id) cursor; ?page=N keeps the old responses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='pages', email='pages@seed.local')
+        Transaction.objects.bulk_create(
+            Transaction(user=cls.user, amount=index, type='earn', description='x') for index in range(7)
+        )
+        # Bir xil sana: tartibni faqat id hal qiladi
+        Transaction.objects.filter(user=cls.user).update(date=timezone.now())
+
+    def setUp(self):
+        self.client = make_client()
+        self.client.force_login(self.user)
+
+    def _page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [row['id'] for row in body['results']], body
+
+    def _cursor(self, raw):
+        return '/api/transactions/?cursor=' + base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def test_next_and_previous_round_trip(self):
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-id').values_list('id', flat=True))
+        pages, url = [], '/api/transactions/?page_size=3'
+        while url:
+            ids, body = self._page(url)
+            pages.append(ids)
+            url = body['next']
+        self.assertEqual(pages, [expected[:3], expected[3:6], expected[6:]])
+
+        ids, body = self._page(body['previous'])
+        self.assertEqual(ids, expected[3:6])
+        ids, body = self._page(body['previous'])
+        self.assertEqual(ids, expected[:3])
+        self.assertIsNone(body['previous'])
+
+    def test_malformed_cursor_is_404(self):
+        moment = timezone.now().isoformat()
+        for cursor in ('not-base64!', self._cursor('f|x'), self._cursor(f'f|{moment}|abc'),
+                       self._cursor(f'q|{moment}|1'), self._cursor(f'f|{moment}|{2 ** 63}'),
+                       self._cursor('f|2024-01-01T00:00:00|1'), '/api/transactions/?cursor=%FF%FE'):
+            with self.subTest(cursor):
+                url = cursor if cursor.startswith('/') else f'/api/transactions/?cursor={cursor}'
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_page_size_capped(self):
+        Transaction.objects.bulk_create(
+            Transaction(user=self.user, amount=1, type='earn', description='x')
+            for _ in range(pagination.MAX_PAGE_SIZE)
+        )
+        ids, body = self._page('/api/transactions/?page_size=100000')
+        self.assertEqual(len(ids), pagination.MAX_PAGE_SIZE)
+        self.assertIsNotNone(body['next'])
+
+    def test_page_number_compatibility(self):
+        ids, body = self._page('/api/transactions/?page=2&page_size=3')
+        self.assertEqual(body['count'], 7)
+        self.assertEqual(len(ids), 3)
+        self.assertIn('page=3', body['next'])
+        self.assertIn('page_size=3', body['previous'])
+
+
+@override_settings(KIOSK_API_KEYS=['kiosk-secret'])
+class BulkUpdateStatsTests(TestCase):
+    """bulk_update_stats mints money: staff or a configured kiosk key only, rate limited."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = make_client()
+        self.user = User.objects.create(username='kiosk-user', email='kiosk-user@seed.local')
+        self.body = {'events': [{'user_id': self.user.pk, 'added_balance': 500, 'added_kg': 1}]}
+
+    def _post(self, **headers):
+        return self.client.post('/api/users/bulk_update_stats/', self.body, content_type='application/json', **headers)
+
+    def test_anonymous_and_wrong_key_rejected(self):
+        self.assertEqual(self._post().status_code, 403)
+        self.assertEqual(self._post(HTTP_X_KIOSK_KEY='guess').status_code, 403)
+        self.assertEqual(User.objects.get(pk=self.user.pk).balance, self.user.balance)
+
+    def test_kiosk_key_accepted_and_throttled(self):
+        capacity = 30
+        with override_settings(RATE_LIMITS={'bulk_update_stats': {'kiosk': (capacity, 60)}}):
+            statuses = [self._post(HTTP_X_KIOSK_KEY='kiosk-secret').status_code for _ in range(capacity + 1)]
+        self.assertEqual(statuses[:capacity], [200] * capacity)
+        self.assertEqual(statuses[capacity], 429)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class RecentPaymentsTests(TestCase):
+    """The rapid-payment rule sees every worker's payments, with or without a shared cache."""
+
+    def test_sixth_payment_within_window_blocked(self):
+        user = User.objects.create(username='payer', email='payer@seed.local', balance=Decimal('100000'))
+        client = make_client()
+        client.force_login(user)
+        payment = {'provider': 'Elektr', 'account_number': '1234567', 'amount': '1000'}
+        statuses = [client.post(f'/api/users/{user.pk}/pay_utility/', payment, content_type='application/json').status_code
+                    for _ in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [400])
+        # LocMemCache: hisob ledger'dan, kesh hisoblagichi ishlatilmaydi
+        self.assertFalse(counters.cache_is_shared())
+        self.assertEqual(counters.recent_payments.count(user.pk), 5)
+
+
+class StubVelocity:
+    """recent_payments stand-in: a fixed count, and how often it was asked."""
+
+    def __init__(self, count=0):
+        self.value = count
+        self.calls = 0
+
+    def count(self, user_id):
+        self.calls += 1
+        return self.value
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class FraudEngineTests(TestCase):
+    """Rules run cheapest first with per-provider thresholds and stop once the payment is blocked."""
+
+    def _engine(self, velocity, **kwargs):
+        return fraud.FraudEngine(list(reversed(fraud.RULES)), velocity=velocity, **kwargs)
+
+    def test_cheap_rules_first_and_short_circuit(self):
+        velocity = StubVelocity(count=99)
+        engine = self._engine(velocity)
+        self.assertEqual([rule.name for rule in engine.rules][-1], 'rapid_payments')
+
+        result = engine.evaluate(1, 'Elektr', 'abc123', Decimal('1000'))
+        self.assertEqual(result, fraud.FraudResult(True, 1.0, ['Hisob raqami noto\'g\'ri formatda']))
+        # Arzon qoida bloklagan - kesh/ledger so'ralmaydi
+        self.assertEqual(velocity.calls, 0)
+        self.assertEqual(engine.rule_stats()['rapid_payments']['calls'], 0)
+
+        result = engine.evaluate(1, 'Elektr', '1234567', Decimal('1000'))
+        self.assertEqual(result, fraud.FraudResult(True, 1.0, ['Juda ko\'p tez to\'lovlar']))
+        self.assertEqual(velocity.calls, 1)
+
+    def test_score_accumulates_up_to_block_score(self):
+        velocity = StubVelocity()
+        engine = self._engine(velocity, block_score=2.0)
+        blocked, score, reasons = engine.evaluate(1, 'Elektr', 'abc', Decimal('0'))
+        self.assertEqual((blocked, score), (True, 2.0))
+        self.assertCountEqual(reasons, ['Hisob raqami noto\'g\'ri formatda', 'Summa noto\'g\'ri'])
+        self.assertEqual(velocity.calls, 0)
+        self.assertEqual(engine.evaluate(1, 'Elektr', 'abc', Decimal('10')),
+                         fraud.FraudResult(False, 1.0, ['Hisob raqami noto\'g\'ri formatda']))
+        self.assertEqual(velocity.calls, 1)
+
+    def test_provider_thresholds(self):
+        engine = self._engine(StubVelocity(), provider_thresholds={
+            'Gaz': {'max_amount': Decimal('500'), 'min_account_length': 10},
+        })
+        self.assertTrue(engine.evaluate(1, 'Gaz', '1234567890', Decimal('501')).blocked)
+        self.assertTrue(engine.evaluate(1, 'Gaz', '1234567', Decimal('100')).blocked)
+        self.assertFalse(engine.evaluate(1, 'Gaz', '1234567890', Decimal('500')).blocked)
+        # Boshqa provayderlar umumiy chegaralar bilan
+        self.assertFalse(engine.evaluate(1, 'Elektr', '1234567', Decimal('501')).blocked)
+
+    def test_rule_stats_exact_under_threads(self):
+        engine = self._engine(StubVelocity())
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: engine.evaluate(1, 'Elektr', '1234567', Decimal('10')), range(4000)))
+        self.assertEqual({name: (row['calls'], row['hits']) for name, row in engine.rule_stats().items()},
+                         {rule.name: (4000, 0) for rule in fraud.RULES})
+
+    def test_pay_utility_returns_reasons(self):
+        user = User.objects.create(username='fraud', email='fraud@seed.local', balance=Decimal('5000'))
+        client = make_client()
+        client.force_login(user)
+        payment = {'provider': 'Elektr', 'account_number': '12ab', 'amount': '1000'}
+        response = client.post(f'/api/users/{user.pk}/pay_utility/', payment, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'error': 'Firibgarlik aniqlandi: Hisob raqami noto\'g\'ri formatda', 'success': False,
+        })
+        self.assertEqual(User.objects.get(pk=user.pk).balance, Decimal('5000'))
+        blocked = Transaction.objects.get(user=user)
+        self.assertEqual(blocked.amount, 0)
+        self.assertIn('FIRIBGARLIK ANIQLANDI: Hisob raqami noto\'g\'ri formatda', blocked.description)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class RegisterTests(TestCase):
+    """A username the user typed is never silently renamed."""
+
+    def _register(self, username):
+        body = {'username': username, 'password': 'parol-123456', 'password_confirm': 'parol-123456'}
+        return make_client().post('/api/users/register/', body, content_type='application/json')
+
+    def test_taken_username_rejected(self):
+        self.assertEqual(self._register('ali').status_code, 201)
+        response = self._register('ali')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.json())
+        self.assertEqual(list(User.objects.filter(username__startswith='ali').values_list('username', flat=True)), ['ali'])
+
+
+class TokenBucketTests(TestCase):
+    """Tokens are taken with atomic cache counters: concurrent requests never overspend."""
+
+    def setUp(self):
+        cache.clear()
+        self.bucket = ratelimit.TokenBucket('test', capacity=10, period=60)
+
+    def test_concurrent_requests_take_capacity_tokens(self):
+        now = 6000.0
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: self.bucket.consume('ip', now)[0], range(40)))
+        self.assertEqual(results.count(True), 10)
+
+    def test_tokens_refill_evenly(self):
+        for _ in range(10):
+            self.assertTrue(self.bucket.consume('ip', 6000.0)[0])
+        allowed, retry_after = self.bucket.consume('ip', 6000.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 66.0)
+        # Keyingi oynada oldingi oyna ulushi kamaygan sari bittadan token qaytadi
+        self.assertFalse(self.bucket.consume('ip', 6065.0)[0])
+        self.assertTrue(self.bucket.consume('ip', 6066.0)[0])
+        self.assertFalse(self.bucket.consume('ip', 6066.0)[0])
+        self.assertTrue(self.bucket.consume('ip', 6072.0)[0])
+
+
+class TokenTests(TestCase):
+    """Refresh tokens are single use, logout revokes only its own login; the auth cache holds no password hash."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tokens', email='tokens@seed.local', password='parol-123456')
+
+    def test_refresh_token_works_once(self):
+        tokens = authentication.issue_tokens(self.user)
+        rotated = authentication.refresh_tokens(tokens['refresh'])
+        self.assertIsNotNone(rotated)
+        self.assertIsNone(authentication.refresh_tokens(tokens['refresh']))
+        self.assertIsNotNone(authentication.refresh_tokens(rotated['refresh']))
+
+    def _device(self):
+        client = make_client()
+        tokens = client.post('/api/users/login/', {'username': 'tokens', 'password': 'parol-123456'},
+                             content_type='application/json').json()
+        client.cookies.clear()
+        return client, tokens
+
+    def _me(self, client, tokens):
+        return client.get('/api/users/me/', HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}').status_code
+
+    def test_refresh_and_logout_touch_one_device(self):
+        with _auth_mode('token'):
+            phone, phone_tokens = self._device()
+            laptop, laptop_tokens = self._device()
+
+            # Telefon refresh qiladi - noutbukning tokenlari ishlashda davom etadi
+            rotated = phone.post('/api/users/token_refresh/', {'refresh': phone_tokens['refresh']},
+                                 content_type='application/json')
+            self.assertEqual(rotated.status_code, 200)
+            phone_tokens = rotated.json()
+            self.assertEqual(self._me(laptop, laptop_tokens), 200)
+
+            # Telefondan logout - faqat telefon tokenlari bekor bo'ladi
+            with self.captureOnCommitCallbacks(execute=True):
+                logout = phone.post('/api/users/logout/', HTTP_AUTHORIZATION=f'Bearer {phone_tokens["access"]}')
+            self.assertEqual(logout.status_code, 200)
+            self.assertEqual(self._me(phone, phone_tokens), 401)
+            self.assertIsNone(authentication.refresh_tokens(phone_tokens['refresh']))
+
+            self.assertEqual(self._me(laptop, laptop_tokens), 200)
+            self.assertIsNotNone(authentication.refresh_tokens(laptop_tokens['refresh']))
+
+    def test_cookie_logout_revokes_its_login(self):
+        with _auth_mode('token'):
+            client = make_client()
+            tokens = client.post('/api/users/login/', {'username': 'tokens', 'password': 'parol-123456'},
+                                 content_type='application/json').json()
+            other = authentication.issue_tokens(self.user)
+            self.assertEqual(client.post('/api/users/logout/').status_code, 200)
+            self.assertIsNone(authentication.refresh_tokens(tokens['refresh']))
+            self.assertIsNotNone(authentication.refresh_tokens(other['refresh']))
+
+    def test_purge_keeps_live_families(self):
+        expired, revoked, live = (authentication.issue_tokens(self.user) for _ in range(3))
+        long_ago = timezone.now() - timezone.timedelta(days=1)
+        families = TokenFamily.objects.filter(user=self.user).order_by('created_at', 'pk')
+        TokenFamily.objects.filter(pk=families[0].pk).update(expires_at=long_ago)
+        TokenFamily.objects.filter(pk=families[1].pk).update(revoked_at=long_ago)
+        call_command('purge_token_families', stdout=io.StringIO())
+        self.assertEqual(TokenFamily.objects.filter(user=self.user).count(), 1)
+        self.assertIsNone(authentication.refresh_tokens(expired['refresh']))
+        self.assertIsNone(authentication.refresh_tokens(revoked['refresh']))
+        self.assertIsNotNone(authentication.refresh_tokens(live['refresh']))
+
+    def test_cache_holds_no_password_hash(self):
+        user = authentication.get_user(self.user.pk)
+        self.assertNotIn(self.user.password, repr(cache.get(f'api:auth:user:{self.user.pk}')))
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertEqual(authentication.session_auth_hash(user), self.user.get_session_auth_hash())
+
+    @override_settings(AUTH_MODE='cached_session')
+    def test_balance_change_drops_cached_user(self):
+        self.assertEqual(authentication.get_user(self.user.pk).balance, self.user.balance)
+        with self.captureOnCommitCallbacks(execute=True):
+            balance.credit(self.user, Decimal('50'), description='x', provider='x')
+        self.assertEqual(authentication.get_user(self.user.pk).balance, self.user.balance)
+        self.assertEqual(self.user.balance, Decimal('1050'))
+
+
+AUTH_CLASSES = {
+    'session': [SessionAuthentication],
+    'cached_session': [authentication.CachedSessionAuthentication],
+    'token': [authentication.SignedTokenAuthentication, authentication.CachedSessionAuthentication],
+}
+
+
+@contextmanager
+def _auth_mode(mode):
+    """settings.AUTH_MODE as the settings module applies it (views read the auth classes at import)."""
+    engine = 'django.contrib.sessions.backends.' + ('db' if mode == 'session' else 'cached_db')
+    with override_settings(AUTH_MODE=mode, SESSION_ENGINE=engine), \
+            mock.patch.object(APIView, 'authentication_classes', AUTH_CLASSES[mode]):
+        yield
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class AuthQueryTests(TestCase):
+    """With a warm cache the cached modes answer me, update_stats and pay_utility without reading the user."""
+
+    def _login(self, mode):
+        cache.clear()
+        user = User.objects.create_user(username=f'queries-{mode}', password='parol-123456', balance=Decimal('100000'))
+        client = make_client()
+        response = client.post('/api/users/login/', {'username': user.username, 'password': 'parol-123456'},
+                               content_type='application/json')
+        headers = {}
+        if mode == 'token':
+            # Faqat Bearer token - sessiya cookie'si yuborilmaydi
+            client.cookies.clear()
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {response.json()["access"]}'
+        self.assertEqual(client.get('/api/users/me/', **headers).status_code, 200)  # kesh isitish
+        return client, user, headers
+
+    def _requests(self, client, user, headers):
+        return {
+            'me': lambda: client.get('/api/users/me/', **headers),
+            'update_stats': lambda: client.post(f'/api/users/{user.pk}/update_stats/',
+                                                {'added_balance': 100, 'added_kg': 1},
+                                                content_type='application/json', **headers),
+            'pay_utility': lambda: client.post(f'/api/users/{user.pk}/pay_utility/',
+                                               {'provider': 'Elektr', 'account_number': '1234567', 'amount': '100'},
+                                               content_type='application/json', **headers),
+        }
+
+    def test_queries_per_mode(self):
+        with _auth_mode('session'):
+            session = {}
+            for name, request in self._requests(*self._login('session')).items():
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(request().status_code, 200)
+                session[name] = len(queries)
+        # Sessiya rejimi: django_session va api_user o'qiladi, qolgani yozuvlar
+        self.assertEqual(session['me'], 2)
+
+        for mode in ('cached_session', 'token'):
+            with self.subTest(mode), _auth_mode(mode):
+                for name, request in self._requests(*self._login(mode)).items():
+                    with self.subTest(name), self.assertNumQueries(session[name] - 2):
+                        self.assertEqual(request().status_code, 200)
+
+
+def _golden_users():
+    """Edge cases for serialize_user: decimals, names, nullable fields."""
+    base = dict(username='ali', email='ali@example.com', first_name='Ali', last_name='Valiyev',
+                balance=Decimal('1000.00'), total_recycled_kg=Decimal('0.00'), level=1,
+                join_date=date(2024, 1, 15), role='user', region='Toshkent', district='Chilonzor')
+    variants = [
+        {},
+        {'id': 1},
+        {'id': 2**40},
+        # Saqlanmagan model default'i float (1000.00)
+        {'balance': 1000.0, 'total_recycled_kg': 0.0},
+        {'balance': Decimal('0'), 'total_recycled_kg': Decimal('12.345')},
+        {'balance': Decimal('12.355'), 'total_recycled_kg': Decimal('12.365')},
+        {'balance': Decimal('-5.5'), 'total_recycled_kg': Decimal('1E+2')},
+        {'balance': Decimal('99999999.99'), 'total_recycled_kg': Decimal('0.005')},
+        {'balance': 5, 'total_recycled_kg': '7.1'},
+        {'first_name': '', 'last_name': ''},
+        {'first_name': 'Ali', 'last_name': ''},
+        {'first_name': '', 'last_name': 'Valiyev'},
+        {'first_name': ' ', 'last_name': ' '},
+        {'first_name': 'Ғулом', 'last_name': 'Ёқубов', 'region': 'Farg\'ona', 'district': 'Qo\'qon'},
+        {'email': ''},
+        {'region': None, 'district': None},
+        {'region': '', 'district': ''},
+        {'level': 0},
+        {'level': 10**6},
+        {'join_date': date(2024, 2, 29)},
+        {'join_date': None},
+        {'role': 'admin'},
+    ]
+    return [User(**dict(base, **variant)) for variant in variants]
+
+
+class SerializeUserTests(TestCase):
+    """serialize_user() renders byte-for-byte the same JSON as UserSerializer."""
+
+    def _assert_same(self, user):
+        renderer = JSONRenderer()
+        expected, actual = UserSerializer(user).data, serialize_user(user)
+        self.assertEqual(actual, expected)
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_golden_users(self):
+        for index, user in enumerate(_golden_users()):
+            with self.subTest(index):
+                self._assert_same(user)
+
+    def test_saved_users(self):
+        seed.seed_users(20, tag='serializer')
+        # Bazadan qaytgan Decimal/str qiymatlar ham (join_date NOT NULL)
+        for index, user in enumerate(_golden_users()):
+            if user.join_date is not None:
+                user.pk, user.username = None, f'golden-{index}'
+                user.save()
+        for user in User.objects.order_by('pk'):
+            with self.subTest(user.username):
+                self._assert_same(user)
+
+
+class ExportTests(TestCase):
+    """The statement export streams every row in batches, in both formats."""
+
+    ROWS = 5000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = seed.seed_users(2, tag='export')
+        seed.seed_transactions([cls.user.pk], cls.ROWS)
+
+    def setUp(self):
+        self.client = make_client()
+        self.client.force_login(self.user)
+
+    def _export(self, query, rows=0):
+        response = self.client.get(f'/api/transactions/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # Javob CHUNK_SIZE qatorli bo'laklarda - butun eksport xotirada yig'ilmaydi
+        self.assertGreaterEqual(len(chunks), rows // statements.CHUNK_SIZE)
+        return b''.join(chunks)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self._export('?format=csv', self.ROWS).decode())))
+        self.assertEqual(rows[0], statements.COLUMNS)
+        self.assertEqual(len(rows) - 1, self.ROWS)
+        expected = list(Transaction.objects.filter(user=self.user).order_by('date', 'id').values_list('id', flat=True))
+        self.assertEqual([int(row[0]) for row in rows[1:]], expected)
+
+    def test_ndjson_gzip(self):
+        lines = gzip.decompress(self._export('?format=ndjson&gzip=1', self.ROWS)).decode().splitlines()
+        self.assertEqual(len(lines), self.ROWS)
+        self.assertEqual(set(json.loads(lines[0])), set(statements.COLUMNS))
+        self.assertEqual({json.loads(line)['user_id'] for line in lines}, {self.user.pk})
+
+    def test_date_range(self):
+        since = (timezone.now() - timezone.timedelta(days=30)).date().isoformat()
+        lines = self._export(f'?format=ndjson&from={since}').decode().splitlines()
+        expected = Transaction.objects.filter(user=self.user, **statements.date_filters(since)).count()
+        self.assertTrue(0 < len(lines) == expected < self.ROWS)
+
+    def test_rows_pulled_from_iterator_per_chunk(self):
+        fetched = 0
+        iterator = QuerySet.iterator
+
+        def counting(queryset, chunk_size=None):
+            nonlocal fetched
+            self.assertEqual(chunk_size, statements.CHUNK_SIZE)
+            for row in iterator(queryset, chunk_size=chunk_size):
+                fetched += 1
+                yield row
+
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=counting):
+            response = self.client.get('/api/transactions/export/?format=csv')
+            self.assertIsInstance(response, StreamingHttpResponse)
+            self.assertEqual(fetched, 0)  # qatorlar javob tanasi o'qilganda olinadi
+            content = iter(response.streaming_content)
+            next(content)
+            # Birinchi bo'lak uchun faqat bitta CHUNK_SIZE partiya o'qilgan, ro'yxat emas
+            self.assertEqual(fetched, statements.CHUNK_SIZE)
+            self.assertGreater(len(list(content)), 1)
+        self.assertEqual(fetched, self.ROWS)
+
+    def test_other_users_staff_only(self):
+        response = self.client.get(f'/api/transactions/export/?format=csv&user={self.other.pk}')
+        self.assertEqual(response.status_code, 403)
+
+
+class PurgeVerificationsTests(TestCase):
+    """purge_verifications deletes used and expired codes and never runs twice at once."""
+
+    def _try_lock_elsewhere(self):
+        # Boshqa oqim - boshqa baza ulanishi (advisory lock ulanishga bog'langan)
+        result = []
+
+        def attempt():
+            try:
+                with locks.try_lock('purge_verifications') as acquired:
+                    result.append(acquired)
+            finally:
+                connection.close()
+        thread = threading.Thread(target=attempt)
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_purges_used_and_expired_codes(self):
+        now = timezone.now()
+        kept = EmailVerification.objects.create(email='a@seed.local', code='111111')
+        EmailVerification.objects.create(email='b@seed.local', code='222222', is_verified=True)
+        EmailVerification.objects.create(email='c@seed.local', code='333333',
+                                         expires_at=now - timezone.timedelta(minutes=1))
+        output = io.StringIO()
+        call_command('purge_verifications', stdout=output)
+        self.assertIn('2 ta kod', output.getvalue())
+        self.assertEqual(list(EmailVerification.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_overlapping_run_skipped(self):
+        with locks.try_lock('purge_verifications') as acquired:
+            self.assertTrue(acquired)
+            self.assertFalse(self._try_lock_elsewhere())
+        self.assertTrue(self._try_lock_elsewhere())
+
+
+class MemoryRankingTests(TransactionTestCase):
+    """In-process rankings are built and rebuilt in the background, never inside the request."""
+
+    def _built(self, ranking):
+        ranking.top(leaderboard.GLOBAL, 10)
+        ranking._thread.join()
+        return ranking
+
+    def test_first_request_does_not_scan_users(self):
+        first = User.objects.create(username='first', email='first@seed.local', total_recycled_kg=5)
+        ranking = leaderboard.MemoryRanking(rebuild_seconds=3600)
+        with mock.patch.object(leaderboard, '_ranking', ranking), self.assertNumQueries(0):
+            self.assertEqual(leaderboard.board(leaderboard.GLOBAL, user_id=first.pk),
+                             {'scope': leaderboard.GLOBAL, 'total': 0, 'top': [], 'me': None, 'building': True})
+        ranking._thread.join()
+        self.assertTrue(ranking.ready)
+        self.assertEqual(ranking.top(leaderboard.GLOBAL, 10), ([(first.pk, 5.0)], 1))
+
+    def test_updates_during_build_replayed(self):
+        first = User.objects.create(username='first', email='first@seed.local', total_recycled_kg=5)
+        ranking = leaderboard.MemoryRanking(rebuild_seconds=3600)
+        entries = leaderboard._entries
+
+        def snapshot_then_update():
+            rows = list(entries())
+            # Bazadan o'qilgandan keyin, ro'yxatlar almashtirilishidan oldin kelgan o'zgarish
+            ranking.update(first.pk, 9.0, leaderboard.scopes('', ''))
+            return iter(rows)
+        with mock.patch.object(leaderboard, '_entries', snapshot_then_update):
+            ranking.rebuild()
+        self.assertEqual(ranking.top(leaderboard.GLOBAL, 10), ([(first.pk, 9.0)], 1))
+
+    def test_stale_lists_served_while_rebuilding(self):
+        first = User.objects.create(username='first', email='first@seed.local', total_recycled_kg=5)
+        ranking = self._built(leaderboard.MemoryRanking(rebuild_seconds=3600))
+        self.assertEqual(ranking.top(leaderboard.GLOBAL, 10), ([(first.pk, 5.0)], 1))
+
+        # Boshqa worker yozgan qator: bu jarayon ro'yxatiga faqat qayta qurishda tushadi
+        User.objects.filter(pk=first.pk).update(total_recycled_kg=1)
+        second = User.objects.create(username='second', email='second@seed.local', total_recycled_kg=3)
+        ranking.rebuild_seconds = 0
+        answered = threading.Event()
+        entries = leaderboard._entries
+
+        def after_answer():
+            answered.wait(5)  # fon qurish so'rov javob bergandan keyin tugasin
+            return entries()
+        with mock.patch.object(leaderboard, '_entries', after_answer):
+            with self.assertNumQueries(0):
+                top, total = ranking.top(leaderboard.GLOBAL, 10)
+            answered.set()
+            ranking._thread.join()
+        self.assertEqual(top[0], (first.pk, 5.0))
+        ranking.rebuild_seconds = 3600
+        self.assertEqual(ranking.top(leaderboard.GLOBAL, 10)[0], [(second.pk, 3.0), (first.pk, 1.0)])
+
+
+class BackfillDailyStatsTests(TestCase):
+    """The rollup is rebuilt from ledger descriptions; unreadable kg are reported, not dropped silently."""
+
+    def test_unparsed_kg_reported(self):
+        user = User.objects.create(username='backfill', email='backfill@seed.local')
+        for amount, description in ((150, 'Qayta ishlash: 1.50kg'), (1000, 'Qayta ishlash: 1E+1kg'),
+                                    (1000, 'Xush kelibsiz bonus'), (100, 'Qayta ishlash: ?kg')):
+            Transaction.objects.create(user=user, amount=amount, type='earn', description=description)
+        broken = Transaction.objects.get(description='Qayta ishlash: ?kg')
+
+        output = io.StringIO()
+        call_command('backfill_daily_stats', '--pause=0', stdout=output)
+        row = DailyUserStats.objects.get(user=user)
+        self.assertEqual((row.recycled_kg, row.earned), (Decimal('11.50'), Decimal('2250')))
+        self.assertIn(f'#{broken.pk}: Qayta ishlash: ?kg', output.getvalue())
+        self.assertIn('1 ta o\'qilmagan kg', output.getvalue())
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class IdempotencyTests(TestCase):
+    """An anonymous stored response is replayed only to the client (IP) that made the request."""
+
+    def _post(self, ip):
+        return make_client().post(f'/api/users/{self.user.pk}/update_stats/', {'added_balance': 100},
+                                  content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1', REMOTE_ADDR=ip)
+
+    def setUp(self):
+        self.user = User.objects.create(username='anon', email='anon@seed.local')
+
+    def test_replay_scoped_to_client_ip(self):
+        first = self._post('10.0.0.1')
+        self.assertEqual(first.status_code, 200)
+        replay = self._post('10.0.0.1')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+
+        other = self._post('10.0.0.2')
+        self.assertEqual(other.status_code, 200)
+        self.assertFalse(other.has_header('Idempotent-Replayed'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+    """ReplicaRouter and ReplicaMiddleware: which reads may go to a replica."""
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.user = User.objects.create(username='replica', email='replica@seed.local')
+        # Yaratish ham pin qiladi - bu testlarda foydalanuvchi yozmagan deb boshlaymiz
+        cache.clear()
+        self.token = authentication.issue_tokens(self.user)['access']
+        self.addCleanup(db_router.reads.set, False)
+
+    def _request(self, method='get', view_name='transaction-list'):
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        request.resolver_match = type('Match', (), {'view_name': view_name})()
+        return request
+
+    def _serve(self, request, response_factory):
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(db_router.reads.get())
+            return response_factory()
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request), seen
+
+    def test_router(self):
+        self.assertIsNone(self.router.db_for_read(Transaction))
+        db_router.reads.set(True)
+        self.assertEqual(self.router.db_for_read(Transaction), 'replica1')
+        self.assertIsNone(self.router.db_for_read(Session))
+        with transaction.atomic():
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        self.assertEqual(self.router.db_for_write(Transaction), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'api'))
+
+    def test_read_views_use_replica(self):
+        _, seen = self._serve(self._request(), HttpResponse)
+        self.assertEqual(seen, [True])
+        self.assertFalse(db_router.reads.get())
+        _, seen = self._serve(self._request(view_name='user-pay-utility'), HttpResponse)
+        self.assertEqual(seen, [False])
+
+    def test_own_write_pins_to_primary(self):
+        self._serve(self._request('post', view_name='user-pay-utility'), HttpResponse)
+        self.assertTrue(db_router.is_pinned(self.user.pk))
+        _, seen = self._serve(self._request(), HttpResponse)
+        self.assertEqual(seen, [False])
+
+    def test_streaming_body_read_from_replica(self):
+        chunks = []
+
+        def content():
+            for _ in range(3):
+                chunks.append(db_router.reads.get())
+                yield b'row\n'
+        response, seen = self._serve(self._request(view_name='transaction-export'),
+                                     lambda: StreamingHttpResponse(content()))
+        self.assertFalse(db_router.reads.get())
+        self.assertEqual(b''.join(response.streaming_content), b'row\n' * 3)
+        self.assertEqual(chunks, [True] * 3)
+        self.assertFalse(db_router.reads.get())
+
+    def test_async_streaming_body_read_from_replica(self):
+        chunks = []
+
+        async def content():
+            for _ in range(3):
+                chunks.append(db_router.reads.get())
+                yield b'row\n'
+
+        async def consume():
+            return [chunk async for chunk in ReplicaMiddleware._areplica_reads(content())]
+        self.assertEqual(asyncio.run(consume()), [b'row\n'] * 3)
+        self.assertEqual(chunks, [True] * 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'api_transaction faqat PostgreSQL da bo\'limlangan')
+class PartitionTests(TestCase):
+    """Migration 0015 keeps the existing rows in place as the partition before its cutover month."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', email='ledger@seed.local', password='x')
+        self.legacy = next(name for name in partitions.partitions().values() if partitions.is_legacy(name))
+        self.last = partitions.month_of(self.legacy)
+
+    def test_legacy_table_covers_months_before_cutover(self):
+        self.assertLessEqual(partitions.current_month(), self.last)
+        self.assertEqual(partitions.covering(partitions.current_month()), self.legacy)
+        self.assertEqual(partitions.covering(partitions.add_months(self.last, 1)),
+                         partitions.partition_name(partitions.add_months(self.last, 1)))
+        Transaction.objects.create(user=self.user, amount=Decimal('5'), type='earn', description='x')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE}')
+            self.assertEqual(cursor.fetchone()[0], self.legacy)
+
+    def test_ensure_skips_months_the_legacy_table_covers(self):
+        created, skipped = partitions.ensure(6)
+        self.assertTrue(created)
+        self.assertEqual(skipped, [])
+        self.assertTrue(all(month > self.last for month in created))
+        self.assertIn(self.legacy, partitions.partitions().values())
+
+    def test_default_rows_moved_only_within_limit(self):
+        month = partitions.add_months(max(self.last, partitions.current_month()), 12)
+        row = Transaction.objects.create(user=self.user, amount=Decimal('5'), type='earn', description='x')
+        Transaction.objects.filter(pk=row.pk).update(date=partitions.month_start(month))  # auto_now_add
+        connection.check_constraints()
+        # Ko'chirish yozuvlarni to'xtatadi - chegaradan ko'p qatorli oy default'da qoladi
+        self.assertEqual(partitions.ensure(0, max_moved_rows=0), ([], [month]))
+        self.assertEqual(partitions.covering(month), partitions.DEFAULT)
+        created, skipped = partitions.ensure(0, max_moved_rows=1)
+        self.assertEqual((created, skipped), ([month], []))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE date >= %s',
+                           [partitions.month_start(month)])
+            self.assertEqual(cursor.fetchone()[0], partitions.partition_name(month))
+
+    def test_archive_legacy_table(self):
+        Transaction.objects.create(user=self.user, amount=Decimal('-5'), type='spend', description='x')
+        # Kechiktirilgan FK tekshiruvlari kutib turgan jadvalni o'chirib bo'lmaydi
+        connection.check_constraints()
+        with tempfile.TemporaryDirectory() as directory:
+            record = partitions.archive(self.last, directory)
+            self.assertEqual((record.rows, record.payouts), (1, Decimal('5')))
+            self.assertTrue(record.path.endswith(f'{self.legacy}.ndjson.gz'))
+        self.assertNotIn(self.legacy, partitions.partitions().values())
+        self.assertEqual(partitions.archived_until(), partitions.month_start(partitions.add_months(self.last, 1)))
+
+
+class ArchiveExportTests(TestCase):
+    """The archive file is written and checked the same way on every database (no partitions needed)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='archive', email='archive@seed.local', password='x')
+        for amount, kind in (('-5.50', 'spend'), ('-4.50', 'spend'), ('12', 'earn'), ('3', 'spend')):
+            Transaction.objects.create(user=self.user, amount=Decimal(amount), type=kind, description='x')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = f'{self.directory.name}/ledger.ndjson.gz'
+
+    def test_export_counts_rows_and_payouts(self):
+        self.assertEqual(partitions.export(partitions.TABLE, self.path), (4, Decimal('10')))
+        with gzip.open(self.path, 'rt', encoding='utf-8') as written:
+            lines = [json.loads(line) for line in written]
+        self.assertEqual([line['id'] for line in lines],
+                         list(Transaction.objects.order_by('date', 'id').values_list('id', flat=True)))
+        self.assertEqual(set(lines[0]), set(statements.COLUMNS))
+
+    def test_short_file_rejected(self):
+        write = statements.ndjson_gzip
+
+        def drop_last_row(batches):
+            return write(batch[:-1] for batch in batches)
+
+        with mock.patch.object(statements, 'ndjson_gzip', drop_last_row):
+            with self.assertRaisesMessage(RuntimeError, '3 qator yozildi, 4 kutilgan'):
+                partitions.export(partitions.TABLE, self.path)
+        # Tekshiruvdan o'tmagan fayl arxiv nomi bilan qolmaydi
+        self.assertFalse(os.path.exists(self.path))
@@ -1,33 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, TransactionViewSet, GlobalStatsViewSet
+from . import async_views
+from .views import UserViewSet, TransactionViewSet, GlobalStatsViewSet, LeaderboardViewSet, metrics_view, rate_limit_stats
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'stats', GlobalStatsViewSet, basename='stats')
+router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
 
 urlpatterns = [
+    path('ratelimits/', rate_limit_stats, name='rate-limit-stats'),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router.urls)),
 ]
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+if settings.ASYNC_VIEWS:
+    # ASGI (uvicorn/daphne): tarmoqni kutadigan action'lar o'rniga async versiyalari
+    urlpatterns = [
+        path('users/google_auth/', async_views.google_auth, name='user-google-auth'),
+        path('users/send_verification_code/', async_views.send_verification_code,
+             name='user-send-verification-code'),
+    ] + urlpatterns
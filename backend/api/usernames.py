@@ -0,0 +1,54 @@
+"""
+Unique username allocation.
+
+Instead of probing `base`, `base1`, `base2`, ... one query at a time, all
+existing usernames starting with `base` are fetched in one indexed prefix
+query and the first free numeric suffix is picked in Python. Concurrent
+signups that pick the same name are resolved by retrying on IntegrityError.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from .models import User
+
+MAX_ATTEMPTS = 5
+MAX_LENGTH = User._meta.get_field('username').max_length
+
+
+def allocate(base):
+    """Return `base` or `base<N>` with the smallest N >= 1 that is free."""
+    base = base[:MAX_LENGTH]
+    names = User.objects.filter(username__startswith=base)
+    if connection.vendor == 'sqlite':
+        # SQLite LIKE indeksdan foydalanmaydi - binar diapazon qo'shamiz
+        names = names.filter(username__gte=base, username__lt=base + '\U0010ffff')
+    taken = set(names.values_list('username', flat=True))
+    if base not in taken:
+        return base
+
+    suffixes = {
+        int(name[len(base):])
+        for name in taken
+        if name[len(base):].isdigit() and not name[len(base):].startswith('0')
+    }
+    counter = 1
+    while counter in suffixes:
+        counter += 1
+    username = f'{base}{counter}'
+    if len(username) > MAX_LENGTH:
+        return allocate(base[:MAX_LENGTH - len(str(counter))])
+    return username
+
+
+def create_with_username(base, create):
+    """
+    Call `create(username)` with a freshly allocated username, retrying with
+    a new one if another request took it first.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        username = allocate(base)
+        try:
+            with transaction.atomic():
+                return create(username)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
@@ -1,21 +1,32 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.contrib.auth import authenticate
+from django.http import HttpResponse
 from django.db import transaction
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from decimal import Decimal
+import logging
 import random
 import requests
 from .models import User, Transaction, GlobalStats, EmailVerification
+from . import (
+    activity, authentication, balance, counters, fraud, google_tokens, idempotency, leaderboard, metrics, outbox,
+    ratelimit, statements, stats, usernames,
+)
+from .pagination import TransactionCursorPagination
+from .permissions import IsStaffOrKiosk
 from .serializers import (
-    UserSerializer, TransactionSerializer,
+    UserSerializer, TransactionSerializer, serialize_user,
     GlobalStatsSerializer, RegisterSerializer, LoginSerializer
 )
 
+log = logging.getLogger(__name__)
+
 
 @api_view(['GET'])
 def api_root(request):
@@ -31,14 +42,23 @@ def api_root(request):
                 'login': 'POST /api/users/login/',
                 'me': 'GET /api/users/me/ (authenticated)',
                 'logout': 'POST /api/users/logout/ (authenticated)',
-                'update_stats': 'POST /api/users/{id}/update_stats/',
-                'pay_utility': 'POST /api/users/{id}/pay_utility/',
+                'token_refresh': 'POST /api/users/token_refresh/ (AUTH_MODE=token)',
+                'update_stats': 'POST /api/users/{id}/update_stats/ (Idempotency-Key)',
+                'bulk_update_stats': 'POST /api/users/bulk_update_stats/ (staff or X-Kiosk-Key)',
+                'pay_utility': 'POST /api/users/{id}/pay_utility/ (Idempotency-Key)',
             },
             'transactions': {
                 'list': 'GET /api/transactions/ (authenticated)',
+                'export': 'GET /api/transactions/export/?format=csv|ndjson&from=&to=&gzip=1 (authenticated)',
+                'activity': 'GET /api/transactions/activity/?period=day|week|month&from=&to= (authenticated)',
+            },
+            'leaderboard': {
+                'top': 'GET /api/leaderboard/?scope=global|region|district&region=&district=&limit=10',
             },
             'stats': {
                 'global': 'GET /api/stats/',
+                'rate_limits': 'GET /api/ratelimits/ (staff)',
+                'metrics': 'GET /api/metrics/ (staff, Prometheus)',
             },
             'admin': {
                 'panel': 'http://127.0.0.1:8000/admin/',
@@ -47,113 +67,209 @@ def api_root(request):
     })
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.filter(is_deleted=False)
-    serializer_class = UserSerializer
-    permission_classes = [AllowAny]
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def rate_limit_stats(request):
+    """Admitted vs rejected request counts per rate-limited action"""
+    return Response(ratelimit.counters())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Per-view request histograms of all workers, Prometheus text format"""
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Quyidagi yordamchilar sinxron action'lar va api/async_views.py uchun umumiy
+
+def check_verification_request(data):
+    """Validate a send_verification_code request. Returns (email, None) or (None, (body, status))."""
+    email = data.get('email')
     
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
-    def send_verification_code(self, request):
-        """Send 6-digit verification code to email"""
-        email = request.data.get('email')
-        first_name = request.data.get('first_name', '')
-        last_name = request.data.get('last_name', '')
-        
-        if not email:
-            return Response({'error': 'Email talab qilinadi'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Email formatini tekshirish
-        email = email.strip().lower()
-        if '@' not in email or '.' not in email.split('@')[1]:
-            return Response({'error': 'Noto\'g\'ri email format'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Test email'lar ro'yxati (bloklash)
-        test_domains = [
-            'test.com', 'example.com', 'mailinator.com', '10minutemail.com',
-            'tempmail.com', 'guerrillamail.com', 'throwaway.email', 'fakeinbox.com',
-            'mohmal.com', 'temp-mail.org', 'getnada.com', 'yopmail.com'
-        ]
-        email_domain = email.split('@')[1].lower()
-        if email_domain in test_domains:
-            return Response({
-                'error': 'Test email\'lar qabul qilinmaydi. Haqiqiy email manzil kiriting (Gmail, Yahoo, Outlook va h.k.)'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # SMTP sozlanmagan bo'lsa, xatolik qaytar
-        if not (settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD):
-            return Response({
-                'error': 'Email xizmati sozlanmagan. Iltimos, administrator bilan bog\'laning.',
-                'hint': 'Backend/.env faylida EMAIL_HOST_USER va EMAIL_HOST_PASSWORD sozlang'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        # Check if email already exists
-        if User.objects.filter(email=email, is_deleted=False).exists():
-            return Response({'error': 'Bu email allaqachon ro\'yxatdan o\'tgan'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Generate 6-digit code
-        code = str(random.randint(100000, 999999))
-        
+    if not email:
+        return None, ({'error': 'Email talab qilinadi'}, status.HTTP_400_BAD_REQUEST)
+    
+    # Email formatini tekshirish
+    email = email.strip().lower()
+    if '@' not in email or '.' not in email.split('@')[1]:
+        return None, ({'error': 'Noto\'g\'ri email format'}, status.HTTP_400_BAD_REQUEST)
+    
+    # Test email'lar ro'yxati (bloklash)
+    test_domains = [
+        'test.com', 'example.com', 'mailinator.com', '10minutemail.com',
+        'tempmail.com', 'guerrillamail.com', 'throwaway.email', 'fakeinbox.com',
+        'mohmal.com', 'temp-mail.org', 'getnada.com', 'yopmail.com'
+    ]
+    email_domain = email.split('@')[1].lower()
+    if email_domain in test_domains:
+        return None, ({
+            'error': 'Test email\'lar qabul qilinmaydi. Haqiqiy email manzil kiriting (Gmail, Yahoo, Outlook va h.k.)'
+        }, status.HTTP_400_BAD_REQUEST)
+    
+    # SMTP sozlanmagan bo'lsa, xatolik qaytar
+    if not (settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD):
+        return None, ({
+            'error': 'Email xizmati sozlanmagan. Iltimos, administrator bilan bog\'laning.',
+            'hint': 'Backend/.env faylida EMAIL_HOST_USER va EMAIL_HOST_PASSWORD sozlang'
+        }, status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    # Check if email already exists
+    if User.objects.filter(email=email, is_deleted=False).exists():
+        return None, ({'error': 'Bu email allaqachon ro\'yxatdan o\'tgan'}, status.HTTP_400_BAD_REQUEST)
+    return email, None
+
+
+def store_verification_code(email, first_name, last_name):
+    """Replace the email's pending code with a new one (queued in the outbox if enabled). Returns (subject, message)."""
+    # Generate 6-digit code
+    code = str(random.randint(100000, 999999))
+    
+    subject = 'EcoCash - Email Tasdiqlash Kodi'
+    message = f"""
+Salom {first_name} {last_name}!
+
+EcoCash tizimiga ro'yxatdan o'tish uchun tasdiqlash kodingiz:
+
+{code}
+
+Bu kod 10 daqiqa davomida amal qiladi.
+
+Agar siz bu xabarni so'ramagan bo'lsangiz, uni e'tiborsiz qoldiring.
+
+Hurmat bilan,
+EcoCash Jamoasi
+            """
+    
+    with transaction.atomic():
         # Delete old verification codes for this email
         EmailVerification.objects.filter(email=email, is_verified=False).delete()
         
         # Create new verification code
-        verification = EmailVerification.objects.create(
+        EmailVerification.objects.create(
             email=email,
             code=code,
             expires_at=timezone.now() + timezone.timedelta(minutes=10)  # 10 minutes expiry
         )
         
-        # Send email - faqat haqiqiy email'ga
-        try:
-            subject = 'EcoCash - Email Tasdiqlash Kodi'
-            message = f"""
-Salom {first_name} {last_name}!
+        if settings.EMAIL_OUTBOX_ENABLED:
+            # Navbatga qo'yish - send_outbox worker yuboradi
+            outbox.enqueue(email, subject, message, settings.EMAIL_HOST_USER)
+    return subject, message
 
-EcoCash tizimiga ro'yxatdan o'tish uchun tasdiqlash kodingiz:
 
-{code}
+def verification_sent(email):
+    return {
+        'message': f'Tasdiqlash kodi {email} ga yuborildi. Kod odatda 5-30 soniya ichida yetib keladi.',
+        'email': email,
+        'delivery_time': '5-30 soniya',
+        'code': None  # Xavfsizlik uchun kod qaytarilmaydi
+    }
 
-Bu kod 10 daqiqa davomida amal qiladi.
 
-Agar siz bu xabarni so'ramagan bo'lsangiz, uni e'tiborsiz qoldiring.
+def verification_failed(email, error):
+    return {
+        'error': f'Email yuborishda xatolik yuz berdi: {error}',
+        'message': 'Email yuborilmadi. Iltimos, email manzilingizni tekshiring va qayta urinib ko\'ring.',
+        'email': email,
+        'hint': 'Email manzili to\'g\'ri ekanligini va internet ulanishini tekshiring'
+    }
 
-Hurmat bilan,
-EcoCash Jamoasi
-            """
-            
-            # Haqiqiy email yuborish (SMTP)
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,  # Haqiqiy email'dan yuboriladi
-                [email],  # Haqiqiy email'ga yuboriladi
-                fail_silently=False,
+
+def google_login(request, payload_data):
+    """Log in (or register) the user of a verified Google ID token. Returns (body, status)."""
+    google_email = payload_data.get('email', '').lower()
+    google_first_name = payload_data.get('given_name', '')
+    google_last_name = payload_data.get('family_name', '')
+    google_name = payload_data.get('name', '')
+    
+    if not google_email:
+        return {'error': 'Google email topilmadi'}, status.HTTP_400_BAD_REQUEST
+    
+    # User mavjudligini tekshirish
+    try:
+        user = User.objects.get(email=google_email, is_deleted=False)
+        # User mavjud - login qilish
+        if user.is_deleted:
+            return {'error': 'Bu hisob o\'chirilgan'}, status.HTTP_401_UNAUTHORIZED
+        
+        # Ism va familyani yangilash (agar o'zgarganda)
+        if google_first_name and user.first_name != google_first_name:
+            user.first_name = google_first_name
+        if google_last_name and user.last_name != google_last_name:
+            user.last_name = google_last_name
+        user.save()
+        
+        tokens = authentication.login(request, user)
+        return {**serialize_user(user), **tokens}, status.HTTP_200_OK
+    except User.DoesNotExist:
+        # User mavjud emas - yangi user yaratish
+        # Username yaratish (email'dan)
+        user = usernames.create_with_username(
+            google_email.split('@')[0],
+            lambda username: User.objects.create_user(
+                username=username,
+                email=google_email,
+                first_name=google_first_name or google_name.split()[0] if google_name else username,
+                last_name=google_last_name or ' '.join(google_name.split()[1:]) if google_name and len(google_name.split()) > 1 else '',
+                password=None  # Google orqali kirganlar uchun parol kerak emas (unusable password)
+            )
+        )
+        stats.record_registration()
+        
+        # Welcome bonus transaction
+        Transaction.objects.create(
+            user=user,
+            amount=1000,
+            type='earn',
+            description='Xush kelibsiz bonus (Google)',
+            provider='EcoCash System'
+        )
+        
+        tokens = authentication.login(request, user)
+        return {**serialize_user(user), **tokens}, status.HTTP_201_CREATED
+
+
+class UserViewSet(viewsets.ModelViewSet):
+    queryset = User.objects.filter(is_deleted=False)
+    serializer_class = UserSerializer
+    permission_classes = [AllowAny]
+    
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @ratelimit.rate_limit('send_verification_code')
+    def send_verification_code(self, request):
+        """Send 6-digit verification code to email"""
+        email, error = check_verification_request(request.data)
+        if error:
+            return Response(*error)
+        
+        # Send email - faqat haqiqiy email'ga
+        try:
+            subject, message = store_verification_code(
+                email, request.data.get('first_name', ''), request.data.get('last_name', '')
             )
             
-            print(f"✅ Email yuborildi: {email} (Kod: {code})")
+            if not settings.EMAIL_OUTBOX_ENABLED:
+                # Haqiqiy email yuborish (SMTP) - so'rov ichida
+                with metrics.timed('smtp'):
+                    send_mail(
+                        subject,
+                        message,
+                        settings.EMAIL_HOST_USER,  # Haqiqiy email'dan yuboriladi
+                        [email],  # Haqiqiy email'ga yuboriladi
+                        fail_silently=False,
+                    )
             
-            return Response({
-                'message': f'Tasdiqlash kodi {email} ga yuborildi. Kod odatda 5-30 soniya ichida yetib keladi.',
-                'email': email,
-                'delivery_time': '5-30 soniya',
-                'code': None  # Xavfsizlik uchun kod qaytarilmaydi
-            })
+            # Kod logga yozilmaydi
+            log.info('Tasdiqlash kodi yuborildi', extra={'sampled': True, 'email': email})
+            return Response(verification_sent(email))
         except Exception as e:
             # Email yuborishda xatolik
-            error_msg = str(e)
-            print(f"❌ Email sending error: {error_msg}")
-            print(f"   Email: {email}")
-            print(f"   Code: {code}")
-            
-            # Xatolikni qaytar
-            return Response({
-                'error': f'Email yuborishda xatolik yuz berdi: {error_msg}',
-                'message': 'Email yuborilmadi. Iltimos, email manzilingizni tekshiring va qayta urinib ko\'ring.',
-                'email': email,
-                'hint': 'Email manzili to\'g\'ri ekanligini va internet ulanishini tekshiring'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            log.exception('Email yuborishda xatolik', extra={'email': email})
+            return Response(verification_failed(email, e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @ratelimit.rate_limit('verify_code')
     def verify_code(self, request):
         """Verify email code and register user"""
         email = request.data.get('email')
@@ -185,25 +301,21 @@ EcoCash Jamoasi
         
         # Create user
         try:
-            username = email.split('@')[0]
-            # Ensure username is unique
-            base_username = username
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=first_name,
-                last_name=last_name
+            # Ensure username is unique (bitta so'rov bilan)
+            user = usernames.create_with_username(
+                email.split('@')[0],
+                lambda username: User.objects.create_user(
+                    username=username,
+                    email=email,
+                    password=password,
+                    first_name=first_name,
+                    last_name=last_name
+                )
             )
+            stats.record_registration()
             
             # Auto login after registration
-            from django.contrib.auth import login
-            login(request, user)
+            tokens = authentication.login(request, user)
             
             # Create welcome bonus transaction
             Transaction.objects.create(
@@ -214,7 +326,7 @@ EcoCash Jamoasi
                 provider='EcoCash System'
             )
             
-            return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+            return Response({**serialize_user(user), **tokens}, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': f'Foydalanuvchi yaratishda xatolik: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -224,10 +336,13 @@ EcoCash Jamoasi
         try:
             serializer = RegisterSerializer(data=request.data)
             if serializer.is_valid():
-                user = serializer.save()
+                try:
+                    user = serializer.save()
+                except ValidationError as e:
+                    return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+                stats.record_registration()
                 # Auto login after registration
-                from django.contrib.auth import login
-                login(request, user)
+                tokens = authentication.login(request, user)
                 # Create welcome bonus transaction
                 Transaction.objects.create(
                     user=user,
@@ -236,15 +351,16 @@ EcoCash Jamoasi
                     description='Xush kelibsiz bonus',
                     provider='EcoCash System'
                 )
-                return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+                return Response({**serialize_user(user), **tokens}, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            print(f"Registration error: {e}")
+            log.exception('Registratsiya xatosi')
             return Response({
                 'error': f'Registratsiya xatosi: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @ratelimit.rate_limit('login')
     def login(self, request):
         """Login user with username or email and password"""
         username_or_email = request.data.get('username', '').strip()
@@ -278,20 +394,18 @@ EcoCash Jamoasi
             
             # Parolni tekshirish
             if user.check_password(password):
-                from django.contrib.auth import login
-                login(request, user)
-                return Response(UserSerializer(user).data, status=status.HTTP_200_OK)
+                tokens = authentication.login(request, user)
+                return Response({**serialize_user(user), **tokens}, status=status.HTTP_200_OK)
             else:
                 return Response({'error': 'Parol noto\'g\'ri'}, status=status.HTTP_401_UNAUTHORIZED)
         except User.DoesNotExist:
             return Response({'error': 'Foydalanuvchi topilmadi'}, status=status.HTTP_401_UNAUTHORIZED)
         except Exception as e:
-            print(f"Login error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception('Kirishda xatolik')
             return Response({'error': f'Kirishda xatolik: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @ratelimit.rate_limit('google_auth')
     def google_auth(self, request):
         """Login or register user with Google OAuth JWT credential"""
         token = request.data.get('token')
@@ -300,145 +414,42 @@ EcoCash Jamoasi
             return Response({'error': 'Google token talab qilinadi'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Google JWT credential'ni verify qilish va user ma'lumotlarini olish
-            # JWT credential Google Identity Services'dan keladi
-            # Avval JWT'ni decode qilamiz va keyin Google API'dan verify qilamiz
-            
-            # JWT'ni decode qilish (payload olish uchun)
-            import base64
-            import json
+            # JWT format: header.payload.signature
+            if not isinstance(token, str) or len(token.split('.')) != 3:
+                return Response({'error': 'Noto\'g\'ri Google token formati'}, status=status.HTTP_400_BAD_REQUEST)
             
+            # Imzoni Google sertifikatlari bilan lokal tekshirish (sertifikatlar keshlanadi)
             try:
-                # JWT format: header.payload.signature
-                parts = token.split('.')
-                if len(parts) != 3:
-                    return Response({'error': 'Noto\'g\'ri Google token formati'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Payload'ni decode qilish
-                payload = parts[1]
-                # Base64URL decode
-                payload += '=' * (4 - len(payload) % 4)  # Padding qo'shish
-                decoded_payload = base64.urlsafe_b64decode(payload)
-                payload_data = json.loads(decoded_payload)
-                
-                # JWT'ni Google API'dan verify qilish
-                # Google Identity Services JWT'ni verify qilish uchun Google API'dan foydalanish kerak
-                verify_url = 'https://oauth2.googleapis.com/tokeninfo'
-                verify_response = requests.get(verify_url, params={'id_token': token}, timeout=10)
-                
-                if verify_response.status_code != 200:
-                    # Agar verify qilishda muammo bo'lsa, payload'dan ma'lumotlarni olish
-                    # (Development uchun, production'da verify qilish kerak)
-                    print(f"⚠️ Google JWT verify qilishda muammo: {verify_response.status_code}")
-                    # Payload'dan ma'lumotlarni olish
-                    google_email = payload_data.get('email', '').lower()
-                    google_first_name = payload_data.get('given_name', '')
-                    google_last_name = payload_data.get('family_name', '')
-                    google_name = payload_data.get('name', '')
-                else:
-                    # Verify qilingan ma'lumotlar
-                    verified_data = verify_response.json()
-                    google_email = verified_data.get('email', '').lower()
-                    google_first_name = verified_data.get('given_name', '')
-                    google_last_name = verified_data.get('family_name', '')
-                    google_name = verified_data.get('name', '')
-                
-                # Agar payload'dan ma'lumotlar bo'lmasa, fallback
-                if not google_email:
-                    google_email = payload_data.get('email', '').lower()
-                if not google_first_name:
-                    google_first_name = payload_data.get('given_name', '')
-                if not google_last_name:
-                    google_last_name = payload_data.get('family_name', '')
-                if not google_name:
-                    google_name = payload_data.get('name', '')
-                
-            except Exception as decode_error:
-                print(f"❌ JWT decode xatosi: {decode_error}")
-                # Fallback: OAuth2 access token sifatida ishlatish
-                google_user_info_url = 'https://www.googleapis.com/oauth2/v2/userinfo'
-                headers = {'Authorization': f'Bearer {token}'}
-                response = requests.get(google_user_info_url, headers=headers, timeout=10)
-                
-                if response.status_code != 200:
-                    return Response({'error': 'Google token noto\'g\'ri yoki muddati tugagan'}, status=status.HTTP_401_UNAUTHORIZED)
-                
-                google_data = response.json()
-                google_email = google_data.get('email', '').lower()
-                google_first_name = google_data.get('given_name', '')
-                google_last_name = google_data.get('family_name', '')
-                google_name = google_data.get('name', '')
-            
-            if not google_email:
-                return Response({'error': 'Google email topilmadi'}, status=status.HTTP_400_BAD_REQUEST)
+                payload_data = google_tokens.verify_id_token(token)
+            except ValueError as verify_error:
+                log.warning('Google token tekshiruvi: %s', verify_error)
+                return Response({'error': 'Google token noto\'g\'ri yoki muddati tugagan'}, status=status.HTTP_401_UNAUTHORIZED)
             
-            # User mavjudligini tekshirish
-            try:
-                user = User.objects.get(email=google_email, is_deleted=False)
-                # User mavjud - login qilish
-                if user.is_deleted:
-                    return Response({'error': 'Bu hisob o\'chirilgan'}, status=status.HTTP_401_UNAUTHORIZED)
-                
-                # Ism va familyani yangilash (agar o'zgarganda)
-                if google_first_name and user.first_name != google_first_name:
-                    user.first_name = google_first_name
-                if google_last_name and user.last_name != google_last_name:
-                    user.last_name = google_last_name
-                user.save()
-                
-                from django.contrib.auth import login
-                login(request, user)
-                return Response(UserSerializer(user).data, status=status.HTTP_200_OK)
-            except User.DoesNotExist:
-                # User mavjud emas - yangi user yaratish
-                # Username yaratish (email'dan)
-                base_username = google_email.split('@')[0]
-                username = base_username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}{counter}"
-                    counter += 1
-                    if counter > 1000:
-                        return Response({'error': 'Username yaratishda muammo'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Yangi user yaratish
-                user = User.objects.create_user(
-                    username=username,
-                    email=google_email,
-                    first_name=google_first_name or google_name.split()[0] if google_name else username,
-                    last_name=google_last_name or ' '.join(google_name.split()[1:]) if google_name and len(google_name.split()) > 1 else '',
-                    password=None  # Google orqali kirganlar uchun parol kerak emas
-                )
-                user.set_unusable_password()  # Parolni o'chirib qo'yish
-                user.save()
-                
-                # Welcome bonus transaction
-                Transaction.objects.create(
-                    user=user,
-                    amount=1000,
-                    type='earn',
-                    description='Xush kelibsiz bonus (Google)',
-                    provider='EcoCash System'
-                )
-                
-                from django.contrib.auth import login
-                login(request, user)
-                return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+            return Response(*google_login(request, payload_data))
         except requests.RequestException as e:
-            print(f"Google API error: {str(e)}")
+            log.error('Google API xatosi: %s', e)
             return Response({'error': 'Google API bilan bog\'lanishda xatolik'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
-            print(f"Google auth error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception('Google auth xatosi')
             return Response({'error': f'Google orqali kirishda xatolik: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def token_refresh(self, request):
+        """Exchange a refresh token for a new access/refresh pair (AUTH_MODE=token)"""
+        refresh = request.data.get('refresh')
+        if not refresh or not isinstance(refresh, str):
+            return Response({'error': 'Refresh token talab qilinadi'}, status=status.HTTP_400_BAD_REQUEST)
+        tokens = authentication.refresh_tokens(refresh)
+        if tokens is None:
+            return Response({'error': 'Refresh token yaroqsiz yoki muddati o\'tgan'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(tokens)
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
         """Get current user"""
         if request.user.is_deleted:
             return Response({'error': 'Bu hisob o\'chirilgan'}, status=status.HTTP_401_UNAUTHORIZED)
-        return Response(UserSerializer(request.user).data)
+        return Response(serialize_user(request.user))
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def check_email(self, request):
@@ -458,10 +469,13 @@ EcoCash Jamoasi
     def logout(self, request):
         """Logout user"""
         from django.contrib.auth import logout
+        # Shu login (qurilma) tokenlari ham bekor qilinadi, boshqa qurilmalarniki qoladi
+        authentication.revoke_tokens(request)
         logout(request)
         return Response({'message': 'Logged out successfully'})
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])  # Temporarily AllowAny
+    @idempotency.idempotent('update_stats')
     def update_stats(self, request, pk=None):
         """Update user stats after recycling"""
         from decimal import Decimal, InvalidOperation
@@ -488,32 +502,82 @@ EcoCash Jamoasi
             if added_balance < 0 or added_kg < 0:
                 return Response({'error': 'Manfiy qiymatlar qabul qilinmaydi'}, status=status.HTTP_400_BAD_REQUEST)
 
-            with transaction.atomic():
-                user.balance += added_balance
-                user.total_recycled_kg += added_kg
+            # Atomik UPDATE (F() ifodalari) - parallel so'rovlarda yo'qotishlarsiz
+            balance.credit(
+                user,
+                added_balance,
+                added_kg,
+                description=f'Qayta ishlash: {added_kg}kg',
+                provider='AI Scanner'
+            )
 
-                # Level up logic
-                if user.total_recycled_kg > user.level * 50:
-                    user.level += 1
+            return Response(serialize_user(user))
+        except Exception as e:
+            log.exception('update_stats xatosi', extra={'user_id': pk})
+            return Response({'error': f'Server xatosi: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsStaffOrKiosk])
+    @ratelimit.rate_limit('bulk_update_stats')
+    def bulk_update_stats(self, request):
+        """Apply a batch of recycling events (scanner kiosks) in one transaction"""
+        from decimal import InvalidOperation
 
-                user.save()
+        events = request.data.get('events')
+        if not isinstance(events, list) or not events:
+            return Response({'error': 'events ro\'yxati talab qilinadi'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > settings.BULK_STATS_MAX_EVENTS:
+            return Response({
+                'error': f'Bitta so\'rovda ko\'pi bilan {settings.BULK_STATS_MAX_EVENTS} ta hodisa yuborish mumkin'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-                # Create transaction record
-                Transaction.objects.create(
-                    user=user,
-                    amount=added_balance,
-                    type='earn',
-                    description=f'Qayta ishlash: {added_kg}kg',
-                    provider='AI Scanner'
-                )
+        # Bir marta o'tib tekshirish; noto'g'ri hodisalar o'tkazib yuboriladi
+        results = [None] * len(events)
+        valid = []
+        for index, event in enumerate(events):
+            try:
+                user_id = int(event['user_id'])
+                # DB'dagi kabi 2 xonagacha yaxlitlash
+                added_balance = Decimal(str(event.get('added_balance', 0))).quantize(Decimal('0.01'))
+                added_kg = Decimal(str(event.get('added_kg', 0))).quantize(Decimal('0.01'))
+                if added_balance.is_nan() or added_kg.is_nan():
+                    raise ValueError
+            except (KeyError, InvalidOperation, ValueError, TypeError, AttributeError):
+                results[index] = {'index': index, 'success': False, 'error': 'Noto\'g\'ri qiymatlar yuborildi'}
+                continue
+            if added_balance < 0 or added_kg < 0:
+                results[index] = {'index': index, 'success': False, 'error': 'Manfiy qiymatlar qabul qilinmaydi'}
+                continue
+            valid.append((index, (user_id, added_balance, added_kg)))
 
-            return Response(UserSerializer(user).data)
+        try:
+            applied = balance.credit_batch([item for _, item in valid]) if valid else []
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            log.exception('bulk_update_stats xatosi', extra={'events': len(events)})
             return Response({'error': f'Server xatosi: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        for (index, (user_id, _, _)), values in zip(valid, applied):
+            if values is None:
+                results[index] = {'index': index, 'user_id': user_id, 'success': False, 'error': 'Foydalanuvchi topilmadi'}
+                continue
+            new_balance, total_kg, level = values
+            results[index] = {
+                'index': index,
+                'user_id': user_id,
+                'success': True,
+                'balance': str(new_balance),
+                'total_recycled_kg': str(total_kg),
+                'level': level,
+            }
+
+        return Response({
+            'processed': sum(1 for r in results if r['success']),
+            'failed': sum(1 for r in results if not r['success']),
+            'results': results,
+        })
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])  # Temporarily AllowAny
+    @idempotency.idempotent('pay_utility')  # takroriylar rate limit tokenini sarflamaydi
+    @ratelimit.rate_limit('pay_utility')
     def pay_utility(self, request, pk=None):
         """Pay utility bill with fraud detection"""
         try:
@@ -523,7 +587,7 @@ EcoCash Jamoasi
             # First try authenticated user
             if request.user.is_authenticated:
                 user = request.user
-                print(f"✅ Using authenticated user: {user.id}")
+                log.info('To\'lov: sessiya foydalanuvchisi', extra={'sampled': True, 'user_id': user.id})
             # Then try pk parameter
             elif pk:
                 try:
@@ -533,25 +597,25 @@ EcoCash Jamoasi
                     # Check if pk looks like a valid database ID (not a timestamp)
                     if pk_int and pk_int < 1000000 and pk_int > 0:
                         user = User.objects.get(pk=pk_int, is_deleted=False)
-                        print(f"✅ Found user by pk: {pk_int}")
+                        log.info('To\'lov: foydalanuvchi pk bo\'yicha', extra={'sampled': True, 'user_id': pk_int})
                     else:
-                        print(f"⚠️ Invalid pk format (looks like timestamp?): {pk}")
+                        log.warning('To\'lov: pk noto\'g\'ri (timestamp?)', extra={'pk': pk})
                         # Try to find by username or email as fallback
                         try:
                             user = User.objects.filter(username=str(pk), is_deleted=False).first() or \
                                    User.objects.filter(email=str(pk), is_deleted=False).first()
                             if user:
-                                print(f"✅ Found user by username/email: {pk}")
-                        except Exception as e2:
-                            print(f"❌ Could not find user: {e2}")
+                                log.info('To\'lov: foydalanuvchi username/email bo\'yicha', extra={'pk': pk})
+                        except Exception:
+                            log.exception('To\'lov: foydalanuvchini qidirishda xatolik', extra={'pk': pk})
                 except (User.DoesNotExist, ValueError, TypeError) as e:
-                    print(f"❌ User not found with pk={pk}: {e}")
+                    log.warning('To\'lov: pk=%s bo\'yicha foydalanuvchi yo\'q: %s', pk, e)
                     # Try to find by username or email
                     try:
                         user = User.objects.filter(username=str(pk), is_deleted=False).first() or \
                                User.objects.filter(email=str(pk), is_deleted=False).first()
                         if user:
-                            print(f"✅ Found user by username/email (fallback): {pk}")
+                            log.info('To\'lov: foydalanuvchi username/email bo\'yicha', extra={'pk': pk})
                     except:
                         pass
             
@@ -574,43 +638,17 @@ EcoCash Jamoasi
                     'success': False
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Fraud detection logic
-            fraud_detected = False
-            fraud_reasons = []
-            
-            # Check 1: Invalid account number format (should be numeric and reasonable length)
-            if account_number:
-                if not account_number.isdigit():
-                    fraud_detected = True
-                    fraud_reasons.append('Hisob raqami noto\'g\'ri formatda')
-                elif len(account_number) < 6 or len(account_number) > 15:
-                    fraud_detected = True
-                    fraud_reasons.append('Hisob raqami uzunligi noto\'g\'ri')
-            
-            # Check 2: Suspicious amount (too high or negative)
-            if amount <= Decimal('0'):
-                fraud_detected = True
-                fraud_reasons.append('Summa noto\'g\'ri')
-            elif amount > Decimal('10000000'):  # 10 million UZS threshold
-                fraud_detected = True
-                fraud_reasons.append('Juda katta summa')
-            
-            # Check 3: Balance check
+            # Balance check (firibgarlik emas - alohida xabar)
             if user.balance < amount:
                 return Response({
                     'error': "Mablag' yetarli emas!",
                     'success': False
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Check 4: Multiple rapid payments (check last 5 minutes)
-            recent_payments = Transaction.objects.filter(
-                user=user,
-                type='spend',
-                date__gte=timezone.now() - timezone.timedelta(minutes=5)
-            ).count()
-            if recent_payments >= 5:
-                fraud_detected = True
-                fraud_reasons.append('Juda ko\'p tez to\'lovlar')
+            # Fraud detection: qoidalar api/fraud.py da, arzonlari birinchi
+            fraud_check = fraud.engine.evaluate(user.pk, provider, account_number, amount)
+            fraud_detected = fraud_check.blocked
+            fraud_reasons = fraud_check.reasons
         
             # If fraud detected, return error
             if fraud_detected:
@@ -628,41 +666,36 @@ EcoCash Jamoasi
             
             # Process payment
             try:
-                with transaction.atomic():
-                    user.balance -= amount
-                    user.save()
-                    
-                    Transaction.objects.create(
-                        user=user,
-                        amount=-float(amount),  # Transaction model expects float
-                        type='spend',
-                        description=f'{provider} to\'lovi (Hisob: {account_number})',
-                        provider=provider
-                    )
-                
-                # Refresh user from database to get updated data
-                user.refresh_from_db()
+                # Balans yetarli bo'lsagina bitta UPDATE bilan yechiladi
+                balance.debit(
+                    user,
+                    amount,
+                    description=f'{provider} to\'lovi (Hisob: {account_number})',
+                    provider=provider
+                )
+                counters.recent_payments.hit(user.pk)
                 
                 # Serialize user data
-                user_data = UserSerializer(user).data
+                user_data = serialize_user(user)
                 
                 return Response({
                     **user_data,
                     'success': True,
                     'message': 'To\'lov muvaffaqiyatli amalga oshirildi!'
                 })
+            except balance.InsufficientFunds:
+                return Response({
+                    'error': "Mablag' yetarli emas!",
+                    'success': False
+                }, status=status.HTTP_400_BAD_REQUEST)
             except Exception as db_error:
-                print(f"❌ Database error during payment: {db_error}")
-                import traceback
-                traceback.print_exc()
+                log.exception('To\'lovda bazaviy xatolik', extra={'user_id': user.pk})
                 return Response({
                     'error': f'To\'lov amalga oshirishda xatolik: {str(db_error)}',
                     'success': False
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
-            print(f"❌ Unexpected error in pay_utility: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception('pay_utility kutilmagan xatolik')
             return Response({
                 'error': f'Xatolik yuz berdi: {str(e)}',
                 'success': False
@@ -682,10 +715,13 @@ EcoCash Jamoasi
             return Response({'error': 'Foydalanuvchi talab qilinadi'}, status=status.HTTP_401_UNAUTHORIZED)
         
         # Soft delete - mark as deleted but keep in database
+        was_deleted = user.is_deleted
         user.is_deleted = True
         user.deleted_at = timezone.now()
         user.is_active = False
         user.save()
+        if not was_deleted:
+            stats.record_account_deleted()
         
         # Logout user
         from django.contrib.auth import logout
@@ -697,17 +733,116 @@ EcoCash Jamoasi
 class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TransactionCursorPagination
     
     def get_queryset(self):
         return Transaction.objects.filter(user=self.request.user)
+    
+    @action(detail=False, methods=['get'], renderer_classes=[statements.CSVRenderer, statements.NDJSONRenderer])
+    def export(self, request):
+        """Stream the full statement: ?format=csv|ndjson&from=&to=&gzip=1 (staff: &user=<id>|all)"""
+        queryset = self.get_queryset()
+        user_param = request.query_params.get('user')
+        if user_param:
+            if not request.user.is_staff:
+                return Response({'error': 'Faqat xodimlar boshqa foydalanuvchini eksport qila oladi'},
+                                status=status.HTTP_403_FORBIDDEN)
+            if user_param == 'all':
+                queryset = Transaction.objects.all()
+            elif user_param.isdigit():
+                queryset = Transaction.objects.filter(user_id=int(user_param))
+            else:
+                return Response({'error': 'user noto\'g\'ri'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            filters = statements.date_filters(request.query_params.get('from'), request.query_params.get('to'))
+        except ValueError:
+            return Response({'error': 'Sana noto\'g\'ri formatda (YYYY-MM-DD yoki ISO 8601)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return statements.stream(
+            queryset.filter(**filters).order_by('date', 'id'),
+            request.accepted_renderer.format,
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+        )
+    
+    @action(detail=False, methods=['get'])
+    def activity(self, request):
+        """Dashboard chart: ?period=day|week|month&from=YYYY-MM-DD&to=YYYY-MM-DD (staff: &user=<id>)"""
+        from django.utils.dateparse import parse_date
+        
+        user_id = request.user.pk
+        user_param = request.query_params.get('user')
+        if user_param:
+            if not request.user.is_staff:
+                return Response({'error': 'Faqat xodimlar boshqa foydalanuvchini ko\'ra oladi'},
+                                status=status.HTTP_403_FORBIDDEN)
+            if not user_param.isdigit():
+                return Response({'error': 'user noto\'g\'ri'}, status=status.HTTP_400_BAD_REQUEST)
+            user_id = int(user_param)
+        
+        period = request.query_params.get('period', 'day')
+        try:
+            bounds = []
+            for name in ('from', 'to'):
+                value = request.query_params.get(name)
+                bounds.append(parse_date(value) if value else None)
+                if value and bounds[-1] is None:
+                    raise ValueError()
+        except ValueError:
+            return Response({'error': 'Sana noto\'g\'ri formatda (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            points = activity.series(user_id, period, *bounds)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'period': period, 'points': points})
 
 
 class GlobalStatsViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = GlobalStats.objects.all()
     serializer_class = GlobalStatsSerializer
     permission_classes = [AllowAny]
+    authentication_classes = []  # Ochiq endpoint - sessiya so'rovi kerak emas
     
     def get_queryset(self):
-        # Return singleton instance or create default
-        stats, created = GlobalStats.objects.get_or_create(pk=1)
-        return GlobalStats.objects.filter(pk=stats.pk)
+        return GlobalStats.objects.filter(pk=stats.STATS_PK)
+    
+    def list(self, request, *args, **kwargs):
+        # Kesh orqali - odatda DB so'rovisiz
+        return Response([stats.get_stats()])
+    
+    def retrieve(self, request, *args, **kwargs):
+        return Response(stats.get_stats())
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    permission_classes = [AllowAny]
+    
+    def list(self, request):
+        """Top recyclers and my rank: ?scope=global|region|district&region=&district=&limit=10&user="""
+        scope = request.query_params.get('scope', 'global')
+        if scope not in ('global', 'region', 'district'):
+            return Response({'error': 'scope: global, region yoki district'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'limit butun son bo\'lishi kerak'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user if request.user.is_authenticated else None
+        region = request.query_params.get('region') or (user.region if user else None)
+        district = request.query_params.get('district') or (user.district if user else None)
+        keys = leaderboard.scopes(region, district)
+        if scope == 'region' and len(keys) < 2:
+            return Response({'error': 'Viloyat (region) ko\'rsatilmagan'}, status=status.HTTP_400_BAD_REQUEST)
+        if scope == 'district' and len(keys) < 3:
+            return Response({'error': 'Viloyat va tuman (district) ko\'rsatilmagan'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # "Mening o'rnim": kirgan foydalanuvchi yoki ?user=<id> (update_stats kabi)
+        user_id = user.pk if user else request.query_params.get('user')
+        if user_id is not None and not str(user_id).isdigit():
+            return Response({'error': 'user noto\'g\'ri'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        key = keys[('global', 'region', 'district').index(scope)]
+        data = leaderboard.board(key, limit, int(user_id) if user_id is not None else None)
+        data.update(scope=scope, region=(region or '').strip() or None, district=(district or '').strip() or None)
+        return Response(data)
@@ -0,0 +1,7 @@
+"""
+Local benchmarking helpers: stand-in network services, an in-process app
+server and load generator, and latency stats.
+
+Used by the `bench_*` management commands; nothing here is imported by the
+application at runtime.
+"""
@@ -0,0 +1,9 @@
+from django.test import Client
+
+
+def make_client():
+    """
+    Test client that passes ALLOWED_HOSTS and, in production settings,
+    the HTTPS redirect (SECURE_PROXY_SSL_HEADER).
+    """
+    return Client(SERVER_NAME='localhost', HTTP_X_FORWARDED_PROTO='https')
@@ -0,0 +1,66 @@
+"""
+Throwaway database for the bench_* commands.
+
+Benchmarks seed, ANALYZE and delete rows in bulk, so they never run against
+the configured database: `BenchCommand` creates the test database
+(`test_<name>`, or bench.sqlite3 next to db.sqlite3), runs the benchmark
+against it and drops it afterwards (`--keep` keeps it for a later
+`--reuse`). Servers and commands a benchmark starts in subprocesses inherit
+DATABASE_URL pointing at the same database.
+"""
+import os
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+# Ichki jarayonlar (bench_auth --mode ...) allaqachon bench bazasida ishlaydi
+ENV_FLAG = 'BENCH_DATABASE'
+
+
+def _url(settings_dict):
+    """DATABASE_URL for a subprocess (ecocash_backend.settings reads it with dj_database_url)."""
+    if settings_dict['ENGINE'].endswith('sqlite3'):
+        return f'sqlite:///{os.path.abspath(settings_dict["NAME"])}'
+    credentials = quote(settings_dict['USER'] or '', safe='')
+    if settings_dict['PASSWORD']:
+        credentials += ':' + quote(settings_dict['PASSWORD'], safe='')
+    host = f'{settings_dict["HOST"] or "localhost"}:{settings_dict["PORT"] or 5432}'
+    return f'postgres://{credentials}@{host}/{quote(settings_dict["NAME"], safe="")}'
+
+
+@contextmanager
+def bench_database(keep=False):
+    """Run the block against a freshly migrated test database instead of the configured one."""
+    if os.environ.get(ENV_FLAG):
+        yield
+        return
+
+    default = connections['default'].settings_dict
+    if default['ENGINE'].endswith('sqlite3') and not default['TEST'].get('NAME'):
+        # Xotiradagi SQLite boshqa jarayonlarga ko'rinmaydi - fayl
+        default['TEST']['NAME'] = str(settings.BASE_DIR / 'bench.sqlite3')
+
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=True, serialized_aliases=set())
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', ENV_FLAG)}
+    os.environ.update({'DATABASE_URL': _url(default), ENV_FLAG: '1'})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        teardown_databases(old_config, verbosity=0, keepdb=keep)
+
+
+class BenchCommand(BaseCommand):
+    """BaseCommand for benchmarks: `handle()` runs inside `bench_database()`."""
+
+    def execute(self, *args, **options):
+        with bench_database(keep=options.get('keep', False)):
+            return super().execute(*args, **options)
@@ -0,0 +1,100 @@
+"""
+Stand-in for Google's ID-token infrastructure.
+
+Generates a local RSA key pair, serves its public key in the
+/oauth2/v1/certs format with a Cache-Control max-age, and signs ID tokens
+with the private key so `api.google_tokens` can verify them end to end.
+`delay` is slept per certificate request to stand in for the round trip to
+Google; `connections` counts TCP connections (keep-alive reuse).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rsa
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        super().handle()
+
+    def _send_json(self, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if self.path.startswith('/oauth2/v1/certs'):
+            time.sleep(server.delay)
+            self._send_json(server.certs, {'Cache-Control': f'public, max-age={server.max_age}'})
+        else:
+            self.send_error(404)
+
+
+class StandInGoogleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, max_age=3600, client_id='bench-client-id', delay=0.0):
+        super().__init__((host, port), _Handler)
+        self.max_age = max_age
+        self.client_id = client_id
+        self.delay = delay
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.certs = {}
+        self._signer = None
+        self.rotate_key()
+
+    @property
+    def certs_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/oauth2/v1/certs'
+
+    def rotate_key(self, bits=2048):
+        """Replace the signing key; the certs endpoint serves only the new one."""
+        public_key, private_key = rsa.newkeys(bits)
+        kid = f'bench-{int(time.time() * 1000)}'
+        self.certs = {kid: public_key.save_pkcs1().decode()}
+        self._signer = crypt.RSASigner.from_string(private_key.save_pkcs1().decode(), key_id=kid)
+
+    def id_token(self, email, given_name='Bench', family_name='User', lifetime=3600):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': self.client_id,
+            'sub': str(abs(hash(email))),
+            'email': email,
+            'email_verified': True,
+            'given_name': given_name,
+            'family_name': family_name,
+            'name': f'{given_name} {family_name}',
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        return google_jwt.encode(self._signer, payload).decode()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
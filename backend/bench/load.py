@@ -0,0 +1,230 @@
+"""
+Concurrent HTTP load generator for the EcoCash API.
+
+Every virtual client is a seeded user with its own HTTP session, logged in
+once before the clock starts (session cookie + CSRF token, or a Bearer token
+in AUTH_MODE=token). Until the deadline each client picks an operation from
+a weighted mix and records latency and status per request label.
+"""
+import itertools
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+from api.models import EmailVerification
+
+from .server import OP_HEADER
+from .stats import summarize
+
+PROVIDERS = ['Elektr', 'Gaz', 'Suv', 'Internet']
+
+# Operatsiya og'irliklari (nisbiy)
+MIXES = {
+    'default': {'me': 25, 'transactions': 20, 'stats': 15, 'update_stats': 15, 'pay_utility': 10,
+                'login': 8, 'register': 4, 'signup_email': 2, 'google_auth': 1},
+    'read_heavy': {'me': 35, 'transactions': 30, 'stats': 30, 'update_stats': 4, 'pay_utility': 1},
+    'write_heavy': {'me': 10, 'transactions': 10, 'stats': 5, 'update_stats': 50, 'pay_utility': 25},
+    'signup': {'register': 40, 'signup_email': 25, 'google_auth': 25, 'login': 10},
+}
+
+_serial = itertools.count()
+
+
+def parse_mix(spec):
+    """A MIXES name or an explicit 'op=weight,op=weight' list."""
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Noma\'lum operatsiya: {name} ({", ".join(OPERATIONS)})')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, label, latency_ms, status):
+        with self.lock:
+            self.latencies[label].append(latency_ms)
+            self.statuses[label][status] += 1
+
+
+class VirtualClient:
+    def __init__(self, base_url, user, password, tag_prefix, recorder, google=None):
+        self.base_url = base_url
+        self.user_id = user.pk
+        self.username = user.username
+        self.password = password
+        self.tag_prefix = tag_prefix
+        self.recorder = recorder
+        self.google = google
+        self.session = requests.Session()
+        self.access = None
+
+    def request(self, label, method, path, payload=None, session=None, record=True):
+        session = session or self.session
+        headers = {OP_HEADER: label}
+        if session is self.session:
+            if self.access:
+                headers['Authorization'] = f'Bearer {self.access}'
+            elif method != 'GET' and session.cookies.get('csrftoken'):
+                headers['X-CSRFToken'] = session.cookies.get('csrftoken')
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, json=payload, headers=headers, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0  # ulanish xatosi
+        if record:
+            self.recorder.add(label, (time.perf_counter() - started) * 1000, status)
+        return response
+
+    def login(self, record=True):
+        response = self.request('login', 'POST', '/api/users/login/',
+                                {'username': self.username, 'password': self.password}, record=record)
+        if response is not None and response.ok:
+            self.access = response.json().get('access')
+        return response
+
+
+def _me(client):
+    client.request('me', 'GET', '/api/users/me/')
+
+
+def _transactions(client):
+    client.request('transactions', 'GET', '/api/transactions/')
+
+
+def _stats(client):
+    client.request('stats', 'GET', '/api/stats/')
+
+
+def _update_stats(client):
+    client.request('update_stats', 'POST', f'/api/users/{client.user_id}/update_stats/', {
+        'added_balance': random.randint(100, 5000),
+        'added_kg': round(random.uniform(0.1, 5), 2),
+    })
+
+
+def _pay_utility(client):
+    client.request('pay_utility', 'POST', f'/api/users/{client.user_id}/pay_utility/', {
+        'provider': random.choice(PROVIDERS),
+        'account_number': str(random.randint(10 ** 8, 10 ** 9 - 1)),
+        'amount': random.randint(1000, 20000),
+    })
+
+
+def _login(client):
+    client.login()
+
+
+def _register(client):
+    username = f'{client.tag_prefix}reg-{next(_serial)}-{random.randint(0, 10 ** 6)}'
+    client.request('register', 'POST', '/api/users/register/', {
+        'username': username,
+        'email': f'{username}@seed.local',
+        'password': 'bench-password',
+        'password_confirm': 'bench-password',
+    }, session=requests.Session())
+
+
+def _signup_email(client):
+    session = requests.Session()
+    email = f'{client.tag_prefix}mail-{next(_serial)}-{random.randint(0, 10 ** 6)}@seed.local'
+    response = client.request('send_verification_code', 'POST', '/api/users/send_verification_code/',
+                              {'email': email}, session=session)
+    if response is None or not response.ok:
+        return
+    # Kod foydalanuvchi pochtasiga boradi - bu yerda to'g'ridan-to'g'ri bazadan
+    code = EmailVerification.objects.filter(email=email).values_list('code', flat=True).first()
+    client.request('verify_code', 'POST', '/api/users/verify_code/',
+                   {'email': email, 'code': code, 'password': 'bench-password'}, session=session)
+
+
+def _google_auth(client):
+    email = f'{client.tag_prefix}g-{next(_serial)}-{random.randint(0, 10 ** 6)}@gmail.com'
+    client.request('google_auth', 'POST', '/api/users/google_auth/',
+                   {'token': client.google.id_token(email)}, session=requests.Session())
+
+
+OPERATIONS = {
+    'me': _me,
+    'transactions': _transactions,
+    'stats': _stats,
+    'update_stats': _update_stats,
+    'pay_utility': _pay_utility,
+    'login': _login,
+    'register': _register,
+    'signup_email': _signup_email,
+    'google_auth': _google_auth,
+}
+
+
+def run(clients, mix, duration):
+    """Drive `clients` concurrently for `duration` seconds; returns elapsed seconds."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = None
+
+    def drive(client):
+        while time.monotonic() < deadline:
+            OPERATIONS[random.choices(names, weights)[0]](client)
+
+    threads = [threading.Thread(target=drive, args=(client,), daemon=True) for client in clients]
+    started = time.monotonic()
+    deadline = started + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started
+
+
+def report(recorder, server, elapsed):
+    """Per-label throughput, latency percentiles, statuses and queries per request."""
+    operations = {}
+    for label in sorted(recorder.latencies):
+        latencies = recorder.latencies[label]
+        statuses = recorder.statuses[label]
+        served = server.requests.get(label, 0)
+        operations[label] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'latency': summarize(latencies),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'errors': sum(count for code, count in statuses.items() if code == 0 or code >= 500),
+            'queries_per_request': round(server.queries.get(label, 0) / served, 2) if served else None,
+        }
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 2),
+        'errors': sum(op['errors'] for op in operations.values()),
+        'operations': operations,
+    }
+
+
+def compare(previous, current):
+    """p50/p95/throughput change per label against an earlier run's JSON."""
+    changes = {}
+    for label, now in current['operations'].items():
+        before = previous.get('operations', {}).get(label)
+        if not before:
+            continue
+        changes[label] = {
+            'p50_ms': [before['latency']['p50_ms'], now['latency']['p50_ms']],
+            'p95_ms': [before['latency']['p95_ms'], now['latency']['p95_ms']],
+            'throughput_rps': [before['throughput_rps'], now['throughput_rps']],
+            'queries_per_request': [before['queries_per_request'], now['queries_per_request']],
+        }
+    return changes
@@ -0,0 +1,88 @@
+"""
+Bulk data seeding for benchmarks and query-plan checks.
+
+Seeded users are named `seed-<tag>-<n>` so a run can be cleaned up with
+`cleanup(tag)` without touching real accounts.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from api.models import Transaction, User
+
+PROVIDERS = ['Elektr', 'Gaz', 'Suv', 'Internet', 'AI Scanner', 'EcoCash System']
+
+
+def prefix(tag):
+    return f'seed-{tag}-'
+
+
+@contextmanager
+def manual_dates():
+    """Let bulk_create keep explicit Transaction.date values (auto_now_add)."""
+    field = Transaction._meta.get_field('date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_users(count, tag='bench', batch_size=1000, fields=None):
+    """`fields(i)` may return extra User attributes for the i-th user."""
+    start = User.objects.filter(username__startswith=prefix(tag)).count()
+    users = [
+        User(
+            username=f'{prefix(tag)}{i}',
+            email=f'{prefix(tag)}{i}@seed.local',
+            password='!',
+            balance=Decimal('1000000.00'),
+            **(fields(i) if fields else {}),
+        )
+        for i in range(start, start + count)
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=prefix(tag)).order_by('pk'))
+
+
+def _rows(user_ids, per_user, days):
+    now = timezone.now()
+    span = days * 24 * 3600
+    for user_id in user_ids:
+        for _ in range(per_user):
+            spend = random.random() < 0.3
+            amount = Decimal(random.randint(100, 50000))
+            yield Transaction(
+                user_id=user_id,
+                date=now - timedelta(seconds=random.randint(0, span)),
+                amount=-amount if spend else amount,
+                type='spend' if spend else 'earn',
+                description='seed' if spend else f'Qayta ishlash: {amount / 1000:.2f}kg',
+                provider=random.choice(PROVIDERS),
+            )
+
+
+def seed_transactions(user_ids, per_user, days=365, batch_size=5000):
+    """Insert `per_user` transactions for every user id; returns the row count."""
+    total = 0
+    batch = []
+    with manual_dates():
+        for row in _rows(user_ids, per_user, days):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                Transaction.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            Transaction.objects.bulk_create(batch)
+            total += len(batch)
+    return total
+
+
+def cleanup(tag='bench'):
+    users = User.objects.filter(username__startswith=prefix(tag))
+    Transaction.objects.filter(user__in=users).delete()
+    users.delete()
@@ -0,0 +1,81 @@
+"""
+In-process HTTP server for load tests.
+
+Serves the project's WSGI application from a fixed pool of worker threads
+(like gunicorn's gthread workers), so database connections are kept per
+thread according to CONN_MAX_AGE instead of being opened for every request.
+SQL statements are counted per request and grouped by the client's
+X-Bench-Op label.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+OP_HEADER = 'X-Bench-Op'
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class AppServer(WSGIServer):
+    request_queue_size = 256
+
+    def __init__(self, host='127.0.0.1', port=0, threads=8):
+        super().__init__((host, port), _QuietHandler)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='bench-app')
+        self.lock = threading.Lock()
+        self.queries = Counter()
+        self.requests = Counter()
+        self.set_app(self._counting(get_wsgi_application()))
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def _counting(self, app):
+        label_key = 'HTTP_' + OP_HEADER.upper().replace('-', '_')
+
+        def counted(environ, start_response):
+            count = 0
+
+            def count_query(execute, sql, params, many, context):
+                nonlocal count
+                count += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count_query):
+                response = app(environ, start_response)
+            label = environ.get(label_key) or environ['PATH_INFO']
+            with self.lock:
+                self.queries[label] += count
+                self.requests[label] += 1
+            return response
+
+        return counted
+
+    # socketserver.ThreadingMixIn kabi, lekin cheklangan thread pool bilan
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.pool.shutdown(wait=True)
+        self.server_close()
@@ -6,6 +6,7 @@ Production-ready settings for Railway deployment.
 from pathlib import Path
 import os
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,15 +45,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',  # Birinchi - butun so'rov vaqtini o'lchaydi
+    'api.middleware.RequestIdMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files for production
+    'api.middleware.StaticFilesMiddleware',  # Static files for production (WhiteNoise, ASGI'da ham async)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaMiddleware',  # Oxirgi - view aniqlangach o'qishlarni replikaga yo'naltiradi
 ]
 
 ROOT_URLCONF = 'ecocash_backend.urls'
@@ -76,6 +80,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ecocash_backend.wsgi.application'
 
 
+# ASGI (uvicorn/daphne) ostida ishlatilganda True: google_auth va send_verification_code
+# o'rniga async versiyalari (api/async_views.py) ulanadi
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 # Database Configuration
 # Railway automatically provides DATABASE_URL for PostgreSQL
 DATABASE_URL = config('DATABASE_URL', default='')
@@ -85,7 +93,9 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            # ASGI'da har so'rov o'z thread'ida - doimiy ulanishlar qayta ishlatilmaydi,
+            # ulanishlarni pgbouncer kabi pooler ushlab turadi
+            conn_max_age=0 if ASYNC_VIEWS else 600,
             conn_health_checks=True,
         )
     }
@@ -98,6 +108,63 @@ else:
         }
     }
 
+# Read replica'lar (ixtiyoriy): vergul bilan ajratilgan URL'lar -> replica1..N
+# Faqat DATABASE_REPLICA_VIEWS dagi GET so'rovlari va admin ro'yxatlari replikadan o'qiydi
+# (api/db_router.py); yozuvlar, tranzaksiyalar va migratsiyalar - default
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in config('DATABASE_REPLICA_URLS', default=config('DATABASE_REPLICA_URL', default='')).split(',')
+    if url.strip()
+]
+DATABASE_REPLICAS = []
+for index, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = dj_database_url.parse(
+        url,
+        conn_max_age=0 if ASYNC_VIEWS else 600,
+        conn_health_checks=True,
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+# Foydalanuvchi o'z yozuvidan keyin shuncha soniya asosiy bazadan o'qiydi (replikatsiya kechikishi)
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=5, cast=int)
+DATABASE_REPLICA_VIEWS = [
+    'transaction-list',
+    'transaction-detail',
+    'transaction-export',
+    'transaction-activity',
+    'stats-list',
+    'stats-detail',
+    'user-me',
+    'leaderboard-list',
+]
+
+
+# Cache Configuration
+# REDIS_URL berilsa - barcha gunicorn worker'lar uchun umumiy kesh (redis paketi kerak)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ecocash',
+        }
+    }
+
+# Global stats cache (seconds); umumiy keshdagi javob har GLOBAL_STATS_CACHE_TTL da yangilanadi
+GLOBAL_STATS_LOCAL_TTL = config('GLOBAL_STATS_LOCAL_TTL', default=5, cast=int)
+GLOBAL_STATS_CACHE_TTL = config('GLOBAL_STATS_CACHE_TTL', default=60, cast=int)
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -184,6 +251,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 
@@ -224,11 +292,31 @@ else:
     CSRF_USE_SESSIONS = False
 
 
+# Autentifikatsiya rejimi (api/authentication.py):
+#   session        - Django DB sessiyalari (har so'rovda django_session + User)
+#   cached_session - cached_db sessiyalar + keshdagi User (kesh hit'da 0 so'rov)
+#   token          - imzolangan Bearer access/refresh tokenlar (+ sessiya zaxira)
+AUTH_MODE = config('AUTH_MODE', default='session')
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=300, cast=int)
+AUTH_ACCESS_TOKEN_LIFETIME = config('AUTH_ACCESS_TOKEN_LIFETIME', default=15 * 60, cast=int)
+AUTH_REFRESH_TOKEN_LIFETIME = config('AUTH_REFRESH_TOKEN_LIFETIME', default=14 * 24 * 3600, cast=int)
+
+_AUTHENTICATION_CLASSES = {
+    'session': ['rest_framework.authentication.SessionAuthentication'],
+    'cached_session': ['api.authentication.CachedSessionAuthentication'],
+    'token': [
+        'api.authentication.SignedTokenAuthentication',
+        'api.authentication.CachedSessionAuthentication',
+    ],
+}
+if AUTH_MODE not in _AUTHENTICATION_CLASSES:
+    raise ImproperlyConfigured(f'AUTH_MODE must be one of {", ".join(_AUTHENTICATION_CLASSES)}')
+if AUTH_MODE != 'session':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # REST Framework Settings
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
-    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': _AUTHENTICATION_CLASSES[AUTH_MODE],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
@@ -237,6 +325,70 @@ REST_FRAMEWORK = {
 }
 
 
+# Idempotency-Key (api/idempotency.py): pay_utility va update_stats javoblari
+# shuncha vaqt saqlanadi va takroriy so'rovlarga qaytariladi (sekund)
+IDEMPOTENCY_ENABLED = config('IDEMPOTENCY_ENABLED', default=True, cast=bool)
+IDEMPOTENCY_TTL_SECONDS = config('IDEMPOTENCY_TTL_SECONDS', default=24 * 3600, cast=int)
+# Birinchi so'rov bajarilayotganda takroriylar uning javobini shuncha kutadi
+IDEMPOTENCY_WAIT_SECONDS = config('IDEMPOTENCY_WAIT_SECONDS', default=10, cast=float)
+# Javobsiz da'vo shundan keyin to'xtab qolgan hisoblanadi (worker timeout'dan katta bo'lsin)
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=120, cast=int)
+
+
+# Kiosk batch ingest (POST /api/users/bulk_update_stats/): xodimlar yoki X-Kiosk-Key
+# sarlavhasida shu kalitlardan biri (vergul bilan ajratilgan)
+BULK_STATS_MAX_EVENTS = config('BULK_STATS_MAX_EVENTS', default=5000, cast=int)
+KIOSK_API_KEYS = [key.strip() for key in config('KIOSK_API_KEYS', default='').split(',') if key.strip()]
+
+
+# Reytinglar (api/leaderboard.py): REDIS_URL bo'lmasa har bir worker xotirasida,
+# shu interval bilan bazadan qayta quriladi (sekund)
+LEADERBOARD_LOCAL_REBUILD_SECONDS = config('LEADERBOARD_LOCAL_REBUILD_SECONDS', default=60, cast=int)
+
+
+# So'rov metrikalari (api/metrics.py, GET /api/metrics/): har worker o'z
+# gistogrammalarini shu interval bilan umumiy keshga yozadi (sekund)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=10, cast=int)
+METRICS_WORKER_TTL = config('METRICS_WORKER_TTL', default=24 * 3600, cast=int)
+
+
+# Transaction oylik bo'limlari (PostgreSQL, api/partitions.py, `partition_transactions` cron):
+# oldindan yaratiladigan kelgusi oylar va shundan eski oylar gzip NDJSON'ga arxivlanadi
+TRANSACTION_PARTITIONS_AHEAD = config('TRANSACTION_PARTITIONS_AHEAD', default=3, cast=int)
+TRANSACTION_RETENTION_MONTHS = config('TRANSACTION_RETENTION_MONTHS', default=24, cast=int)
+TRANSACTION_ARCHIVE_DIR = config('TRANSACTION_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+# Default bo'limiga tushib qolgan oyni ko'chirish ledger'ga yozishni to'xtatadi: shundan ko'p
+# qatorli oy cron'da ko'chirilmaydi (texnik oynada --max-moved-rows bilan)
+TRANSACTION_DEFAULT_MOVE_MAX_ROWS = config('TRANSACTION_DEFAULT_MOVE_MAX_ROWS', default=10000, cast=int)
+
+
+# Admin ro'yxat filtrlaridagi DISTINCT qiymatlar keshi (sekund)
+ADMIN_FILTER_CACHE_TTL = config('ADMIN_FILTER_CACHE_TTL', default=3600, cast=int)
+
+
+# To'lov firibgarlik qoidalari chegaralari (api/fraud.py DEFAULT_THRESHOLDS ustidan)
+# Masalan: FRAUD_PROVIDER_THRESHOLDS = {'Gaz': {'max_amount': Decimal('5000000')}}
+FRAUD_THRESHOLDS = {}
+FRAUD_PROVIDER_THRESHOLDS = {}
+
+
+# Rate limiting (api/ratelimit.py): amal -> {kalit: (sig'im, sekundlar)}
+# Token bucket `sig'im` ta so'rovgacha portlashga ruxsat beradi va
+# `sekundlar` ichida to'liq to'ladi.
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+# Railway kabi proksi ortida X-Forwarded-For'dagi nechta hopga ishonish
+RATE_LIMIT_PROXY_COUNT = config('RATE_LIMIT_PROXY_COUNT', default=0, cast=int)
+RATE_LIMITS = {
+    'login': {'ip': (20, 60), 'email': (5, 300)},
+    'send_verification_code': {'ip': (5, 600), 'email': (3, 600)},
+    'verify_code': {'ip': (20, 300), 'email': (5, 600)},
+    'google_auth': {'ip': (20, 60)},
+    'pay_utility': {'ip': (30, 60), 'user': (10, 60)},
+    'bulk_update_stats': {'ip': (30, 60), 'kiosk': (30, 60), 'user': (30, 60)},
+}
+
+
 # Email Settings
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
@@ -256,32 +408,60 @@ else:
         print("[WARNING] Email sozlamalari topilmadi - console backend ishlatilmoqda")
 
 
-# Logging configuration for production
-if not DEBUG:
-    LOGGING = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'formatters': {
-            'verbose': {
-                'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-                'style': '{',
-            },
-        },
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'verbose',
-            },
-        },
-        'root': {
-            'handlers': ['console'],
-            'level': 'INFO',
+# Google Sign-In: ID token 'aud' tekshiruvi uchun (frontend'dagi VITE_GOOGLE_CLIENT_ID)
+GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID', default='')
+GOOGLE_CERTS_URL = config('GOOGLE_CERTS_URL', default='https://www.googleapis.com/oauth2/v1/certs')
+
+
+# ASYNC_VIEWS (yuqorida): Google so'rovlari umumiy pooled httpx.AsyncClient orqali
+# (api/http_client.py; httpx o'rnatilmagan bo'lsa requests + thread)
+ASYNC_HTTP_MAX_CONNECTIONS = config('ASYNC_HTTP_MAX_CONNECTIONS', default=20, cast=int)
+ASYNC_HTTP_KEEPALIVE_SECONDS = config('ASYNC_HTTP_KEEPALIVE_SECONDS', default=60, cast=float)
+
+
+# Email outbox: True - kodlar navbatga qo'yiladi va `send_outbox` worker yuboradi,
+# False - so'rov ichida to'g'ridan-to'g'ri SMTP orqali yuboriladi. Faqat worker
+# ishga tushirilgan joyda yoqing (railway.toml faqat web jarayonini ishga tushiradi)
+EMAIL_OUTBOX_ENABLED = config('EMAIL_OUTBOX_ENABLED', default=False, cast=bool)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_BACKOFF_SECONDS = config('EMAIL_OUTBOX_BACKOFF_SECONDS', default=30, cast=int)
+# Yuborish uchun olingan xabar shuncha vaqtdan keyin qayta navbatga tushadi (worker o'lgan bo'lsa)
+EMAIL_OUTBOX_CLAIM_SECONDS = config('EMAIL_OUTBOX_CLAIM_SECONDS', default=300, cast=int)
+
+
+# Logging (api/logs.py): so'rov thread'lari yozuvni faqat navbatga qo'yadi,
+# fon thread JSON qatorlar qilib yozadi. extra={'sampled': True} bilan
+# yozilgan ko'p sonli "muvaffaqiyat" xabarlari LOG_SAMPLE_RATE ulushda saqlanadi.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_SAMPLE_RATE = config('LOG_SAMPLE_RATE', default=0.1, cast=float)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample': {'()': 'api.logs.SamplingFilter'},
+    },
+    'handlers': {
+        'json': {
+            '()': 'api.logs.QueueJsonHandler',
+            'filters': ['sample'],
         },
-        'loggers': {
-            'django': {
-                'handlers': ['console'],
-                'level': config('DJANGO_LOG_LEVEL', default='INFO'),
-                'propagate': False,
-            },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['json'],
+            'level': LOG_LEVEL,
+            'propagate': False,
         },
+    },
+}
+
+# Production: Django va boshqa kutubxonalar ham JSON navbat orqali
+if not DEBUG:
+    LOGGING['root'] = {'handlers': ['json'], 'level': 'INFO'}
+    LOGGING['loggers']['django'] = {
+        'handlers': ['json'],
+        'level': config('DJANGO_LOG_LEVEL', default='INFO'),
+        'propagate': False,
     }